@@ -1,5 +1,7 @@
-﻿import logging
+﻿import atexit
+import logging
 import os
+import signal
 import threading
 
 from dotenv import load_dotenv
@@ -16,6 +18,7 @@ from botocore.config import Config
 from flask import Flask
 from flask_login import LoginManager
 from flask_socketio import SocketIO
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from .auth import User, load_password_hash, register_user_loader, verify_password
 from .route import register_routes
@@ -32,18 +35,70 @@ from .services.local_storage_service import (
 
 from .settings import (
     ADMIN_PASSWORD,
+    CLIENT_IDLE_REAP_INTERVAL_MS,
+    CLIENT_IDLE_TIMEOUT_MS,
+    CLIPBOARD_BACKLOG_MAX_BYTES_PER_ROOM,
+    CLIPBOARD_BACKLOG_MAX_BYTES_TOTAL,
+    CLIPBOARD_BACKLOG_MAX_ITEMS_PER_ROOM,
+    CLIPBOARD_BACKLOG_MAX_ROOMS,
+    CLIPBOARD_BACKLOG_TTL_MS,
+    CLIPBOARD_DEDUP_WINDOW_MS,
+    CLIPBOARD_SPILL_THRESHOLD_BYTES,
+    DRAIN_MIGRATION_WINDOW_MS,
+    DRAIN_TRANSFER_DEADLINE_MS,
     DASHBOARD_R2_BUCKET,
     DOTENV_PATH,
     SETTINGS_OVERRIDE_PATH,
+    FCM_FLUSH_INTERVAL_MS,
+    FCM_MULTICAST_BATCH_SIZE,
+    FCM_TOKEN_STORE_PATH,
     FLASK_SECRET_KEY,
+    HISTORY_CACHE_MAX_ENTRIES,
+    HISTORY_CACHE_TTL_MS,
+    LAN_PROBE_CACHE_MAX_TTL_MS,
+    LAN_PROBE_DEBOUNCE_MS,
+    LAN_PROBE_MAX_PENDING_PER_PAIR,
+    LAN_PROBE_MAX_RETRIES,
+    LAN_PROBE_RETRY_BASE_MS,
+    LAN_PROBE_TIMEOUT_GRACE_MS,
     LOCAL_STORAGE_BASE_URL,
     LOCAL_STORAGE_PATH,
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_LEVELS,
+    LOG_QUEUE_MAX,
+    LOG_SAMPLE_BURST,
+    LOG_SAMPLE_EVERY,
+    LOG_SAMPLE_WINDOW_MS,
+    METRICS_TOKEN,
     PASSWORD_HASH_FILE,
     R2_ACCESS_KEY_ID,
     R2_ACCOUNT_ID,
     R2_BUCKET_NAME,
     R2_SECRET_ACCESS_KEY,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMITS,
+    RELAY_MAX_FRAME_BYTES,
+    RELAY_BATCH_MAX_EVENTS,
+    ROOM_MAX_PEERS,
+    ROOM_MAX_PEERS_LIMIT,
+    SESSION_RESTORE_GRACE_MS,
+    SESSION_SNAPSHOT_INTERVAL_MS,
+    SESSION_SNAPSHOT_MAX_AGE_MS,
+    SESSION_SNAPSHOT_PATH,
     STORAGE_BACKEND,
+    TRANSFER_ADAPTIVE_TIMEOUT_ENABLED,
+    TRANSFER_LAN_EXPLORE_EVERY,
+    TRANSFER_LAN_SKIP_SUCCESS_RATE,
+    TRANSFER_OUTCOME_BATCH_SIZE,
+    TRANSFER_OUTCOME_FLUSH_INTERVAL_MS,
+    TRANSFER_TIMEOUT_EWMA_ALPHA,
+    TRANSFER_TIMEOUT_MIN_MS,
+    TRANSFER_TIMEOUT_MIN_SAMPLES,
+    TRUSTED_PROXY_HOPS,
+    UPLOAD_CACHE_MAX_BYTES,
+    UPLOAD_CACHE_MAX_OBJECT_BYTES,
+    UPLOAD_CACHE_TTL_MS,
 )
 from .signal_core import (
     ALLOWED_ACTIVITY_TYPES,
@@ -57,29 +112,57 @@ from .signal_core import (
     CLIENT_DEVICE_NAMES,
     PENDING_LAN_PROBES,
     ROOM_CLIENT_ORDER,
+    BINARY_SIDS,
     ROOM_LAST_PROBE,
     TRANSFER_CONTEXTS,
+    IDLE_REAPER_STATS,
+    RESTORED_CLIENTS,
+    add_client_to_room_order,
+    attach_sid,
+    bind_dashboard_feed,
+    bind_lan_probe_cache,
     bind_runtime,
+    bind_transfer_decision_estimator,
+    configure_idle_reaper,
+    configure_lan_probes,
+    configure_rooms,
+    count_transfer_contexts,
+    count_undecided_transfers,
+    find_transfer_context,
+    forget_client_probes,
+    pick_receiver_client_ids,
+    set_room_max_peers,
+    bind_transfer_outcome_recorder,
     broadcast_room_stats,
     current_time_ms,
     debug_signal_log,
     detach_sid_from_tracking,
     emit_activity_log,
+    emit_relay,
     emit_room_state_changed,
     enforce_room_capacity,
+    export_session_state,
     ensure_protocol_version,
     get_all_room_states,
     get_client_from_sid,
     get_or_create_transfer_context,
     get_room_lan_state,
     get_serialized_sessions,
+    idle_reaper_worker,
     instruct_finish,
     instruct_upload_relay,
     is_sender_authorized_for_room,
+    mark_client_seen,
     normalize_client_type,
     parse_signal_payload,
+    publish_client_list,
+    publish_server_stats,
     remove_client_from_room_order,
+    resolve_lan_probe,
     resolve_signal_context,
+    restore_session_state,
+    set_binary_mode,
+    should_skip_lan_attempt,
     transfer_decision_timeout_worker,
     trigger_lan_probe_if_ready,
     update_client_network_meta,
@@ -97,23 +180,59 @@ from .services.history_db import (
     query_hourly as history_query_hourly_fn,
     query_daily as history_query_daily_fn,
     query_countries as history_query_countries_fn,
+    insert_transfer_outcomes as history_insert_transfer_outcomes,
+    query_transfer_summary as history_query_transfer_summary_fn,
+    query_transfers_by_room_state as history_query_transfers_by_room_state_fn,
+    query_transfers_by_reason as history_query_transfers_by_reason_fn,
+    query_transfers_by_size as history_query_transfers_by_size_fn,
+    get_write_stats as history_get_write_stats,
+    get_write_version as history_get_write_version,
+    iter_export_rows as history_iter_export_rows,
 )
-from .services.geo_service import get_client_ip, lookup_ip as geo_lookup_ip
-from .socket_events import register_socket_events
-
-
-logging.basicConfig(level=logging.INFO)
+from .services.geo_service import get_cache_stats as geo_get_cache_stats, get_client_ip, lookup_ip as geo_lookup_ip
+from .services.live_series import LiveSeries
+from .services.log_pipeline import configure_logging
+from .services.clipboard_backlog import ClipboardBacklog
+from .services.clipboard_dedup import ClipboardDeduplicator
+from .services.dashboard_feed import NAMESPACE as DASHBOARD_NAMESPACE, DashboardFeed
+from .services.drain import STATES as DRAIN_STATES, DrainController
+from .services.history_cache import HistoryQueryCache
+from .services.payload_spill import PayloadSpiller
+from .services.probe_cache import LanProbeCache
+from .services.metrics import MetricsRegistry, instrument_boto_client, instrument_call
+from .services.rate_limit import RateLimiter, parse_rate
+from .services.session_snapshot import SessionSnapshotStore
+from .services.transfer_outcomes import TransferOutcomeRecorder
+from .services.transfer_timing import TransferDecisionEstimator
+from .services.upload_cache import UploadCache
+from .socket_events import register_dashboard_events, register_socket_events
+
+
+log_handler = configure_logging(
+    level=LOG_LEVEL,
+    levels=LOG_LEVELS,
+    fmt=LOG_FORMAT,
+    sample_burst=LOG_SAMPLE_BURST,
+    sample_window_ms=LOG_SAMPLE_WINDOW_MS,
+    sample_every=LOG_SAMPLE_EVERY,
+    queue_max=LOG_QUEUE_MAX,
+)
+atexit.register(log_handler.listener.stop)
 logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 HISTORY_DB_PATH = os.path.join(BASE_DIR, 'data', 'history.db')
 history_init_db(HISTORY_DB_PATH)
+history_cache = HistoryQueryCache(history_get_write_version, ttl_ms=HISTORY_CACHE_TTL_MS,
+                                  max_entries=HISTORY_CACHE_MAX_ENTRIES)
 
 _ACTIVE_SID_EVENTS: dict = {}
 _ACTIVE_SID_LOCK = threading.Lock()
 
 app = Flask(__name__, static_folder=os.path.join(BASE_DIR, 'static'), template_folder=os.path.join(BASE_DIR, 'templates'))
 app.config['SECRET_KEY'] = FLASK_SECRET_KEY
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -122,12 +241,139 @@ register_user_loader(login_manager)
 
 _enable_engine_log = os.environ.get('FLASK_DEBUG', '0') == '1'
 socketio = SocketIO(app, cors_allowed_origins='*',
-                    logger=_enable_engine_log, engineio_logger=_enable_engine_log)
-bind_runtime(socketio, logger)
+                    logger=_enable_engine_log, engineio_logger=_enable_engine_log,
+                    max_http_buffer_size=RELAY_MAX_FRAME_BYTES)
+bind_runtime(socketio, logger.getChild('signal'))
+# One emit per event and view, so the payload is encoded once for all dashboards that match.
+dashboard_feed = DashboardFeed(
+    lambda event, payload, sids: socketio.emit(event, payload, to=sids, namespace=DASHBOARD_NAMESPACE))
+bind_dashboard_feed(dashboard_feed)
+
+live_series = LiveSeries()
+socketio.start_background_task(live_series.run, lambda point: dashboard_feed.publish('live_series', point),
+                               socketio.sleep)
+
+metrics = MetricsRegistry()
+storage_request_seconds = metrics.histogram(
+    'storage_request_seconds', 'Storage backend request latency', ('backend', 'operation'))
+local_write_file = instrument_call(storage_request_seconds, ('local', 'write'), local_write_file)
+local_read_file = instrument_call(storage_request_seconds, ('local', 'read'), local_read_file)
+upload_cache = UploadCache(max_bytes=UPLOAD_CACHE_MAX_BYTES, max_object_bytes=UPLOAD_CACHE_MAX_OBJECT_BYTES,
+                           ttl_ms=UPLOAD_CACHE_TTL_MS)
 
 # Eagerly initialise FCM so startup errors surface immediately (non-fatal)
-from .services.fcm_service import _ensure_initialized as _fcm_init
-_fcm_init()
+from .services.fcm_service import (
+    DeviceTokenRegistry,
+    FcmDeliveryService,
+    FirebaseTransport,
+    _ensure_initialized as _fcm_init,
+)
+_fcm_enabled = _fcm_init()
+
+fcm_delivery = FcmDeliveryService(
+    DeviceTokenRegistry(FCM_TOKEN_STORE_PATH),
+    FirebaseTransport(),
+    has_live_sid=lambda client_id: bool(CLIENT_SESSIONS.get(client_id)),
+    enabled=_fcm_enabled,
+    batch_size=FCM_MULTICAST_BATCH_SIZE,
+    flush_interval_s=FCM_FLUSH_INTERVAL_MS / 1000.0,
+)
+if _fcm_enabled:
+    socketio.start_background_task(fcm_delivery.run, socketio.sleep)
+
+clipboard_backlog = ClipboardBacklog(
+    max_items_per_room=CLIPBOARD_BACKLOG_MAX_ITEMS_PER_ROOM,
+    max_bytes_per_room=CLIPBOARD_BACKLOG_MAX_BYTES_PER_ROOM,
+    max_bytes_total=CLIPBOARD_BACKLOG_MAX_BYTES_TOTAL,
+    ttl_ms=CLIPBOARD_BACKLOG_TTL_MS,
+    max_rooms=CLIPBOARD_BACKLOG_MAX_ROOMS,
+)
+clipboard_dedup = ClipboardDeduplicator(window_ms=CLIPBOARD_DEDUP_WINDOW_MS)
+transfer_outcomes = TransferOutcomeRecorder(
+    lambda rows: history_insert_transfer_outcomes(HISTORY_DB_PATH, rows),
+    batch_size=TRANSFER_OUTCOME_BATCH_SIZE,
+    flush_interval_s=TRANSFER_OUTCOME_FLUSH_INTERVAL_MS / 1000.0,
+)
+transfer_decision_estimator = TransferDecisionEstimator(
+    alpha=TRANSFER_TIMEOUT_EWMA_ALPHA,
+    min_samples=TRANSFER_TIMEOUT_MIN_SAMPLES,
+    min_timeout_ms=TRANSFER_TIMEOUT_MIN_MS,
+    skip_below_success_rate=TRANSFER_LAN_SKIP_SUCCESS_RATE,
+    explore_every=TRANSFER_LAN_EXPLORE_EVERY,
+)
+
+
+def _on_transfer_state(context):
+    if transfer_outcomes.record(context):
+        live_series.increment(f"transfers_{context['status']}")
+    transfer_decision_estimator.observe(context)
+
+
+bind_transfer_outcome_recorder(_on_transfer_state)
+
+lan_probe_cache = LanProbeCache(max_ttl_ms=LAN_PROBE_CACHE_MAX_TTL_MS, debounce_ms=LAN_PROBE_DEBOUNCE_MS)
+bind_lan_probe_cache(lan_probe_cache)
+configure_lan_probes(
+    timeout_grace_ms=LAN_PROBE_TIMEOUT_GRACE_MS,
+    max_retries=LAN_PROBE_MAX_RETRIES,
+    retry_base_ms=LAN_PROBE_RETRY_BASE_MS,
+    max_pending_per_pair=LAN_PROBE_MAX_PENDING_PER_PAIR,
+)
+configure_rooms(max_peers=ROOM_MAX_PEERS, max_peers_limit=ROOM_MAX_PEERS_LIMIT)
+configure_idle_reaper(idle_timeout_ms=CLIENT_IDLE_TIMEOUT_MS, interval_ms=CLIENT_IDLE_REAP_INTERVAL_MS)
+if CLIENT_IDLE_TIMEOUT_MS > 0:
+    socketio.start_background_task(idle_reaper_worker)
+if TRANSFER_ADAPTIVE_TIMEOUT_ENABLED:
+    bind_transfer_decision_estimator(transfer_decision_estimator)
+socketio.start_background_task(transfer_outcomes.run, socketio.sleep)
+
+session_snapshots = SessionSnapshotStore(
+    SESSION_SNAPSHOT_PATH,
+    lambda: export_session_state(transfer_max_age_ms=SESSION_SNAPSHOT_MAX_AGE_MS),
+    interval_s=SESSION_SNAPSHOT_INTERVAL_MS / 1000.0,
+    max_age_ms=SESSION_SNAPSHOT_MAX_AGE_MS,
+)
+if session_snapshots.enabled:
+    _restored_state = session_snapshots.load()
+    if _restored_state:
+        logger.info('Warm restart: restored %s clients from %s',
+                    restore_session_state(_restored_state, grace_ms=SESSION_RESTORE_GRACE_MS), SESSION_SNAPSHOT_PATH)
+    socketio.start_background_task(session_snapshots.run, socketio.sleep)
+    # Registered after the log listener's stop, so it runs first and can still log.
+    atexit.register(session_snapshots.save)
+
+drain = DrainController(
+    list_sids=lambda: list(socketio.server.manager.rooms.get('/', {}).get(None, ())),
+    count_pending_transfers=count_undecided_transfers,
+    send_migrating=lambda sid, payload: socketio.emit('server_migrating', payload, room=sid),
+    disconnect_sid=lambda sid: socketio.server.disconnect(sid),
+    deadline_ms=DRAIN_TRANSFER_DEADLINE_MS,
+    window_ms=DRAIN_MIGRATION_WINDOW_MS,
+)
+
+
+def start_drain(deadline_ms=None, window_ms=None):
+    if not drain.start(deadline_ms=deadline_ms, window_ms=window_ms):
+        return False
+    socketio.start_background_task(drain.run, socketio.sleep)
+    return True
+
+
+def _drain_on_signal(signum, frame):
+    start_drain()
+
+
+try:
+    signal.signal(signal.SIGUSR2, _drain_on_signal)
+except (AttributeError, ValueError):
+    # No SIGUSR2 on Windows, and only the main thread may install handlers.
+    logger.info('SIGUSR2 drain trigger unavailable; use POST /api/drain')
+
+rate_limiter = RateLimiter(
+    {event_class: {scope: parse_rate(value) for scope, value in scopes.items()}
+     for event_class, scopes in RATE_LIMITS.items()},
+    max_keys=RATE_LIMIT_MAX_KEYS,
+)
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -141,6 +387,8 @@ s3_client = boto3.client(
     verify=False,
 )
 
+instrument_boto_client(storage_request_seconds, s3_client)
+
 if STORAGE_BACKEND == 'local':
     if LOCAL_STORAGE_PATH:
         ensure_storage_dir(LOCAL_STORAGE_PATH)
@@ -169,9 +417,34 @@ def local_storage_get_usage_bound():
 
 
 def local_storage_clear_bound():
+    upload_cache.clear()
     return _local_clear_storage(LOCAL_STORAGE_PATH)
 
 
+def store_relay_blob(file_key, data, content_type):
+    """Write a blob to the active storage backend and return its download URL."""
+    if STORAGE_BACKEND == 'local':
+        local_write_file(LOCAL_STORAGE_PATH, file_key, data, content_type)
+        upload_cache.put(file_key, data, content_type)
+        return f"{LOCAL_STORAGE_BASE_URL.rstrip('/')}/api/file/download/{file_key}"
+    s3_client.put_object(Bucket=R2_BUCKET_NAME, Key=file_key, Body=data, ContentType=content_type)
+    return s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': R2_BUCKET_NAME, 'Key': file_key},
+        ExpiresIn=3600,
+    )
+
+
+_spill_storage_ready = (
+    (STORAGE_BACKEND == 'local' and bool(LOCAL_STORAGE_PATH))
+    or (STORAGE_BACKEND != 'local' and R2_ACCOUNT_ID != 'YOUR_ACCOUNT_ID_HERE' and bool(R2_BUCKET_NAME))
+)
+payload_spiller = PayloadSpiller(
+    threshold_bytes=CLIPBOARD_SPILL_THRESHOLD_BYTES,
+    store_blob=store_relay_blob if _spill_storage_ready else None,
+)
+
+
 register_routes(
     app,
     ADMIN_PASSWORD=ADMIN_PASSWORD,
@@ -205,6 +478,24 @@ register_routes(
     history_query_hourly=history_query_hourly_fn,
     history_query_daily=history_query_daily_fn,
     history_query_countries=history_query_countries_fn,
+    history_query_transfer_summary=history_query_transfer_summary_fn,
+    history_query_transfers_by_room_state=history_query_transfers_by_room_state_fn,
+    history_query_transfers_by_reason=history_query_transfers_by_reason_fn,
+    history_query_transfers_by_size=history_query_transfers_by_size_fn,
+    history_export_rows=history_iter_export_rows,
+    history_cache=history_cache,
+    clipboard_backlog=clipboard_backlog,
+    clipboard_dedup=clipboard_dedup,
+    payload_spiller=payload_spiller,
+    RELAY_MAX_FRAME_BYTES=RELAY_MAX_FRAME_BYTES,
+    RELAY_BATCH_MAX_EVENTS=RELAY_BATCH_MAX_EVENTS,
+    rate_limiter=rate_limiter,
+    metrics=metrics,
+    METRICS_TOKEN=METRICS_TOKEN,
+    drain=drain,
+    start_drain=start_drain,
+    live_series=live_series,
+    upload_cache=upload_cache,
 )
 
 def _record_join(*, client_id, device_name, client_type, room_id):
@@ -247,31 +538,36 @@ def _record_disconnect(*, sid):
 
 register_socket_events(
     socketio,
-    logger=logger,
+    logger=logger.getChild('socket'),
     CLIENT_SESSIONS=CLIENT_SESSIONS,
+    attach_sid=attach_sid,
     detach_sid_from_tracking=detach_sid_from_tracking,
-    get_serialized_sessions=get_serialized_sessions,
+    publish_client_list=publish_client_list,
+    publish_server_stats=publish_server_stats,
     normalize_client_type=normalize_client_type,
-    get_all_room_states=get_all_room_states,
     CLIENT_TYPES=CLIENT_TYPES,
     CLIENT_DEVICE_NAMES=CLIENT_DEVICE_NAMES,
-    CLIENT_LAST_SEEN_MS=CLIENT_LAST_SEEN_MS,
+    mark_client_seen=mark_client_seen,
     current_time_ms=current_time_ms,
     CLIENT_JOINED_AT_MS=CLIENT_JOINED_AT_MS,
     update_client_network_meta=update_client_network_meta,
     update_client_probe_meta=update_client_probe_meta,
     CLIENT_ROOMS=CLIENT_ROOMS,
     remove_client_from_room_order=remove_client_from_room_order,
-    ROOM_LAST_PROBE=ROOM_LAST_PROBE,
+    forget_client_probes=forget_client_probes,
+    set_room_max_peers=set_room_max_peers,
     broadcast_room_stats=broadcast_room_stats,
     emit_room_state_changed=emit_room_state_changed,
-    ROOM_CLIENT_ORDER=ROOM_CLIENT_ORDER,
+    add_client_to_room_order=add_client_to_room_order,
+    emit_relay=emit_relay,
+    set_binary_mode=set_binary_mode,
     enforce_room_capacity=enforce_room_capacity,
     trigger_lan_probe_if_ready=trigger_lan_probe_if_ready,
     get_client_from_sid=get_client_from_sid,
     CLIENT_NETWORK_META=CLIENT_NETWORK_META,
     emit_activity_log=emit_activity_log,
     PENDING_LAN_PROBES=PENDING_LAN_PROBES,
+    resolve_lan_probe=resolve_lan_probe,
     parse_signal_payload=parse_signal_payload,
     resolve_signal_context=resolve_signal_context,
     debug_signal_log=debug_signal_log,
@@ -282,21 +578,133 @@ register_socket_events(
     instruct_upload_relay=instruct_upload_relay,
     update_transfer_state=update_transfer_state,
     transfer_decision_timeout_worker=transfer_decision_timeout_worker,
-    TRANSFER_CONTEXTS=TRANSFER_CONTEXTS,
+    pick_receiver_client_ids=pick_receiver_client_ids,
+    find_transfer_context=find_transfer_context,
     instruct_finish=instruct_finish,
     record_join=_record_join,
     record_disconnect=_record_disconnect,
+    register_push_token=fcm_delivery.register_token,
+    unregister_push_room=fcm_delivery.unregister_room,
+    notify_offline_peers=fcm_delivery.notify_offline_peers,
+    clipboard_backlog=clipboard_backlog,
+    clipboard_dedup=clipboard_dedup,
+    payload_spiller=payload_spiller,
+    rate_limiter=rate_limiter,
+    metrics=metrics,
+    should_skip_lan_attempt=should_skip_lan_attempt,
+    drain=drain,
+    live_series=live_series,
+)
+register_dashboard_events(
+    socketio,
+    logger=logger.getChild('dashboard'),
+    dashboard_feed=dashboard_feed,
+    get_serialized_sessions=get_serialized_sessions,
+    get_all_room_states=get_all_room_states,
+    metrics=metrics,
+    live_series=live_series,
 )
 
 
+def _count_rooms_by_state():
+    counts = dict.fromkeys(('SINGLE', 'PAIR_UNKNOWN', 'PAIR_SAME_LAN', 'PAIR_DIFF_LAN'), 0)
+    for room_state in get_all_room_states().values():
+        counts[room_state['state']] = counts.get(room_state['state'], 0) + 1
+    return {(state,): count for state, count in counts.items()}
+
+
+def _stats_by_key(stats, keys):
+    return {(key,): stats.get(key, 0) for key in keys}
+
+
+# The default namespace's None room holds every connected sid.
+metrics.callback('socketio_connected_sids', 'Connected Socket.IO sessions',
+                 lambda: len(socketio.server.manager.rooms.get('/', {}).get(None, ())))
+metrics.callback('socketio_connected_clients', 'Registered client_ids with at least one live sid',
+                 lambda: len(CLIENT_SESSIONS))
+metrics.callback('rooms_by_state', 'Rooms by LAN state', _count_rooms_by_state, ('state',))
+metrics.callback('socketio_binary_sids', 'Sessions that negotiated binary mode', lambda: len(BINARY_SIDS))
+metrics.callback('idle_clients_reaped_total', 'Clients detached by the idle reaper',
+                 lambda: IDLE_REAPER_STATS.get('reaped', 0), kind='counter')
+metrics.callback('session_snapshots_total', 'Warm-restart snapshot writes by result',
+                 lambda: _stats_by_key(session_snapshots.stats, ('saved', 'failed')), ('result',), kind='counter')
+metrics.callback('session_snapshot_bytes', 'Size of the last warm-restart snapshot',
+                 lambda: session_snapshots.stats['bytes'])
+metrics.callback('session_restore_pending', 'Restored clients that have not joined again yet',
+                 lambda: len(RESTORED_CLIENTS))
+metrics.callback('drain_state', 'Drain progress: 1 for the current state',
+                 lambda: {(state,): int(drain.state == state) for state in DRAIN_STATES}, ('state',))
+metrics.callback('drain_pending_transfers', 'Undecided transfers the drain is waiting for',
+                 lambda: drain.status()['pending_transfers'])
+metrics.callback('drain_sessions_remaining', 'Sessions not yet migrated by the drain',
+                 lambda: drain.status()['remaining_sessions'])
+metrics.callback('drain_sessions_migrated_total', 'Sessions closed by the drain after server_migrating',
+                 lambda: drain.stats['migrated'], kind='counter')
+metrics.callback('drain_joins_rejected_total', 'Joins refused while draining',
+                 lambda: drain.stats['rejected_joins'], kind='counter')
+metrics.callback('dashboard_subscribers', 'Dashboard sessions on the /dashboard namespace',
+                 lambda: len(dashboard_feed.subscriptions))
+metrics.callback('dashboard_publishes_total', 'Dashboard events by outcome (sent, skipped with no matching view)',
+                 lambda: _stats_by_key(dashboard_feed.stats, ('sent', 'skipped')), ('outcome',), kind='counter')
+metrics.callback('transfer_contexts', 'Tracked transfer contexts', count_transfer_contexts)
+metrics.callback('pending_lan_probes', 'LAN probes awaiting a result', lambda: len(PENDING_LAN_PROBES))
+metrics.callback('history_write_queue_depth', 'History DB writes waiting for or holding the write lock',
+                 lambda: history_get_write_stats()['queue_depth'])
+metrics.callback('history_writes_total', 'Completed history DB writes',
+                 lambda: history_get_write_stats()['completed'], kind='counter')
+metrics.callback('history_cache_lookups_total', 'History query cache lookups by result (stale: a write or the TTL invalidated the entry)',
+                 lambda: _stats_by_key(history_cache.stats, ('hits', 'misses', 'stale')), ('result',), kind='counter')
+metrics.callback('history_cache_hit_ratio', 'History query cache hit ratio since start', lambda: history_cache.hit_ratio())
+metrics.callback('history_not_modified_total', 'History API requests answered 304 Not Modified',
+                 lambda: history_cache.stats['not_modified'], kind='counter')
+metrics.callback('geo_cache_lookups_total', 'Geo IP cache lookups by result',
+                 lambda: _stats_by_key(geo_get_cache_stats(), ('hits', 'misses')), ('result',), kind='counter')
+metrics.callback('geo_cache_hit_ratio', 'Geo IP cache hit ratio since start',
+                 lambda: geo_get_cache_stats()['hit_ratio'])
+metrics.callback('rate_limit_decisions_total', 'Rate limiter decisions by limiter',
+                 lambda: {(name, outcome): counters[outcome]
+                          for name, counters in rate_limiter.stats.items()
+                          for outcome in ('allowed', 'rejected')},
+                 ('limiter', 'outcome'), kind='counter')
+metrics.callback('clipboard_dedup_suppressed_total', 'Suppressed duplicate clipboard pushes',
+                 lambda: clipboard_dedup.stats['suppressed'], kind='counter')
+metrics.callback('upload_cache_lookups_total', 'Local download lookups in the upload cache by result',
+                 lambda: _stats_by_key(upload_cache.stats, ('hits', 'misses')), ('result',), kind='counter')
+metrics.callback('upload_cache_hit_ratio', 'Upload cache hit ratio since start', lambda: upload_cache.hit_ratio())
+metrics.callback('upload_cache_bytes', 'Bytes held in the upload cache', lambda: upload_cache.total_bytes)
+metrics.callback('upload_cache_evictions_total', 'Upload cache entries dropped by reason (expired, evicted for space)',
+                 lambda: _stats_by_key(upload_cache.stats, ('expired', 'evicted')), ('reason',), kind='counter')
+metrics.callback('clipboard_backlog_bytes', 'Bytes held in the clipboard backlog',
+                 lambda: clipboard_backlog.total_bytes)
+metrics.callback('payload_spill_total', 'Clipboard payloads spilled to storage by result',
+                 lambda: _stats_by_key(payload_spiller.stats, ('spilled', 'failed')), ('result',), kind='counter')
+metrics.callback('fcm_messages_total', 'FCM wake-up messages by result',
+                 lambda: _stats_by_key(fcm_delivery.stats, ('sent', 'failed', 'pruned')), ('result',), kind='counter')
+metrics.callback('transfer_outcomes_pending', 'Transfer outcomes waiting to be written to history',
+                 lambda: transfer_outcomes.pending_count())
+metrics.callback('transfer_decision_adaptations_total', 'Adaptive LAN decisions by kind',
+                 lambda: _stats_by_key(transfer_decision_estimator.stats,
+                                       ('adaptive_timeouts', 'lan_skipped', 'explored')), ('kind',), kind='counter')
+metrics.callback('lan_probe_triggers_total', 'LAN probe triggers by outcome (sent, answered from cache, debounced)',
+                 lambda: {('sent',): lan_probe_cache.stats['probes_sent'],
+                          ('cache_hit',): lan_probe_cache.stats['hits'],
+                          ('debounced',): lan_probe_cache.stats['debounced']}, ('outcome',), kind='counter')
+metrics.callback('lan_probe_cache_hit_ratio', 'LAN probe cache hit ratio since start', lambda: lan_probe_cache.hit_ratio())
+metrics.callback('fcm_pending', 'FCM wake-ups waiting for the next batch', lambda: fcm_delivery.pending_count())
+metrics.callback('log_records_total', 'Log records by outcome (queued, sampled out, dropped on a full queue)',
+                 lambda: {('queued',): log_handler.stats['enqueued'],
+                          ('sampled_out',): log_handler.sampler.stats['sampled_out'],
+                          ('dropped',): log_handler.stats['dropped']}, ('outcome',), kind='counter')
+metrics.callback('log_queue_depth', 'Log records waiting for the writer thread', lambda: log_handler.queue.qsize())
+
+
 _R2_CLEANUP_INTERVAL_S = 3600  # 60 minutes
 
 
 def _cleanup_worker():
-    import time
     logger.info(f'Cleanup scheduler started (interval: {_R2_CLEANUP_INTERVAL_S}s, backend: {STORAGE_BACKEND})')
     while True:
-        time.sleep(_R2_CLEANUP_INTERVAL_S)
+        socketio.sleep(_R2_CLEANUP_INTERVAL_S)
         if STORAGE_BACKEND == 'local':
             try:
                 deleted = purge_old_files(LOCAL_STORAGE_PATH, max_age_s=_R2_CLEANUP_INTERVAL_S)
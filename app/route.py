@@ -1,10 +1,20 @@
+import hmac
+import io
+import itertools
+import json
 import time as pytime
 
 from dotenv import set_key
-from flask import request, jsonify, render_template, redirect, url_for, flash, send_from_directory, Response
+from flask import request, jsonify, render_template, redirect, url_for, flash, send_from_directory, Response, stream_with_context
 from flask_login import current_user, login_user, login_required, logout_user
 from werkzeug.security import generate_password_hash
 
+from .services.history_db import EXPORT_COLUMNS
+from .services.history_export import FORMATS as EXPORT_FORMATS, encode_export, parse_export_time
+from .services.live_series import RESOLUTIONS as LIVE_RESOLUTIONS
+from .services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .services.upload_cache import iter_chunks as iter_upload_chunks
+
 
 def register_routes(
     app,
@@ -40,6 +50,24 @@ def register_routes(
     history_query_hourly=None,
     history_query_daily=None,
     history_query_countries=None,
+    history_query_transfer_summary=None,
+    history_query_transfers_by_room_state=None,
+    history_query_transfers_by_reason=None,
+    history_query_transfers_by_size=None,
+    history_export_rows=None,
+    history_cache=None,
+    live_series=None,
+    upload_cache=None,
+    clipboard_backlog=None,
+    clipboard_dedup=None,
+    payload_spiller=None,
+    RELAY_MAX_FRAME_BYTES=None,
+    RELAY_BATCH_MAX_EVENTS=500,
+    rate_limiter=None,
+    metrics=None,
+    METRICS_TOKEN='',
+    drain=None,
+    start_drain=None,
 ):
     @app.route('/login', methods=['GET', 'POST'])
     def login():
@@ -123,7 +151,7 @@ def register_routes(
                 usage['updated_at_epoch_ms'] = int(pytime.time() * 1000)
                 return jsonify(usage)
             except Exception as e:
-                logger.error(f"Failed to get local storage usage: {e}")
+                logger.error("Failed to get local storage usage: %s", e)
                 return jsonify({'error': str(e)}), 500
         if not DASHBOARD_R2_BUCKET:
             return jsonify({'error': 'R2 not configured (DASHBOARD_R2_BUCKET is empty)'}), 503
@@ -133,7 +161,7 @@ def register_routes(
             usage['updated_at_epoch_ms'] = int(pytime.time() * 1000)
             return jsonify(usage)
         except Exception as e:
-            logger.error(f"Failed to get R2 usage for dashboard: {e}")
+            logger.error("Failed to get R2 usage for dashboard: %s", e)
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/dashboard/r2_empty', methods=['POST'])
@@ -150,7 +178,7 @@ def register_routes(
                     'updated_at_epoch_ms': int(pytime.time() * 1000),
                 })
             except Exception as e:
-                logger.error(f"Failed to clear local storage: {e}")
+                logger.error("Failed to clear local storage: %s", e)
                 return jsonify({'error': str(e)}), 500
         if not DASHBOARD_R2_BUCKET:
             return jsonify({'error': 'R2 not configured (DASHBOARD_R2_BUCKET is empty)'}), 503
@@ -164,7 +192,7 @@ def register_routes(
                 'updated_at_epoch_ms': int(pytime.time() * 1000),
             })
         except Exception as e:
-            logger.error(f"Failed to empty R2 bucket for dashboard: {e}")
+            logger.error("Failed to empty R2 bucket for dashboard: %s", e)
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/file/upload_auth', methods=['POST'])
@@ -177,6 +205,11 @@ def register_routes(
             return jsonify({'error': 'Filename required'}), 400
 
         object_name = f"{int(pytime.time())}_{filename}"
+        if live_series:
+            live_series.increment('uploads_presigned')
+            size = data.get('size')
+            if isinstance(size, int) and not isinstance(size, bool) and size > 0:
+                live_series.increment('bytes_presigned', size)
 
         if STORAGE_BACKEND == 'local':
             base = LOCAL_STORAGE_BASE_URL.rstrip('/')
@@ -211,7 +244,7 @@ def register_routes(
                 'expires_in': 300,
             })
         except Exception as e:
-            logger.error(f"Error generating presigned URL: {e}")
+            logger.error("Error generating presigned URL: %s", e)
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/file/upload/<path:file_key>', methods=['PUT'])
@@ -220,17 +253,26 @@ def register_routes(
             return jsonify({'error': 'Local storage not enabled'}), 404
         content_type = request.content_type or 'application/octet-stream'
         try:
-            local_write_file(LOCAL_STORAGE_PATH, file_key, request.get_data(), content_type)
-            logger.info(f"Local upload: {file_key} ({len(request.data)} bytes)")
+            data = request.get_data()
+            local_write_file(LOCAL_STORAGE_PATH, file_key, data, content_type)
+            if upload_cache:
+                upload_cache.put(file_key, data, content_type)
+            logger.info("Local upload: %s (%s bytes)", file_key, len(data))
             return '', 200
         except Exception as e:
-            logger.error(f"Local upload failed: {e}")
+            logger.error("Local upload failed: %s", e)
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/file/download/<path:file_key>', methods=['GET'])
     def local_file_download(file_key):
         if STORAGE_BACKEND != 'local':
             return jsonify({'error': 'Local storage not enabled'}), 404
+        cached = upload_cache.get(file_key) if upload_cache else None
+        if cached:
+            view, content_type = cached
+            response = Response(iter_upload_chunks(view), content_type=content_type)
+            response.content_length = len(view)
+            return response
         data, content_type = local_read_file(LOCAL_STORAGE_PATH, file_key)
         if data is None:
             return jsonify({'error': 'File not found'}), 404
@@ -286,14 +328,14 @@ def register_routes(
                     continue
                 set_key(DOTENV_PATH, key, val)
                 saved.append(key)
-            logger.info(f'Settings updated via dashboard: {saved}')
+            logger.info('Settings updated via dashboard: %s', saved)
             return jsonify({'saved': saved, 'restart_required': True})
         except PermissionError:
             msg = f'Permission denied writing {DOTENV_PATH}. Run: chmod 664 {DOTENV_PATH}'
             logger.error(msg)
             return jsonify({'error': msg}), 500
         except Exception as e:
-            logger.error(f'Failed to save settings: {e}')
+            logger.error('Failed to save settings: %s', e)
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/restart', methods=['POST'])
@@ -308,10 +350,174 @@ def register_routes(
         logger.info('Server restart requested via dashboard')
         return jsonify({'status': 'restarting'})
 
+    @app.route('/api/drain', methods=['GET', 'POST'])
+    @login_required
+    def drain_server():
+        if not drain:
+            return jsonify({'error': 'Drain is not available'}), 404
+        if request.method == 'POST':
+            body = request.get_json(silent=True) or {}
+            try:
+                deadline_ms = int(body['deadline_ms']) if body.get('deadline_ms') is not None else None
+                window_ms = int(body['window_ms']) if body.get('window_ms') is not None else None
+            except (TypeError, ValueError):
+                return jsonify({'error': 'deadline_ms and window_ms must be integers'}), 400
+            if not start_drain(deadline_ms=deadline_ms, window_ms=window_ms):
+                return jsonify(dict(drain.status(), error='Drain already started')), 409
+            logger.info('Drain requested via dashboard')
+            return jsonify(drain.status()), 202
+        return jsonify(drain.status())
+
+    def read_relay_body():
+        """The request body, or None when it is larger than RELAY_MAX_FRAME_BYTES."""
+        if not RELAY_MAX_FRAME_BYTES:
+            return request.get_data()
+        # MAX_CONTENT_LENGTH is app-wide and would also cap local file uploads,
+        # so bound this body here; a chunked body has no content_length to check.
+        if (request.content_length or 0) > RELAY_MAX_FRAME_BYTES:
+            return None
+        body = request.stream.read(RELAY_MAX_FRAME_BYTES + 1)
+        return body if len(body) <= RELAY_MAX_FRAME_BYTES else None
+
+    def relay_batch(items, source_ip, first_index=0):
+        """Validate ``items`` in one pass, then relay them room by room in order; returns one result per item."""
+        results = [None] * len(items)
+        by_room = {}
+        for offset, item in enumerate(items):
+            if isinstance(item, dict) and item.get('room') and isinstance(item['room'], str) \
+                    and item.get('event') and isinstance(item['event'], str) and item.get('data') is not None:
+                by_room.setdefault(item['room'], []).append(offset)
+            else:
+                results[offset] = {'index': first_index + offset, 'status': 'error',
+                                   'error': str(item) if isinstance(item, ValueError) else 'Missing room, event, or data'}
+
+        skip_sids_by_sender = {}
+        for room, offsets in by_room.items():
+            relayed = {}
+            senders = set()
+            for offset in offsets:
+                item = items[offset]
+                event, data = item['event'], item['data']
+                sender_id = item.get('sender_id') or item.get('client_id')
+                result = results[offset] = {'index': first_index + offset, 'status': 'ok'}
+
+                if rate_limiter:
+                    rejection = rate_limiter.check('relay', sid=f'ip:{source_ip}', client_id=sender_id, room=room)
+                    if rejection:
+                        result.update(status='rate_limited', limiter=rejection['limiter'],
+                                      retry_after_ms=rejection['retry_after_ms'])
+                        continue
+
+                if event == 'clipboard_sync' and isinstance(data, dict):
+                    if clipboard_dedup and clipboard_dedup.is_duplicate(room, data):
+                        result['status'] = 'duplicate'
+                        continue
+                    if payload_spiller:
+                        data = payload_spiller.spill(data)
+                    if clipboard_backlog:
+                        result['seq'] = clipboard_backlog.append(room, sender_id, data)
+                        data = dict(data, seq=result['seq'])
+
+                if sender_id not in skip_sids_by_sender:
+                    skip_sids_by_sender[sender_id] = list(CLIENT_SESSIONS.get(sender_id, ())) if sender_id else []
+                socketio.emit(event, data, room=room, skip_sid=skip_sids_by_sender[sender_id] or None)
+                debug_signal_log('http_tx', data, room=room, event=event, sender=sender_id or 'API', sid='http')
+                relayed[event] = relayed.get(event, 0) + 1
+                senders.add(sender_id or 'API')
+
+            if relayed:
+                if live_series:
+                    live_series.increment('relays', sum(relayed.values()))
+                # One log line and one dashboard entry per room instead of per event.
+                summary = ', '.join(f'{event} x{count}' for event, count in relayed.items())
+                logger.info("Relayed HTTP batch to room %s: %s", room, summary)
+                activity_type = next(iter(relayed)) if len(relayed) == 1 else 'api_relay'
+                emit_activity_log(activity_type if activity_type in ALLOWED_ACTIVITY_TYPES else 'api_relay',
+                                  room, ', '.join(sorted(senders)), f"Batch: {summary}")
+        return results
+
+    def read_ndjson_items():
+        """Yield each non-blank line of the request body parsed, or a ValueError for a bad or oversized line."""
+        # Room for one byte over the limit plus the line break.
+        limit = RELAY_MAX_FRAME_BYTES + 2 if RELAY_MAX_FRAME_BYTES else -1
+        # The raw request stream reads a line one byte at a time; buffer it.
+        stream = io.BufferedReader(request.stream, 64 * 1024)
+        while True:
+            line = stream.readline(limit)
+            if not line:
+                return
+            if RELAY_MAX_FRAME_BYTES and len(line.rstrip(b'\r\n')) > RELAY_MAX_FRAME_BYTES:
+                while line and not line.endswith(b'\n'):
+                    line = stream.readline(limit)
+                yield ValueError(f'Event exceeds {RELAY_MAX_FRAME_BYTES} bytes')
+            elif line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield ValueError('Invalid JSON')
+
+    def stream_ndjson_batch(source_ip):
+        counts = {}
+        index = 0
+        items = read_ndjson_items()
+        while True:
+            # Each chunk is validated, grouped by room and relayed before the next is read.
+            chunk = list(itertools.islice(items, RELAY_BATCH_MAX_EVENTS))
+            if not chunk:
+                break
+            try:
+                results = relay_batch(chunk, source_ip, first_index=index)
+            except Exception as e:
+                logger.error("Batch relay error: %s", e)
+                yield json.dumps({'error': str(e)}) + '\n'
+                return
+            for result in results:
+                counts[result['status']] = counts.get(result['status'], 0) + 1
+            yield ''.join(json.dumps(result, separators=(',', ':')) + '\n' for result in results)
+            index += len(chunk)
+        yield json.dumps({'done': True, 'counts': counts}, separators=(',', ':')) + '\n'
+
+    @app.route('/api/relay/batch', methods=['POST'])
+    def relay_batch_messages():
+        # remote_addr is the peer socket, or the client address ProxyFix took from the trusted proxy hop.
+        source_ip = request.remote_addr or ''
+        if request.mimetype == 'application/x-ndjson':
+            return Response(stream_with_context(stream_ndjson_batch(source_ip)), content_type='application/x-ndjson')
+
+        body = read_relay_body()
+        if body is None:
+            return jsonify({'error': f'Payload exceeds {RELAY_MAX_FRAME_BYTES} bytes'}), 413
+        try:
+            content = json.loads(body)
+        except ValueError:
+            return jsonify({'error': 'Invalid JSON body'}), 400
+        items = content.get('events') if isinstance(content, dict) else content
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Expected a non-empty events array'}), 400
+        if len(items) > RELAY_BATCH_MAX_EVENTS:
+            return jsonify({'error': f'Batch exceeds {RELAY_BATCH_MAX_EVENTS} events; send NDJSON to stream more'}), 413
+        try:
+            results = relay_batch(items, source_ip)
+        except Exception as e:
+            logger.error("Batch relay error: %s", e)
+            return jsonify({'error': str(e)}), 500
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return jsonify({'counts': counts, 'results': results}), 200
+
     @app.route('/api/relay', methods=['POST'])
     def relay_message():
+        body = read_relay_body()
+        if body is None:
+            return jsonify({'error': f'Payload exceeds {RELAY_MAX_FRAME_BYTES} bytes'}), 413
+        try:
+            content = json.loads(body)
+        except ValueError:
+            return jsonify({'error': 'Invalid JSON body'}), 400
+        if not isinstance(content, dict):
+            return jsonify({'error': 'Missing room, event, or data'}), 400
         try:
-            content = request.json
             room = content.get('room')
             event = content.get('event')
             data = content.get('data')
@@ -322,10 +528,37 @@ def register_routes(
             if not room or not event or data is None:
                 return jsonify({'error': 'Missing room, event, or data'}), 400
 
+            if rate_limiter:
+                # remote_addr is the peer socket, or the client address ProxyFix
+                # took from the trusted proxy hop; never the raw X-Forwarded-For.
+                source_ip = request.remote_addr or ''
+                rejection = rate_limiter.check('relay', sid=f'ip:{source_ip}', client_id=sender_id, room=room)
+                if rejection:
+                    retry_after_ms = rejection['retry_after_ms']
+                    logger.warning("Rate limited HTTP relay from %s room=%s (%s)", source_ip, room, rejection['limiter'])
+                    response = jsonify({
+                        'error': 'Rate limit exceeded',
+                        'code': 'E_RATE_LIMITED',
+                        'limiter': rejection['limiter'],
+                        'retry_after_ms': retry_after_ms,
+                    })
+                    response.headers['Retry-After'] = str(max(1, -(-retry_after_ms // 1000)))
+                    return response, 429
+
+            if clipboard_dedup and event == 'clipboard_sync' and clipboard_dedup.is_duplicate(room, data):
+                logger.debug("Suppressed duplicate HTTP clipboard relay in room %s", room)
+                return jsonify({'status': 'duplicate'}), 200
+
+            if payload_spiller and event == 'clipboard_sync' and isinstance(data, dict):
+                data = payload_spiller.spill(data)
+
             skip_sids = []
             if sender_id and sender_id in CLIENT_SESSIONS:
                 skip_sids = list(CLIENT_SESSIONS[sender_id])
-                logger.info(f"Skipping sids for sender {sender_id}: {skip_sids}")
+                logger.info("Skipping sids for sender %s: %s", sender_id, skip_sids)
+
+            if clipboard_backlog and event == 'clipboard_sync' and isinstance(data, dict):
+                data = dict(data, seq=clipboard_backlog.append(room, sender_id, data))
 
             if skip_sids:
                 socketio.emit(event, data, room=room, skip_sid=skip_sids)
@@ -333,27 +566,55 @@ def register_routes(
                 socketio.emit(event, data, room=room)
 
             debug_signal_log('http_tx', data, room=room, event=event, sender=sender_id or 'API', sid='http')
-            logger.info(f"Relayed HTTP message to room {room}: event={event}, skipped={len(skip_sids)}")
+            logger.info("Relayed HTTP message to room %s: event=%s, skipped=%s", room, event, len(skip_sids))
+            if live_series:
+                live_series.increment('relays')
 
             activity_type = event if event in ALLOWED_ACTIVITY_TYPES else 'api_relay'
             emit_activity_log(activity_type, room, sender_id or 'API', f"Event: {event}")
 
             return jsonify({'status': 'ok'}), 200
         except Exception as e:
-            logger.error(f"Relay error: {e}")
+            logger.error("Relay error: %s", e)
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if not metrics:
+            return jsonify({'error': 'metrics not configured'}), 503
+        # Scrapers use the bearer token; without one configured only a dashboard session may read it.
+        if METRICS_TOKEN:
+            supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+            if not hmac.compare_digest(supplied.encode(), METRICS_TOKEN.encode()):
+                return jsonify({'error': 'Unauthorized'}), 401
+        elif not current_user.is_authenticated:
+            return jsonify({'error': 'Unauthorized'}), 401
+        return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
     @app.route('/history')
     @login_required
     def history_page():
         return render_template('history.html')
 
+    def history_json(name, compute, **params):
+        # Cached body + ETag; the browser revalidates each poll and gets a 304 while nothing changed
+        if not history_cache:
+            return jsonify(compute())
+        body, etag = history_cache.lookup(name, params, compute)
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.make_conditional(request)
+        if response.status_code == 304:
+            history_cache.record_not_modified()
+        return response
+
     @app.route('/api/history/summary')
     @login_required
     def api_history_summary():
         if not HISTORY_DB_PATH:
             return jsonify({'error': 'history not configured'}), 503
-        return jsonify(history_query_summary(HISTORY_DB_PATH))
+        return history_json('summary', lambda: history_query_summary(HISTORY_DB_PATH))
 
     @app.route('/api/history/clients')
     @login_required
@@ -363,15 +624,44 @@ def register_routes(
         search = request.args.get('search', '').strip()
         limit = min(int(request.args.get('limit', 100)), 500)
         offset = int(request.args.get('offset', 0))
-        rows, total = history_query_clients(HISTORY_DB_PATH, search=search, limit=limit, offset=offset)
-        return jsonify({'clients': rows, 'total': total})
+
+        def compute():
+            rows, total = history_query_clients(HISTORY_DB_PATH, search=search, limit=limit, offset=offset)
+            return {'clients': rows, 'total': total}
+
+        return history_json('clients', compute, search=search, limit=limit, offset=offset)
+
+    @app.route('/api/history/export/<table>')
+    @login_required
+    def api_history_export(table):
+        if not HISTORY_DB_PATH or not history_export_rows:
+            return jsonify({'error': 'history not configured'}), 503
+        if table not in EXPORT_COLUMNS:
+            return jsonify({'error': f"table must be one of {', '.join(EXPORT_COLUMNS)}"}), 404
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+        try:
+            since = parse_export_time(request.args.get('since'))
+            until = parse_export_time(request.args.get('until'))
+        except ValueError:
+            return jsonify({'error': 'since and until must be ISO dates or datetimes'}), 400
+        room = request.args.get('room') or None
+        gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+        rows = history_export_rows(HISTORY_DB_PATH, table, since=since, until=until, room=room)
+        filename = f"{table}.{fmt}{'.gz' if gzip else ''}"
+        response = Response(encode_export(EXPORT_COLUMNS[table], rows, fmt, gzip=gzip),
+                            content_type='application/gzip' if gzip else f'{EXPORT_FORMATS[fmt]}; charset=utf-8')
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
     @app.route('/api/history/hourly')
     @login_required
     def api_history_hourly():
         if not HISTORY_DB_PATH:
             return jsonify({'error': 'history not configured'}), 503
-        return jsonify(history_query_hourly(HISTORY_DB_PATH))
+        return history_json('hourly', lambda: history_query_hourly(HISTORY_DB_PATH))
 
     @app.route('/api/history/daily')
     @login_required
@@ -379,11 +669,57 @@ def register_routes(
         if not HISTORY_DB_PATH:
             return jsonify({'error': 'history not configured'}), 503
         days = int(request.args.get('days', 30))
-        return jsonify(history_query_daily(HISTORY_DB_PATH, days=days))
+        return history_json('daily', lambda: history_query_daily(HISTORY_DB_PATH, days=days), days=days)
 
     @app.route('/api/history/countries')
     @login_required
     def api_history_countries():
         if not HISTORY_DB_PATH:
             return jsonify({'error': 'history not configured'}), 503
-        return jsonify(history_query_countries(HISTORY_DB_PATH))
+        return history_json('countries', lambda: history_query_countries(HISTORY_DB_PATH))
+
+    @app.route('/api/history/transfers')
+    @login_required
+    def api_history_transfers():
+        if not HISTORY_DB_PATH or not history_query_transfer_summary:
+            return jsonify({'error': 'history not configured'}), 503
+        days = int(request.args.get('days', 30))
+        return history_json('transfer_summary', lambda: history_query_transfer_summary(HISTORY_DB_PATH, days=days), days=days)
+
+    @app.route('/api/history/transfers/by_room_state')
+    @login_required
+    def api_history_transfers_by_room_state():
+        if not HISTORY_DB_PATH or not history_query_transfers_by_room_state:
+            return jsonify({'error': 'history not configured'}), 503
+        days = int(request.args.get('days', 30))
+        return history_json('transfers_by_room_state', lambda: history_query_transfers_by_room_state(HISTORY_DB_PATH, days=days), days=days)
+
+    @app.route('/api/history/transfers/by_size')
+    @login_required
+    def api_history_transfers_by_size():
+        if not HISTORY_DB_PATH or not history_query_transfers_by_size:
+            return jsonify({'error': 'history not configured'}), 503
+        days = int(request.args.get('days', 30))
+        return history_json('transfers_by_size', lambda: history_query_transfers_by_size(HISTORY_DB_PATH, days=days), days=days)
+
+    @app.route('/api/history/transfers/by_reason')
+    @login_required
+    def api_history_transfers_by_reason():
+        if not HISTORY_DB_PATH or not history_query_transfers_by_reason:
+            return jsonify({'error': 'history not configured'}), 503
+        days = int(request.args.get('days', 30))
+        return history_json('transfers_by_reason', lambda: history_query_transfers_by_reason(HISTORY_DB_PATH, days=days), days=days)
+
+    @app.route('/api/live/series')
+    @login_required
+    def api_live_series():
+        if not live_series:
+            return jsonify({'error': 'live series not configured'}), 503
+        resolution = request.args.get('resolution', 'minute')
+        if resolution not in LIVE_RESOLUTIONS:
+            return jsonify({'error': f"resolution must be one of {', '.join(LIVE_RESOLUTIONS)}"}), 400
+        try:
+            points = int(request.args['points']) if request.args.get('points') else None
+        except ValueError:
+            return jsonify({'error': 'points must be an integer'}), 400
+        return jsonify(live_series.window(resolution, points))
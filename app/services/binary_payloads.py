@@ -0,0 +1,36 @@
+"""
+Binary payload values for sessions that negotiated binary mode.
+
+Clipboard ciphertext and file metadata are base64 text in the JSON wire
+format, a third larger than the bytes they carry and parsed as one big JSON
+string.  A session that joins with ``"binary": true`` may send such values as
+``bytes``; Socket.IO then ships them as binary attachments next to a small
+JSON envelope.  Sessions that did not opt in keep receiving base64 text, so a
+relayed payload is encoded at most once per wire format.
+"""
+
+import base64
+
+BINARY_TYPES = (bytes, bytearray, memoryview)
+
+
+def has_binary(value):
+    """True if ``value`` holds bytes anywhere in its dicts/lists."""
+    if isinstance(value, BINARY_TYPES):
+        return True
+    if isinstance(value, dict):
+        return any(has_binary(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(has_binary(item) for item in value)
+    return False
+
+
+def to_text_payload(value):
+    """Copy of ``value`` with every bytes value replaced by its base64 text."""
+    if isinstance(value, BINARY_TYPES):
+        return base64.b64encode(value).decode('ascii')
+    if isinstance(value, dict):
+        return {key: to_text_payload(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_text_payload(item) for item in value]
+    return value
@@ -0,0 +1,196 @@
+"""
+Store-and-forward buffer for relayed clipboard items.
+
+Every clipboard item relayed to a room is assigned a per-room sequence number
+and kept in a bounded ring buffer, so a peer that was reconnecting while the
+item was relayed can send ``last_seq`` on ``join`` and receive only what it
+missed.
+
+The buffer is capped per room (item count and bytes), globally (bytes) and by
+age; the oldest items are evicted first.  Sequence counters are kept for the
+``max_rooms`` most recently used rooms; a room that falls off the end loses
+its buffered items and restarts at seq 1, which ``since`` already reports as a
+truncated replay.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Rebuild the global eviction order once this many of its tuples point at
+# items that room-level eviction already dropped.
+STALE_COMPACT_MIN = 1024
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def estimate_payload_size(value):
+    """Cheap approximation of a payload's encoded size without serializing it."""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(k)) + estimate_payload_size(v) + 4 for k, v in value.items()) + 2
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_payload_size(v) + 1 for v in value) + 2
+    return 8
+
+
+class ClipboardBacklog:
+    def __init__(self, *, max_items_per_room=20, max_bytes_per_room=2 * 1024 * 1024,
+                 max_bytes_total=64 * 1024 * 1024, ttl_ms=10 * 60 * 1000, max_rooms=100000,
+                 clock=_now_ms):
+        self.max_items_per_room = max(1, int(max_items_per_room))
+        self.max_bytes_per_room = max(1, int(max_bytes_per_room))
+        self.max_bytes_total = max(1, int(max_bytes_total))
+        self.ttl_ms = max(0, int(ttl_ms))
+        self.max_rooms = max(1, int(max_rooms))
+        self._clock = clock
+        self._lock = threading.Lock()
+        # room -> deque of entries ordered by seq
+        self._rooms = {}
+        self._room_bytes = {}
+        # Sequence counters outlive the buffered items so seq never goes backwards
+        # while the room stays among the max_rooms most recently used.
+        self._room_seq = OrderedDict()
+        # (room, seq, size) in global insertion order, for global cap and TTL;
+        # _stale_count of them refer to items already dropped by room-level eviction.
+        self._global_order = deque()
+        self._stale_count = 0
+        self.total_bytes = 0
+        self.stats = {'appended': 0, 'replayed': 0, 'evicted_ttl': 0, 'evicted_room_cap': 0,
+                      'evicted_global_cap': 0, 'rejected_oversize': 0, 'evicted_rooms': 0,
+                      'compactions': 0}
+
+    def _drop_oldest(self, room):
+        entries = self._rooms[room]
+        entry = entries.popleft()
+        self._room_bytes[room] -= entry['size']
+        self.total_bytes -= entry['size']
+        if not entries:
+            self._rooms.pop(room, None)
+            self._room_bytes.pop(room, None)
+        return entry
+
+    def _drop_oldest_stale(self, room):
+        """Drop a room's oldest item outside global order, leaving its tuple stale."""
+        self._drop_oldest(room)
+        self._stale_count += 1
+        if self._stale_count > max(STALE_COMPACT_MIN, len(self._global_order) // 2):
+            self._compact_global_order()
+
+    def _compact_global_order(self):
+        # Rooms only lose items from the front, so a tuple is live iff its seq
+        # is not older than the room's oldest buffered item.
+        live = deque()
+        for item in self._global_order:
+            entries = self._rooms.get(item[0])
+            if entries and item[1] >= entries[0]['seq']:
+                live.append(item)
+        self._global_order = live
+        self._stale_count = 0
+        self.stats['compactions'] += 1
+
+    def _evict_global_front(self):
+        room, seq, _ = self._global_order.popleft()
+        entries = self._rooms.get(room)
+        if entries and entries[0]['seq'] == seq:
+            self._drop_oldest(room)
+            return True
+        # Room-level eviction already removed it.
+        self._stale_count = max(0, self._stale_count - 1)
+        return False
+
+    def _next_seq(self, room):
+        seq = self._room_seq.get(room, 0) + 1
+        self._room_seq[room] = seq
+        self._room_seq.move_to_end(room)
+        while len(self._room_seq) > self.max_rooms:
+            evicted_room, _ = self._room_seq.popitem(last=False)
+            while evicted_room in self._rooms:
+                self._drop_oldest_stale(evicted_room)
+            self.stats['evicted_rooms'] += 1
+        return seq
+
+    def _evict_expired(self, now_ms):
+        if not self.ttl_ms:
+            return
+        cutoff = now_ms - self.ttl_ms
+        while self._global_order:
+            room, seq, _ = self._global_order[0]
+            entries = self._rooms.get(room)
+            if entries and entries[0]['seq'] == seq and entries[0]['stored_at_ms'] > cutoff:
+                break
+            if self._evict_global_front():
+                self.stats['evicted_ttl'] += 1
+
+    def append(self, room, sender_client_id, data):
+        """Buffer ``data`` for ``room`` and return its sequence number."""
+        now_ms = self._clock()
+        size = estimate_payload_size(data)
+        with self._lock:
+            seq = self._next_seq(room)
+            self._evict_expired(now_ms)
+            if size > self.max_bytes_per_room or size > self.max_bytes_total:
+                self.stats['rejected_oversize'] += 1
+                return seq
+
+            entries = self._rooms.setdefault(room, deque())
+            entries.append({
+                'seq': seq,
+                'sender_client_id': sender_client_id,
+                'stored_at_ms': now_ms,
+                'size': size,
+                'data': data,
+            })
+            self._room_bytes[room] = self._room_bytes.get(room, 0) + size
+            self.total_bytes += size
+            self._global_order.append((room, seq, size))
+            self.stats['appended'] += 1
+
+            while len(entries) > self.max_items_per_room or self._room_bytes[room] > self.max_bytes_per_room:
+                self._drop_oldest_stale(room)
+                self.stats['evicted_room_cap'] += 1
+            while self.total_bytes > self.max_bytes_total and self._global_order:
+                if self._evict_global_front():
+                    self.stats['evicted_global_cap'] += 1
+        return seq
+
+    def since(self, room, last_seq, exclude_sender=None):
+        """Return ``(items, truncated)`` for items newer than ``last_seq``.
+
+        ``truncated`` is True when items after ``last_seq`` were already
+        evicted, so the caller knows the replay is incomplete.
+        """
+        try:
+            last_seq = int(last_seq)
+        except (TypeError, ValueError):
+            return [], False
+        with self._lock:
+            self._evict_expired(self._clock())
+            entries = self._rooms.get(room) or ()
+            latest_seq = self._room_seq.get(room, 0)
+            if last_seq > latest_seq:
+                # The client saw a sequence this server never issued (counters
+                # were reset), so everything buffered is new to it.
+                last_seq = 0
+                truncated = True
+            else:
+                oldest_seq = entries[0]['seq'] if entries else latest_seq + 1
+                truncated = oldest_seq > last_seq + 1 and last_seq < latest_seq
+            items = [entry for entry in entries
+                     if entry['seq'] > last_seq and entry['sender_client_id'] != exclude_sender]
+            self.stats['replayed'] += len(items)
+        return items, truncated
+
+    def latest_seq(self, room):
+        return self._room_seq.get(room, 0)
+
+    def room_count(self):
+        return len(self._rooms)
+
+    def tracked_room_count(self):
+        return len(self._room_seq)
@@ -0,0 +1,100 @@
+"""
+Suppression of repeated clipboard content within a room.
+
+Two devices that watch each other's clipboards bounce every item back to the
+relay.  Each relayed payload is fingerprinted — by the client-supplied
+``content_hash`` when present (encrypted content uses a fresh IV per push, so
+only the client can hash the plaintext), otherwise by hashing the content —
+and a repeat of a fingerprint seen in the same room within the window is
+suppressed.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+# Fields that change on every push without changing what was copied.
+_VOLATILE_KEYS = {'room', 'seq', 'replayed', 'timestamp', 'sent_at_ms', 'sender_id', 'client_id', 'message_id'}
+
+
+def fingerprint_clipboard_payload(data):
+    if not isinstance(data, dict):
+        return None
+    client_hash = data.get('content_hash')
+    if isinstance(client_hash, str) and client_hash.strip():
+        return 'c:' + client_hash.strip()
+
+    content = data.get('content')
+    if isinstance(content, str):
+        raw = content.encode('utf-8', 'surrogatepass')
+    elif isinstance(content, (bytes, bytearray)):
+        raw = bytes(content)
+    else:
+        stable = {k: v for k, v in data.items() if k not in _VOLATILE_KEYS}
+        try:
+            raw = json.dumps(stable, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+        except Exception:
+            return None
+    return 's:' + hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class ClipboardDeduplicator:
+    def __init__(self, *, window_ms=5000, max_fingerprints_per_room=32, max_rooms=10000, clock=_now_ms):
+        self.window_ms = max(0, int(window_ms))
+        self.max_fingerprints_per_room = max(1, int(max_fingerprints_per_room))
+        self.max_rooms = max(1, int(max_rooms))
+        self._clock = clock
+        self._lock = threading.Lock()
+        # room -> OrderedDict(fingerprint -> last_seen_ms), least recently seen first
+        self._rooms = OrderedDict()
+        self.suppressed_by_room = {}
+        self.stats = {'checked': 0, 'suppressed': 0}
+
+    @property
+    def enabled(self):
+        return self.window_ms > 0
+
+    def is_duplicate(self, room, data):
+        """Record ``data`` for ``room``; return True if it repeats recent content."""
+        if not self.enabled or not room:
+            return False
+        fingerprint = fingerprint_clipboard_payload(data)
+        if fingerprint is None:
+            return False
+
+        now_ms = self._clock()
+        with self._lock:
+            self.stats['checked'] += 1
+            seen = self._rooms.get(room)
+            if seen is None:
+                seen = self._rooms[room] = OrderedDict()
+                if len(self._rooms) > self.max_rooms:
+                    evicted_room, _ = self._rooms.popitem(last=False)
+                    self.suppressed_by_room.pop(evicted_room, None)
+            else:
+                self._rooms.move_to_end(room)
+
+            last_seen_ms = seen.get(fingerprint)
+            # Refreshing the timestamp keeps an ongoing echo loop suppressed.
+            seen[fingerprint] = now_ms
+            seen.move_to_end(fingerprint)
+            if len(seen) > self.max_fingerprints_per_room:
+                seen.popitem(last=False)
+
+            if last_seen_ms is not None and now_ms - last_seen_ms < self.window_ms:
+                self.stats['suppressed'] += 1
+                self.suppressed_by_room[room] = self.suppressed_by_room.get(room, 0) + 1
+                return True
+        return False
+
+    def clear(self):
+        with self._lock:
+            self._rooms.clear()
+            self.suppressed_by_room.clear()
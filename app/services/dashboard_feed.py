@@ -0,0 +1,117 @@
+"""
+Live dashboard feed on the ``/dashboard`` Socket.IO namespace.
+
+Dashboards used to join ``dashboard_room`` on the default namespace, so
+every dashboard got every event of every room and the full session list was
+rebuilt on each join and disconnect even with no dashboard open.  Each
+dashboard session now holds a subscription: the streams it wants plus
+optional room, client type and activity type filters.  ``publish`` builds a
+payload only when some subscription matches and sends it in one emit to all
+matching sessions, so it is encoded once; ``publish_views`` builds one
+payload per distinct room/client-type view instead.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = '/dashboard'
+STREAMS = ('client_list_update', 'room_state_changed', 'activity_log', 'server_stats', 'live_series')
+FILTERS = ('rooms', 'client_types', 'activity_types')
+
+
+def _string_set(value, key, lower=False):
+    if isinstance(value, str) or not isinstance(value, (list, tuple)) \
+            or not all(isinstance(item, str) and item for item in value):
+        raise ValueError(f'{key} must be a list of strings or null')
+    return frozenset(item.strip().lower() if lower else item for item in value)
+
+
+def normalize_subscription(data):
+    """``subscribe`` payload -> ``{'streams': frozenset, 'rooms': frozenset or None, ...}``; raises ValueError."""
+    data = data if isinstance(data, dict) else {}
+    streams = data.get('streams')
+    subscription = {'streams': frozenset(STREAMS) if streams is None else _string_set(streams, 'streams')}
+    unknown = subscription['streams'] - set(STREAMS)
+    if unknown:
+        raise ValueError(f"unknown streams: {', '.join(sorted(unknown))}")
+    for key in FILTERS:
+        value = data.get(key)
+        subscription[key] = None if value is None else _string_set(value, key, lower=key != 'rooms')
+    return subscription
+
+
+def describe_subscription(subscription):
+    """JSON-friendly form of a subscription, as echoed in the ``subscribe`` ack."""
+    return {key: None if value is None else sorted(value) for key, value in subscription.items()}
+
+
+def _matches(subscription, event, rooms, client_type, activity_type):
+    if event not in subscription['streams']:
+        return False
+    wanted_rooms = subscription['rooms']
+    if rooms is not None and wanted_rooms is not None and wanted_rooms.isdisjoint(rooms):
+        return False
+    wanted_types = subscription['client_types']
+    if client_type is not None and wanted_types is not None and client_type not in wanted_types:
+        return False
+    wanted_activity = subscription['activity_types']
+    if activity_type is not None and wanted_activity is not None and activity_type not in wanted_activity:
+        return False
+    return True
+
+
+class DashboardFeed:
+    def __init__(self, emit):
+        """``emit(event, payload, sids)`` sends one event to a list of dashboard sessions."""
+        self.emit = emit
+        self.subscriptions = {}
+        self.stats = {'sent': 0, 'skipped': 0}
+
+    def subscribe(self, sid, data=None):
+        """Replace ``sid``'s subscription; no ``data`` means every stream, unfiltered."""
+        subscription = normalize_subscription(data)
+        self.subscriptions[sid] = subscription
+        return subscription
+
+    def unsubscribe(self, sid):
+        self.subscriptions.pop(sid, None)
+
+    def watching(self):
+        return bool(self.subscriptions)
+
+    def recipients(self, event, *, rooms=None, client_type=None, activity_type=None):
+        """Matching sids.  ``rooms`` are the rooms the event concerns, None when it is not about rooms;
+        a None ``client_type`` or ``activity_type`` passes those filters."""
+        return [sid for sid, subscription in self.subscriptions.items()
+                if _matches(subscription, event, rooms, client_type, activity_type)]
+
+    def publish(self, event, payload, *, rooms=None, client_type=None, activity_type=None):
+        """Send ``payload`` (or ``payload()``, built only if someone matches) to matching dashboards."""
+        sids = self.recipients(event, rooms=rooms, client_type=client_type, activity_type=activity_type)
+        if not sids:
+            self.stats['skipped'] += 1
+            return 0
+        self._send(event, payload() if callable(payload) else payload, sids)
+        return len(sids)
+
+    def publish_views(self, event, build, *, rooms=None):
+        """Send each group of dashboards sharing a room/client-type view ``build(rooms, client_types)``."""
+        views = {}
+        for sid, subscription in self.subscriptions.items():
+            if _matches(subscription, event, rooms, None, None):
+                views.setdefault((subscription['rooms'], subscription['client_types']), []).append(sid)
+        if not views:
+            self.stats['skipped'] += 1
+            return 0
+        for (view_rooms, view_types), sids in views.items():
+            self._send(event, build(view_rooms, view_types), sids)
+        return sum(len(sids) for sids in views.values())
+
+    def _send(self, event, payload, sids):
+        try:
+            self.emit(event, payload, sids)
+        except Exception as e:
+            logger.warning(f'Dashboard {event} emit failed: {e}')
+            return
+        self.stats['sent'] += 1
@@ -0,0 +1,114 @@
+"""
+Graceful drain before a node is scaled down or restarted.
+
+Dropping every socket at once makes all devices reconnect in the same
+instant.  Draining instead stops accepting joins, waits up to
+``deadline_ms`` for undecided transfers to finish, then sends each
+connected session a ``server_migrating`` event with its own reconnect delay
+and closes the session when that delay is up.  Delays are jittered within
+equal slots of ``window_ms`` so reconnects arrive at a flat rate instead of
+a spike, whatever the random draw.
+"""
+
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+SERVING = 'serving'
+DRAINING = 'draining'
+MIGRATING = 'migrating'
+DRAINED = 'drained'
+STATES = (SERVING, DRAINING, MIGRATING, DRAINED)
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def migration_plan(sids, window_ms, rng=random):
+    """``[(delay_ms, sid), ...]`` in delay order, one random delay per equal slot of ``window_ms``."""
+    sids = list(sids)
+    rng.shuffle(sids)
+    count = len(sids)
+    return [(int((i + rng.random()) * window_ms / count), sid) for i, sid in enumerate(sids)]
+
+
+class DrainController:
+    def __init__(self, *, list_sids, count_pending_transfers, send_migrating, disconnect_sid,
+                 deadline_ms=30000, window_ms=30000, poll_ms=500, clock=_now_ms, rng=None):
+        """``send_migrating(sid, payload)`` emits ``server_migrating``; ``disconnect_sid(sid)`` closes a session."""
+        self.list_sids = list_sids
+        self.count_pending_transfers = count_pending_transfers
+        self.send_migrating = send_migrating
+        self.disconnect_sid = disconnect_sid
+        self.deadline_ms = max(0, int(deadline_ms))
+        self.window_ms = max(0, int(window_ms))
+        self.poll_ms = max(1, int(poll_ms))
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self.state = SERVING
+        self.started_at_ms = None
+        self.stats = {'rejected_joins': 0, 'planned': 0, 'migrated': 0}
+
+    @property
+    def accepting_joins(self):
+        return self.state == SERVING
+
+    def start(self, deadline_ms=None, window_ms=None):
+        """Begin draining; returns False if a drain already started.  The caller runs ``run()``."""
+        if self.state != SERVING:
+            return False
+        if deadline_ms is not None:
+            self.deadline_ms = max(0, int(deadline_ms))
+        if window_ms is not None:
+            self.window_ms = max(0, int(window_ms))
+        self.state = DRAINING
+        self.started_at_ms = self._clock()
+        logger.warning(f'Drain started: joins refused, transfers get {self.deadline_ms} ms, '
+                       f'sessions migrate over {self.window_ms} ms')
+        return True
+
+    def reject_join(self):
+        self.stats['rejected_joins'] += 1
+        return {'code': 'E_SERVER_DRAINING', 'msg': 'Server is draining; connect to another node',
+                'retry_after_ms': self.window_ms}
+
+    def status(self):
+        return {
+            'state': self.state,
+            'started_at_ms': self.started_at_ms,
+            'deadline_ms': self.deadline_ms,
+            'window_ms': self.window_ms,
+            'pending_transfers': self.count_pending_transfers() if self.state == DRAINING else 0,
+            'remaining_sessions': self.stats['planned'] - self.stats['migrated'],
+            **self.stats,
+        }
+
+    def run(self, sleep=time.sleep):
+        """Wait for transfers, then migrate every session; pass ``socketio.sleep`` to yield to the event loop."""
+        deadline_at_ms = self.started_at_ms + self.deadline_ms
+        while self.count_pending_transfers() and self._clock() < deadline_at_ms:
+            sleep(self.poll_ms / 1000.0)
+        pending = self.count_pending_transfers()
+        if pending:
+            logger.warning(f'Drain deadline reached with {pending} transfers undecided')
+
+        self.state = MIGRATING
+        plan = migration_plan(self.list_sids(), self.window_ms, self._rng)
+        self.stats['planned'] = len(plan)
+        for delay_ms, sid in plan:
+            self.send_migrating(sid, {'reconnect_delay_ms': delay_ms, 'window_ms': self.window_ms})
+        migration_started_ms = self._clock()
+        for delay_ms, sid in plan:
+            wait_ms = migration_started_ms + delay_ms - self._clock()
+            if wait_ms > 0:
+                sleep(wait_ms / 1000.0)
+            try:
+                self.disconnect_sid(sid)
+            except Exception as e:
+                logger.warning(f'Drain could not close session {sid}: {e}')
+            self.stats['migrated'] += 1
+        self.state = DRAINED
+        logger.warning(f'Drain finished: {len(plan)} sessions migrated')
@@ -2,17 +2,24 @@
 FCM (Firebase Cloud Messaging) service for dual-channel push delivery.
 
 When FIREBASE_CREDENTIALS_PATH is set, the relay server sends an FCM data
-message alongside every Socket.IO broadcast so Android devices can receive
-content even when the app is killed (no persistent connection required).
+message to peers that have no live Socket.IO connection, so Android devices
+are woken up even when the app is killed (no persistent connection required).
+
+Device tokens are collected from ``join`` payloads (``fcm_token``) into a
+persisted registry.  Sends are queued and delivered from a background task
+in multicast batches of up to 500 tokens; tokens that FCM reports as
+unregistered or invalid are pruned from the registry.
 
 FCM is fully optional — if the env var is missing or firebase-admin is not
 installed, all FCM calls are silently no-ops and Socket.IO remains the
 only delivery channel.
 """
 
+import json
 import logging
 import os
 import threading
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +27,16 @@ _fcm_initialized = False
 _fcm_available = False
 _init_lock = threading.Lock()
 
+# FCM rejects multicast messages addressed to more than 500 tokens.
+FCM_MULTICAST_MAX_TOKENS = 500
+
+RESULT_OK = 'ok'
+RESULT_INVALID_TOKEN = 'invalid_token'
+RESULT_ERROR = 'error'
+
+# Error codes meaning the token will never work again and should be dropped.
+_INVALID_TOKEN_CODES = {'NOT_FOUND', 'UNREGISTERED', 'INVALID_ARGUMENT', 'SENDER_ID_MISMATCH'}
+
 
 def _ensure_initialized():
     global _fcm_initialized, _fcm_available
@@ -58,9 +75,8 @@ def send_fcm_data(token: str, data: dict) -> bool:
         return False
     try:
         from firebase_admin import messaging
-        str_data = {k: str(v) for k, v in data.items() if v is not None}
         message = messaging.Message(
-            data=str_data,
+            data=_stringify_data(data),
             token=token,
             android=messaging.AndroidConfig(priority='high'),
         )
@@ -72,15 +88,281 @@ def send_fcm_data(token: str, data: dict) -> bool:
 
 
 def send_fcm_to_tokens(tokens: list, data: dict) -> int:
-    """Send FCM to a list of device tokens.
+    """Send FCM to a list of device tokens using multicast batches.
 
     Returns the number of successful deliveries.
     """
     if not tokens or not _ensure_initialized():
         return 0
+    transport = FirebaseTransport()
     success = 0
-    for token in tokens:
-        if send_fcm_data(token, data):
-            success += 1
+    for start in range(0, len(tokens), FCM_MULTICAST_MAX_TOKENS):
+        results = transport.send_multicast(tokens[start:start + FCM_MULTICAST_MAX_TOKENS], data)
+        success += sum(1 for result in results if result == RESULT_OK)
     logger.debug(f'FCM sent {success}/{len(tokens)} OK')
     return success
+
+
+def _stringify_data(data):
+    return {k: str(v) for k, v in data.items() if v is not None}
+
+
+class FirebaseTransport:
+    """Delivers multicast data messages through firebase-admin."""
+
+    def send_multicast(self, tokens, data):
+        """Returns one result per token: RESULT_OK, RESULT_INVALID_TOKEN or RESULT_ERROR."""
+        if not tokens:
+            return []
+        if not _ensure_initialized():
+            return [RESULT_ERROR] * len(tokens)
+        try:
+            from firebase_admin import messaging
+            message = messaging.MulticastMessage(
+                data=_stringify_data(data),
+                tokens=list(tokens),
+                android=messaging.AndroidConfig(priority='high'),
+            )
+            response = messaging.send_each_for_multicast(message)
+        except Exception as e:
+            logger.warning(f'FCM multicast failed ({len(tokens)} tokens): {e}')
+            return [RESULT_ERROR] * len(tokens)
+
+        results = []
+        for item in response.responses:
+            if item.success:
+                results.append(RESULT_OK)
+                continue
+            code = str(getattr(item.exception, 'code', '') or '').upper()
+            results.append(RESULT_INVALID_TOKEN if code in _INVALID_TOKEN_CODES else RESULT_ERROR)
+        return results
+
+
+class FakeTransport:
+    """In-memory transport for offline tests.
+
+    Every call is recorded in ``sent`` as ``(tokens, data)``; tokens listed in
+    ``invalid_tokens`` are reported as unregistered.
+    """
+
+    def __init__(self, invalid_tokens=()):
+        self.invalid_tokens = set(invalid_tokens)
+        self.sent = []
+
+    def send_multicast(self, tokens, data):
+        self.sent.append((list(tokens), dict(data)))
+        return [RESULT_INVALID_TOKEN if token in self.invalid_tokens else RESULT_OK for token in tokens]
+
+
+class DeviceTokenRegistry:
+    """client_id -> FCM token mapping, persisted as JSON so it survives restarts.
+
+    Changes are marked dirty and written by ``persist()``, which the delivery
+    worker calls periodically, so a join never waits on disk I/O.
+    """
+
+    def __init__(self, store_path=None):
+        self.store_path = store_path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._token_owners = {}
+        self._room_clients = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not self.store_path or not os.path.isfile(self.store_path):
+            return
+        try:
+            with open(self.store_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.error(f'FCM token registry load failed: {e}')
+            return
+        for client_id, entry in (entries or {}).items():
+            if isinstance(entry, dict) and entry.get('token'):
+                self._index(client_id, entry)
+
+    def _index(self, client_id, entry):
+        self._entries[client_id] = entry
+        self._token_owners[entry['token']] = client_id
+        room = entry.get('room')
+        if room:
+            self._room_clients.setdefault(room, set()).add(client_id)
+
+    def _unindex(self, client_id):
+        entry = self._entries.pop(client_id, None)
+        if not entry:
+            return
+        if self._token_owners.get(entry['token']) == client_id:
+            self._token_owners.pop(entry['token'], None)
+        room_clients = self._room_clients.get(entry.get('room'))
+        if room_clients is not None:
+            room_clients.discard(client_id)
+            if not room_clients:
+                self._room_clients.pop(entry.get('room'), None)
+
+    def persist(self):
+        if not self._dirty or not self.store_path:
+            return False
+        with self._lock:
+            snapshot = dict(self._entries)
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
+            tmp_path = self.store_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, separators=(',', ':'))
+            os.replace(tmp_path, self.store_path)
+            return True
+        except Exception as e:
+            self._dirty = True
+            logger.error(f'FCM token registry save failed: {e}')
+            return False
+
+    def register(self, client_id, token, room=None, client_type=None):
+        token = str(token or '').strip()
+        if not client_id or not token:
+            return False
+        with self._lock:
+            current = self._entries.get(client_id)
+            if current and current.get('token') == token and current.get('room') == room:
+                return False
+            # A token belongs to exactly one device; drop its previous owner.
+            previous_owner = self._token_owners.get(token)
+            if previous_owner and previous_owner != client_id:
+                self._unindex(previous_owner)
+            self._unindex(client_id)
+            self._index(client_id, {
+                'token': token,
+                'room': room,
+                'client_type': client_type,
+                'updated_at_ms': int(time.time() * 1000),
+            })
+            self._dirty = True
+        return True
+
+    def leave_room(self, client_id, room):
+        """Forget ``client_id``'s room after an explicit leave; the token is kept for its next join."""
+        with self._lock:
+            entry = self._entries.get(client_id)
+            if not entry or not room or entry.get('room') != room:
+                return False
+            self._unindex(client_id)
+            self._index(client_id, dict(entry, room=None, updated_at_ms=int(time.time() * 1000)))
+            self._dirty = True
+        return True
+
+    def remove_tokens(self, tokens):
+        removed = 0
+        with self._lock:
+            for token in set(tokens):
+                client_id = self._token_owners.get(token)
+                if client_id:
+                    self._unindex(client_id)
+                    removed += 1
+            if removed:
+                self._dirty = True
+        return removed
+
+    def get_token(self, client_id):
+        entry = self._entries.get(client_id)
+        return entry.get('token') if entry else None
+
+    def get_room_client_ids(self, room):
+        return list(self._room_clients.get(room, ()))
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FcmDeliveryService:
+    """Queues wake-up messages for offline peers and sends them in batches.
+
+    Pending sends are coalesced by payload, so repeated pushes to the same
+    offline device while a batch is waiting produce a single message.
+    """
+
+    def __init__(self, registry, transport, *, has_live_sid, enabled=True,
+                 batch_size=FCM_MULTICAST_MAX_TOKENS, flush_interval_s=0.25):
+        self.registry = registry
+        self.transport = transport
+        self.has_live_sid = has_live_sid
+        self.enabled = enabled
+        self.batch_size = max(1, min(int(batch_size), FCM_MULTICAST_MAX_TOKENS))
+        self.flush_interval_s = flush_interval_s
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.stats = {'queued': 0, 'sent': 0, 'failed': 0, 'pruned': 0, 'batches': 0}
+
+    def register_token(self, client_id, token, room=None, client_type=None):
+        if not self.enabled:
+            return False
+        return self.registry.register(client_id, token, room=room, client_type=client_type)
+
+    def unregister_room(self, client_id, room):
+        return self.registry.leave_room(client_id, room)
+
+    def notify_offline_peers(self, room, sender_client_id, event, data=None):
+        """Queue a wake-up for every registered room peer without a live sid."""
+        if not self.enabled or not room:
+            return 0
+        tokens = []
+        for client_id in self.registry.get_room_client_ids(room):
+            if client_id == sender_client_id or self.has_live_sid(client_id):
+                continue
+            token = self.registry.get_token(client_id)
+            if token:
+                tokens.append(token)
+        if not tokens:
+            return 0
+        message = dict(data or {})
+        message['event'] = event
+        message['room'] = room
+        key = tuple(sorted(_stringify_data(message).items()))
+        with self._lock:
+            self._pending.setdefault(key, set()).update(tokens)
+            self.stats['queued'] += len(tokens)
+        return len(tokens)
+
+    def pending_count(self):
+        with self._lock:
+            return sum(len(tokens) for tokens in self._pending.values())
+
+    def flush(self):
+        """Send everything queued so far. Returns the number of successful deliveries."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        delivered = 0
+        invalid = []
+        for key, tokens in pending.items():
+            data = dict(key)
+            tokens = sorted(tokens)
+            for start in range(0, len(tokens), self.batch_size):
+                batch = tokens[start:start + self.batch_size]
+                results = self.transport.send_multicast(batch, data)
+                self.stats['batches'] += 1
+                for token, result in zip(batch, results):
+                    if result == RESULT_OK:
+                        delivered += 1
+                    else:
+                        self.stats['failed'] += 1
+                        if result == RESULT_INVALID_TOKEN:
+                            invalid.append(token)
+        self.stats['sent'] += delivered
+        if invalid:
+            self.stats['pruned'] += self.registry.remove_tokens(invalid)
+            self.registry.persist()
+        return delivered
+
+    def run(self, sleep=time.sleep):
+        """Background loop; pass ``socketio.sleep`` so it yields to the event loop."""
+        logger.info(f'FCM delivery worker started (batch={self.batch_size}, interval={self.flush_interval_s}s)')
+        while True:
+            sleep(self.flush_interval_s)
+            try:
+                if self._pending:
+                    self.flush()
+                self.registry.persist()
+            except Exception as e:
+                logger.error(f'FCM delivery flush failed: {e}')
@@ -5,6 +5,7 @@ import requests
 
 _cache: dict = {}
 _lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
 _LOCAL_RESULT = {'country': 'Local', 'country_code': '', 'region': 'Local Network', 'city': 'Local Network'}
 _UNKNOWN_RESULT = {'country': '', 'country_code': '', 'region': '', 'city': ''}
 
@@ -32,7 +33,9 @@ def lookup_ip(ip: str) -> dict:
         return _LOCAL_RESULT.copy()
     with _lock:
         if ip in _cache:
+            _stats['hits'] += 1
             return _cache[ip].copy()
+        _stats['misses'] += 1
     try:
         resp = requests.get(
             f'http://ip-api.com/json/{ip}',
@@ -56,6 +59,11 @@ def lookup_ip(ip: str) -> dict:
     return result.copy()
 
 
+def get_cache_stats() -> dict:
+    lookups = _stats['hits'] + _stats['misses']
+    return dict(_stats, size=len(_cache), hit_ratio=(_stats['hits'] / lookups) if lookups else 0.0)
+
+
 def get_client_ip(request) -> str:
     """Extract real IP from request, honouring X-Forwarded-For."""
     forwarded = request.headers.get('X-Forwarded-For', '')
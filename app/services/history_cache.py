@@ -0,0 +1,83 @@
+"""
+Result cache for the /api/history/* queries.
+
+The history page polls several aggregate queries at once, and most polls
+find nothing new.  Results are cached by query name and parameters together
+with the history write version read before the query ran.  Any history
+write bumps the version, so the next lookup recomputes.  The cache does not
+need to know which tables a write touched.
+
+Queries over a sliding window (``days=30``) also change as time passes
+without a write, so entries expire after ``ttl_ms`` as well.  Each entry
+keeps its JSON body and an ETag, so a conditional request that still
+matches is answered without serialising again.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def encode_json(result):
+    return json.dumps(result, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+class HistoryQueryCache:
+    def __init__(self, write_version, *, ttl_ms=60000, max_entries=256, clock=_now_ms, encode=encode_json):
+        self._write_version = write_version
+        self.ttl_ms = max(0, int(ttl_ms))
+        self.max_entries = max(1, int(max_entries))
+        self._clock = clock
+        self._encode = encode
+        self._lock = threading.Lock()
+        # (name, params) -> (write_version, expires_at_ms, body, etag), least recently used first
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'not_modified': 0}
+
+    @property
+    def enabled(self):
+        return self.ttl_ms > 0
+
+    def lookup(self, name, params, compute):
+        """Return ``(body, etag)`` for ``compute()``, reusing the cached body while no write happened."""
+        key = (name, tuple(sorted(params.items())))
+        version = self._write_version()
+        now_ms = self._clock()
+        if self.enabled:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == version and entry[1] > now_ms:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry[2], entry[3]
+                self.stats['stale' if entry is not None else 'misses'] += 1
+
+        body = self._encode(compute())
+        etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        if self.enabled:
+            with self._lock:
+                # A write that landed while computing has bumped the version already,
+                # so this entry is stored as stale and the next lookup recomputes.
+                self._entries[key] = (version, now_ms + self.ttl_ms, body, etag)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return body, etag
+
+    def record_not_modified(self):
+        with self._lock:
+            self.stats['not_modified'] += 1
+
+    def hit_ratio(self):
+        lookups = self.stats['hits'] + self.stats['misses'] + self.stats['stale']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -4,6 +4,8 @@ from contextlib import contextmanager
 from datetime import datetime, timezone
 
 _lock = threading.Lock()
+# Writers queue on _lock; tracked so the depth can be exported as a metric.
+_write_stats = {'waiting': 0, 'in_flight': 0, 'completed': 0}
 
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS clients (
@@ -35,8 +37,24 @@ CREATE TABLE IF NOT EXISTS connection_events (
     duration_seconds INTEGER
 );
 
+CREATE TABLE IF NOT EXISTS transfer_outcomes (
+    id                  INTEGER PRIMARY KEY AUTOINCREMENT,
+    transfer_id         TEXT NOT NULL,
+    room_id             TEXT,
+    room_state          TEXT,
+    outcome             TEXT NOT NULL,
+    reason              TEXT,
+    decision_ms         INTEGER,
+    decision_timeout_ms INTEGER,
+    size_bytes          INTEGER,
+    created_at_ms       INTEGER NOT NULL,
+    offered_at_ms       INTEGER,
+    decided_at_ms       INTEGER NOT NULL
+);
+
 CREATE INDEX IF NOT EXISTS idx_events_connected_at ON connection_events(connected_at);
 CREATE INDEX IF NOT EXISTS idx_clients_last_seen   ON clients(last_seen);
+CREATE INDEX IF NOT EXISTS idx_transfers_decided   ON transfer_outcomes(decided_at_ms);
 """
 
 
@@ -46,6 +64,9 @@ def init_db(db_path: str):
     with _lock:
         con = sqlite3.connect(db_path)
         con.executescript(SCHEMA)
+        columns = {row[1] for row in con.execute('PRAGMA table_info(transfer_outcomes)')}
+        if 'offered_at_ms' not in columns:
+            con.execute('ALTER TABLE transfer_outcomes ADD COLUMN offered_at_ms INTEGER')
         con.commit()
         con.close()
 
@@ -61,13 +82,38 @@ def _conn(db_path: str):
         con.close()
 
 
+@contextmanager
+def _write_slot():
+    _write_stats['waiting'] += 1
+    try:
+        _lock.acquire()
+    finally:
+        _write_stats['waiting'] -= 1
+    _write_stats['in_flight'] += 1
+    try:
+        yield
+    finally:
+        _write_stats['in_flight'] -= 1
+        _write_stats['completed'] += 1
+        _lock.release()
+
+
+def get_write_stats() -> dict:
+    return dict(_write_stats, queue_depth=_write_stats['waiting'] + _write_stats['in_flight'])
+
+
+def get_write_version() -> int:
+    """Bumped after every history write commits; cached query results are tied to it."""
+    return _write_stats['completed']
+
+
 def _now_iso() -> str:
     return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
 
 
 def upsert_client(db_path, client_id, device_name, client_type, room_id, ip_address) -> None:
     now = _now_iso()
-    with _lock, _conn(db_path) as con:
+    with _write_slot(), _conn(db_path) as con:
         con.execute("""
             INSERT INTO clients (client_id, device_name, client_type, room_id,
                                  ip_address, first_seen, last_seen, total_sessions)
@@ -84,7 +130,7 @@ def upsert_client(db_path, client_id, device_name, client_type, room_id, ip_addr
 
 def insert_event(db_path, client_id, device_name, room_id, client_type, ip_address) -> int:
     now = _now_iso()
-    with _lock, _conn(db_path) as con:
+    with _write_slot(), _conn(db_path) as con:
         cur = con.execute("""
             INSERT INTO connection_events
                 (client_id, device_name, room_id, client_type, ip_address, connected_at)
@@ -95,7 +141,7 @@ def insert_event(db_path, client_id, device_name, room_id, client_type, ip_addre
 
 def close_event(db_path, event_id: int) -> None:
     now = _now_iso()
-    with _lock, _conn(db_path) as con:
+    with _write_slot(), _conn(db_path) as con:
         con.execute("""
             UPDATE connection_events
             SET disconnected_at  = ?,
@@ -107,13 +153,26 @@ def close_event(db_path, event_id: int) -> None:
 
 def update_client_geo(db_path, client_id: str, country: str, country_code: str,
                       region: str, city: str) -> None:
-    with _lock, _conn(db_path) as con:
+    with _write_slot(), _conn(db_path) as con:
         con.execute("""
             UPDATE clients SET country=?, country_code=?, region=?, city=?
             WHERE client_id=?
         """, (country, country_code, region, city, client_id))
 
 
+def insert_transfer_outcomes(db_path, rows) -> None:
+    if not rows:
+        return
+    with _write_slot(), _conn(db_path) as con:
+        con.executemany("""
+            INSERT INTO transfer_outcomes
+                (transfer_id, room_id, room_state, outcome, reason, decision_ms,
+                 decision_timeout_ms, size_bytes, created_at_ms, offered_at_ms, decided_at_ms)
+            VALUES (:transfer_id, :room_id, :room_state, :outcome, :reason, :decision_ms,
+                    :decision_timeout_ms, :size_bytes, :created_at_ms, :offered_at_ms, :decided_at_ms)
+        """, rows)
+
+
 def query_summary(db_path) -> dict:
     with _conn(db_path) as con:
         row = con.execute("""
@@ -182,3 +241,168 @@ def query_countries(db_path, top=15) -> list:
             LIMIT ?
         """, (top,)).fetchall()
         return [dict(r) for r in rows]
+
+
+# Fallbacks with these reasons never offered LAN: the room was known to be on
+# different LANs, or past transfers on the network pair predicted failure.
+_LAN_SKIPPED_REASONS = ('room_diff_lan', 'lan_predicted_fail')
+
+_TRANSFER_AGGREGATES = """
+    COUNT(*)                                                        AS total,
+    SUM(outcome = 'lan_success')                                    AS lan_success,
+    SUM(outcome != 'lan_success')                                   AS relay,
+    SUM(outcome = 'fallback_timeout')                               AS timeout_fallback,
+    SUM(reason IN (:skipped_a, :skipped_b))                         AS lan_skipped,
+    SUM(CASE WHEN outcome != 'lan_success' THEN size_bytes END)     AS relay_bytes,
+    AVG(decision_ms)                                                AS avg_decision_ms
+"""
+
+
+def _transfer_rates(row: dict) -> dict:
+    row = {k: (0 if v is None and k != 'room_state' else v) for k, v in row.items()}
+    lan_attempted = row['total'] - row['lan_skipped']
+    row['lan_attempted'] = lan_attempted
+    row['lan_success_ratio'] = round(row['lan_success'] / lan_attempted, 4) if lan_attempted else None
+    row['timeout_fallback_rate'] = round(row['timeout_fallback'] / lan_attempted, 4) if lan_attempted else None
+    row['avg_decision_ms'] = round(row['avg_decision_ms'], 1)
+    return row
+
+
+def _since_ms(days) -> int:
+    return int((datetime.now(timezone.utc).timestamp() - days * 86400) * 1000)
+
+
+def _transfer_params(days) -> dict:
+    skipped_a, skipped_b = _LAN_SKIPPED_REASONS
+    return {'skipped_a': skipped_a, 'skipped_b': skipped_b, 'since': _since_ms(days)}
+
+
+def _decision_percentiles(con, where, params) -> dict:
+    source = f"FROM transfer_outcomes WHERE decided_at_ms >= :since AND {where}"
+    count = con.execute(f"SELECT COUNT(*) {source}", params).fetchone()[0]
+    percentiles = {}
+    for label, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+        if not count:
+            percentiles[label] = None
+            continue
+        value = con.execute(f"SELECT decision_ms {source} ORDER BY decision_ms LIMIT 1 OFFSET :offset",
+                            dict(params, offset=min(count - 1, int(q * count)))).fetchone()
+        percentiles[label] = value[0] if value else None
+    return percentiles
+
+
+def query_transfer_summary(db_path, days=30) -> dict:
+    params = _transfer_params(days)
+    with _conn(db_path) as con:
+        row = con.execute(f"""
+            SELECT {_TRANSFER_AGGREGATES}
+            FROM transfer_outcomes WHERE decided_at_ms >= :since
+        """, params).fetchone()
+        summary = _transfer_rates(dict(row))
+
+        # decision_ms runs from the LAN offer to the decision.  For a LAN success
+        # that includes the receiver's download, so the two are reported apart;
+        # see query_transfers_by_size for completion times per size class.
+        summary['decision_ms'] = _decision_percentiles(
+            con, "outcome != 'lan_success' AND COALESCE(reason, '') NOT IN (:skipped_a, :skipped_b)", params)
+        summary['lan_success_ms'] = _decision_percentiles(con, "outcome = 'lan_success'", params)
+        summary['days'] = days
+        return summary
+
+
+def query_transfers_by_room_state(db_path, days=30) -> list:
+    params = _transfer_params(days)
+    with _conn(db_path) as con:
+        rows = con.execute(f"""
+            SELECT room_state, {_TRANSFER_AGGREGATES}
+            FROM transfer_outcomes WHERE decided_at_ms >= :since
+            GROUP BY room_state
+            ORDER BY total DESC
+        """, params).fetchall()
+        return [_transfer_rates(dict(r)) for r in rows]
+
+
+_SIZE_CLASS = """
+    CASE
+        WHEN size_bytes IS NULL      THEN 'unknown'
+        WHEN size_bytes < 1048576    THEN '<1MiB'
+        WHEN size_bytes < 10485760   THEN '1-10MiB'
+        WHEN size_bytes < 104857600  THEN '10-100MiB'
+        ELSE '>=100MiB'
+    END
+"""
+
+
+def query_transfers_by_size(db_path, days=30) -> list:
+    params = _transfer_params(days)
+    with _conn(db_path) as con:
+        rows = con.execute(f"""
+            SELECT {_SIZE_CLASS} AS size_class, {_TRANSFER_AGGREGATES},
+                   AVG(CASE WHEN outcome = 'lan_success' THEN decision_ms END) AS avg_lan_success_ms
+            FROM transfer_outcomes WHERE decided_at_ms >= :since
+            GROUP BY size_class
+            ORDER BY MIN(COALESCE(size_bytes, -1))
+        """, params).fetchall()
+        result = []
+        for r in rows:
+            row = dict(r)
+            avg_lan_success_ms = row.pop('avg_lan_success_ms')
+            row = _transfer_rates(row)
+            row['avg_lan_success_ms'] = round(avg_lan_success_ms, 1) if avg_lan_success_ms is not None else None
+            result.append(row)
+        return result
+
+
+def query_transfers_by_reason(db_path, days=30) -> list:
+    with _conn(db_path) as con:
+        rows = con.execute("""
+            SELECT outcome, reason, COUNT(*) AS count, AVG(decision_ms) AS avg_decision_ms
+            FROM transfer_outcomes WHERE decided_at_ms >= ?
+            GROUP BY outcome, reason
+            ORDER BY count DESC
+        """, (_since_ms(days),)).fetchall()
+        return [dict(r) for r in rows]
+
+
+EXPORT_COLUMNS = {
+    'clients': ('client_id', 'device_name', 'client_type', 'room_id', 'ip_address', 'country', 'country_code',
+                'region', 'city', 'first_seen', 'last_seen', 'total_sessions'),
+    'connection_events': ('id', 'client_id', 'device_name', 'room_id', 'client_type', 'ip_address',
+                          'connected_at', 'disconnected_at', 'duration_seconds'),
+}
+# The timestamp the since/until filters apply to
+_EXPORT_TIME_COLUMN = {'clients': 'last_seen', 'connection_events': 'connected_at'}
+
+
+def iter_export_rows(db_path, table, since=None, until=None, room=None, page_size=1000):
+    """Yield ``table``'s rows as tuples in EXPORT_COLUMNS order, oldest first.
+
+    Rows are read a page at a time by rowid through one connection.  Each
+    page is its own short read, so a slow download never holds the database
+    lock that history writes wait for, and each page starts from an index
+    seek instead of an OFFSET scan.  ``since`` is inclusive, ``until``
+    exclusive, both in the stored ``YYYY-MM-DD HH:MM:SS`` UTC form.
+    """
+    columns = ', '.join(EXPORT_COLUMNS[table])
+    time_column = _EXPORT_TIME_COLUMN[table]
+    sql = f"""
+        SELECT rowid, {columns} FROM {table}
+        WHERE rowid > :after
+          AND (:since IS NULL OR {time_column} >= :since)
+          AND (:until IS NULL OR {time_column} < :until)
+          AND (:room IS NULL OR room_id = :room)
+        ORDER BY rowid
+        LIMIT :limit
+    """
+    params = {'after': 0, 'since': since, 'until': until, 'room': room, 'limit': page_size}
+    con = sqlite3.connect(db_path)
+    try:
+        while True:
+            page = con.execute(sql, params).fetchall()
+            for row in page:
+                yield row[1:]
+            if len(page) < page_size:
+                return
+            params['after'] = page[-1][0]
+    finally:
+        con.close()
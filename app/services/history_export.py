@@ -0,0 +1,69 @@
+"""
+Streaming encoders for the history export endpoints.
+
+Rows arrive from a generator and leave as chunks of about ``chunk_bytes``,
+so an export of any size holds one page of rows and one chunk in memory.
+Gzip compresses the same chunks incrementally.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+CHUNK_BYTES = 64 * 1024
+
+
+def ndjson_chunks(columns, rows, chunk_bytes=CHUNK_BYTES):
+    buffer = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, row)), separators=(',', ':'), ensure_ascii=False) + '\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def csv_chunks(columns, rows, chunk_bytes=CHUNK_BYTES):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def encode_export(columns, rows, fmt, gzip=False):
+    """Byte chunks of ``rows`` as ``fmt`` (a FORMATS key), optionally gzip-compressed."""
+    chunks = csv_chunks(columns, rows) if fmt == 'csv' else ndjson_chunks(columns, rows)
+    return gzip_chunks(chunks) if gzip else chunks
+
+
+def parse_export_time(value):
+    """``YYYY-MM-DD`` or an ISO datetime (UTC unless it has an offset) -> the stored ``YYYY-MM-DD HH:MM:SS``."""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
@@ -0,0 +1,112 @@
+"""
+Live per-second and per-minute counters for the dashboard charts.
+
+Each resolution is one flat ``array('q')`` of ``slots x series`` counters
+plus one array of bucket stamps, used as a ring: the slot for bucket ``b``
+is ``b % slots``, and its counters are zeroed lazily the first time a new
+bucket lands on it.  An increment touches one counter per resolution and
+allocates nothing, and a slot nothing happened in reads as zero.  The
+default sizes hold the last hour at both resolutions.
+
+There is no lock: increments come from greenlets on the one event loop, and
+a read that races a slot reset can at worst show a bucket one count short.
+"""
+
+import logging
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+SERIES = (
+    'connects',
+    'disconnects',
+    'joins',
+    'relays',
+    'transfers_lan_success',
+    'transfers_fallback_requested',
+    'transfers_fallback_timeout',
+    'uploads_presigned',
+    'bytes_presigned',
+)
+RESOLUTIONS = {'second': 1, 'minute': 60}
+# What a dashboard subscribing to live_series gets first: the last five minutes and the last hour
+SNAPSHOT_POINTS = {'second': 300, 'minute': 60}
+
+
+class _Ring:
+    def __init__(self, step_s, slots, width):
+        self.step_s = step_s
+        self.slots = slots
+        self.width = width
+        self.values = array('q', bytes(8 * slots * width))
+        self.stamps = array('q', [-1]) * slots
+        self._zero_row = array('q', bytes(8 * width))
+
+    def add(self, bucket, index, amount):
+        slot = bucket % self.slots
+        base = slot * self.width
+        if self.stamps[slot] != bucket:
+            self.stamps[slot] = bucket
+            self.values[base:base + self.width] = self._zero_row
+        self.values[base + index] += amount
+
+    def row(self, bucket):
+        slot = bucket % self.slots
+        if self.stamps[slot] != bucket:
+            return None
+        return self.values[slot * self.width:(slot + 1) * self.width]
+
+
+class LiveSeries:
+    def __init__(self, names=SERIES, *, second_slots=3600, minute_slots=60, clock=time.time):
+        self.names = tuple(names)
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._clock = clock
+        self._rings = {
+            'second': _Ring(RESOLUTIONS['second'], max(1, int(second_slots)), len(self.names)),
+            'minute': _Ring(RESOLUTIONS['minute'], max(1, int(minute_slots)), len(self.names)),
+        }
+        self._zero = array('q', bytes(8 * len(self.names)))
+
+    def increment(self, name, amount=1):
+        now_s = int(self._clock())
+        index = self._index[name]
+        self._rings['second'].add(now_s, index, amount)
+        self._rings['minute'].add(now_s // 60, index, amount)
+
+    def max_points(self, resolution):
+        return self._rings[resolution].slots
+
+    def window(self, resolution='minute', points=None):
+        """The last ``points`` buckets (the current, still filling one included), oldest first:
+        ``{'resolution', 'step_s', 'start', 'series': {name: [count, ...]}}`` with ``start`` in epoch seconds."""
+        ring = self._rings[resolution]
+        points = ring.slots if points is None else max(1, min(int(points), ring.slots))
+        last = int(self._clock()) // ring.step_s
+        first = last - points + 1
+        rows = [ring.row(bucket) or self._zero for bucket in range(first, last + 1)]
+        return {
+            'resolution': resolution,
+            'step_s': ring.step_s,
+            'start': first * ring.step_s,
+            'series': {name: [row[i] for row in rows] for i, name in enumerate(self.names)},
+        }
+
+    def point(self, resolution, at_s):
+        """Counts for the bucket holding ``at_s``: ``{'t': bucket start, 'values': {name: count}}``."""
+        ring = self._rings[resolution]
+        bucket = int(at_s) // ring.step_s
+        row = ring.row(bucket) or self._zero
+        return {'t': bucket * ring.step_s, 'values': dict(zip(self.names, row))}
+
+    def run(self, publish, sleep=time.sleep):
+        """Call ``publish(point)`` with each second just completed; pass ``socketio.sleep`` under gevent."""
+        logger.info(f'Live series ticker started ({len(self.names)} series)')
+        while True:
+            now = self._clock()
+            sleep(1.0 - now % 1.0 + 0.01)
+            try:
+                publish(self.point('second', self._clock() - 1))
+            except Exception as e:
+                logger.warning(f'Live series publish failed: {e}')
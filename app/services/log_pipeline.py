@@ -0,0 +1,201 @@
+"""
+Logging that stays off the gevent event loop.
+
+Handlers only build a ``LogRecord``: messages are %-style templates formatted
+later, high-rate INFO/DEBUG templates are sampled, and surviving records go
+onto a queue drained by a native OS thread that formats and writes them.  A
+slow stderr or log collector therefore never stalls socket handlers, and a
+full queue drops records (counted in ``stats``) instead of blocking.
+"""
+
+import json
+import logging
+import logging.handlers
+import sys
+import time
+
+try:
+    from gevent.monkey import get_original
+except ImportError:  # gevent is optional outside the gunicorn worker
+    import importlib
+
+    def get_original(module, name):
+        return getattr(importlib.import_module(module), name)
+
+# Native primitives even when the process is monkey-patched.
+_start_new_thread = get_original('_thread', 'start_new_thread')
+_allocate_lock = get_original('_thread', 'allocate_lock')
+_NativeRLock = get_original('_thread', 'RLock')
+_NativeSimpleQueue = get_original('queue', 'SimpleQueue')
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+_LAZY_ARG_TYPES = (str, int, float, bool, type(None))
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({})))
+
+
+def parse_level(value, default=None):
+    level = logging.getLevelName(str(value).strip().upper())
+    return level if isinstance(level, int) else default
+
+
+def parse_levels(spec):
+    """``"app.socket=WARNING,engineio=INFO"`` -> ``{'app.socket': 30, 'engineio': 20}``; bad entries are skipped."""
+    levels = {}
+    for entry in (spec or '').split(','):
+        name, _, level = entry.partition('=')
+        level = parse_level(level)
+        if name.strip() and level is not None:
+            levels[name.strip()] = level
+    return levels
+
+
+class SamplingFilter(logging.Filter):
+    """Keep the first ``burst`` records per template per window, then one in ``every``.
+
+    Records are keyed by logger name and unformatted message, so one noisy
+    relay line does not crowd out the rest.  WARNING and above always pass.
+    The next record kept for a template carries ``sampled_out``, the number
+    of similar records dropped before it.  ``burst`` 0 disables sampling;
+    ``every`` 0 drops everything past the burst.
+    """
+
+    def __init__(self, *, burst=20, window_ms=1000, every=100, clock=time.monotonic):
+        super().__init__()
+        self.burst = max(0, int(burst))
+        self.window_s = max(1, int(window_ms)) / 1000.0
+        self.every = max(0, int(every))
+        self.clock = clock
+        self._windows = {}  # (logger, template) -> [window_started, seen, dropped_unreported]
+        self.stats = {'sampled_out': 0}
+
+    def filter(self, record):
+        if not self.burst or record.levelno >= logging.WARNING:
+            return True
+        now = self.clock()
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.window_s:
+            window = self._windows[key] = [now, 0, window[2] if window else 0]
+        window[1] += 1
+        extra = window[1] - self.burst
+        if extra <= 0 or (self.every and extra % self.every == 0):
+            if window[2]:
+                record.sampled_out = window[2]
+                window[2] = 0
+            return True
+        window[2] += 1
+        self.stats['sampled_out'] += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any ``extra=`` fields kept as keys."""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in {'message', 'asctime'}:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        sampled_out = getattr(record, 'sampled_out', 0)
+        return f'{text} (+{sampled_out} similar suppressed)' if sampled_out else text
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records without formatting them; drop when ``max_size`` are waiting."""
+
+    def __init__(self, queue, *, max_size=10000):
+        super().__init__(queue)
+        self.max_size = max(1, int(max_size))
+        self.stats = {'enqueued': 0, 'dropped': 0}
+
+    def prepare(self, record):
+        # Mutable arguments may change before the listener thread formats them;
+        # snapshot those (cheap for the ids and counts the handlers log) and
+        # keep primitives lazy.
+        if isinstance(record.args, tuple) and not all(isinstance(arg, _LAZY_ARG_TYPES) for arg in record.args):
+            record.args = tuple(arg if isinstance(arg, _LAZY_ARG_TYPES) else str(arg) for arg in record.args)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_size:
+            self.stats['dropped'] += 1
+            return
+        self.queue.put_nowait(record)
+        self.stats['enqueued'] += 1
+
+
+class NativeThreadListener(logging.handlers.QueueListener):
+    """``QueueListener`` whose worker is an OS thread, not a greenlet.
+
+    The owner must keep its own references to the handlers: the thread lets
+    go of them on exit so a handler is never finalized off the event loop.
+    """
+
+    def start(self):
+        self._done = _allocate_lock()
+        self._done.acquire()
+        _start_new_thread(self._run, ())
+
+    def _run(self):
+        try:
+            self._monitor()
+        finally:
+            self.handlers = ()
+            self._done.release()
+
+    def stop(self, timeout=2.0):
+        if getattr(self, '_done', None) is None:
+            return
+        self.enqueue_sentinel()
+        self._done.acquire(True, timeout)
+        self._done = None
+
+
+def configure_logging(*, level='INFO', levels=None, fmt='text', sample_burst=20, sample_window_ms=1000,
+                      sample_every=100, queue_max=10000, stream=None):
+    """Route the root logger through a sampled, queued pipeline; returns the queue handler.
+
+    Handlers already on the root logger are left alone.  Calling this again
+    returns the handler installed the first time.
+    """
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if isinstance(handler, LazyQueueHandler):
+            return handler
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter(TEXT_FORMAT))
+    # Only the listener thread takes this lock; a gevent lock there would need a hub.
+    output.lock = _NativeRLock()
+
+    queue_handler = LazyQueueHandler(_NativeSimpleQueue(), max_size=queue_max)
+    queue_handler.sampler = SamplingFilter(burst=sample_burst, window_ms=sample_window_ms, every=sample_every)
+    queue_handler.addFilter(queue_handler.sampler)
+    queue_handler.output = output
+    queue_handler.listener = NativeThreadListener(queue_handler.queue, output)
+    queue_handler.listener.start()
+
+    root.addHandler(queue_handler)
+    root.setLevel(parse_level(level, logging.INFO))
+    for name, logger_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(logger_level)
+    return queue_handler
@@ -0,0 +1,202 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+The server runs as a single gevent worker, so recording is a plain dict/list
+update with no lock: greenlets only switch on I/O, never in the middle of an
+increment.  Label values are passed as tuples the caller can build once, and
+histograms keep one fixed list of bucket counts per label set, so recording
+allocates nothing on the hot path.  Values owned by other subsystems (room
+counts, queue sizes, limiter counters) are read through callbacks at scrape
+time instead of being mirrored on every change.
+"""
+
+import inspect
+import time
+from bisect import bisect_left
+from functools import wraps
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labels, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, labels=(), amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket..., count above last bucket, sum]
+        self._values = {}
+
+    def observe(self, value, labels=()):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def count(self, labels=()):
+        state = self._values.get(labels)
+        return sum(state[:-1]) if state else 0
+
+    def samples(self):
+        for labels, state in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                yield f'{self.name}_bucket', _format_labels(self.labelnames, labels, le), cumulative
+            yield f'{self.name}_sum', _format_labels(self.labelnames, labels), state[-1]
+            yield f'{self.name}_count', _format_labels(self.labelnames, labels), cumulative
+
+
+class CallbackMetric:
+    """A value read at scrape time; ``collect()`` returns a number or ``{labels: value}``."""
+
+    def __init__(self, name, documentation, collect, labelnames=(), kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def samples(self):
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in values.items():
+            if not isinstance(labels, tuple):
+                labels = (labels,)
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _get_or_add(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._get_or_add(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, collect, labelnames=(), kind='gauge'):
+        self._metrics[name] = CallbackMetric(name, documentation, collect, labelnames, kind)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                lines.append(f'# {metric.name} collection failed: {_escape(e)}')
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample_name, labels, value in samples:
+                lines.append(f'{sample_name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def instrument_socket_handler(registry, event, handler):
+    """Wrap a Socket.IO handler with a latency histogram and an error counter."""
+    latency = registry.histogram('socketio_handler_seconds', 'Socket.IO handler latency', ('event',))
+    errors = registry.counter('socketio_handler_errors_total', 'Socket.IO handler exceptions', ('event',))
+    labels = (event,)
+
+    # Flask-SocketIO probes a connect handler's arity by calling it with the
+    # auth argument and retrying on TypeError; pass only what the handler takes.
+    params = inspect.signature(handler).parameters.values()
+    max_args = None if any(p.kind == p.VAR_POSITIONAL for p in params) else len(params)
+
+    @wraps(handler)
+    def instrumented(*args):
+        started = time.perf_counter()
+        try:
+            return handler(*args[:max_args] if max_args is not None else args)
+        except Exception:
+            errors.inc(labels)
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started, labels)
+
+    return instrumented
+
+
+def instrument_call(histogram, labels, func):
+    """Return ``func`` wrapped so each call's duration is observed under ``labels``."""
+    @wraps(func)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started, labels)
+
+    return timed
+
+
+def instrument_boto_client(histogram, client, backend='r2'):
+    """Observe the latency of every API request made through a boto3 client."""
+    def before_call(context, **kwargs):
+        context['metrics_started'] = time.perf_counter()
+
+    def after_call(context, model, **kwargs):
+        started = context.get('metrics_started')
+        if started is not None:
+            histogram.observe(time.perf_counter() - started, (backend, model.name))
+
+    client.meta.events.register('before-call.s3', before_call)
+    client.meta.events.register('after-call.s3', after_call)
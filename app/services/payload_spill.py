@@ -0,0 +1,60 @@
+"""
+Spill oversized clipboard payloads to the active storage backend.
+
+Relaying a multi-megabyte ``content`` string means encoding it into every
+Socket.IO frame and buffering it for store-and-forward, all on the event
+loop.  Above ``threshold_bytes`` the content is written to storage once and
+peers receive a small ``content_ref`` with a download URL instead.
+"""
+
+import logging
+import time
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+
+class PayloadSpiller:
+    def __init__(self, *, threshold_bytes, store_blob=None):
+        """``store_blob(file_key, data, content_type)`` must persist the bytes
+        and return a download URL; without it spilling is disabled."""
+        self.threshold_bytes = max(0, int(threshold_bytes or 0))
+        self.store_blob = store_blob
+        self.stats = {'spilled': 0, 'spilled_bytes': 0, 'failed': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.threshold_bytes and self.store_blob)
+
+    def spill(self, data):
+        """Return ``data`` unchanged, or a copy whose ``content`` was moved to storage."""
+        if not self.enabled or not isinstance(data, dict):
+            return data
+        content = data.get('content')
+        # len() of a str counts code points, a lower bound on the UTF-8 size,
+        # so only payloads that might exceed the threshold get encoded.
+        if not isinstance(content, str) or len(content) <= self.threshold_bytes // 4:
+            return data
+        raw = content.encode('utf-8', 'surrogatepass')
+        if len(raw) <= self.threshold_bytes:
+            return data
+
+        file_key = f"clip_{int(time.time() * 1000)}_{uuid4().hex[:8]}.txt"
+        content_type = 'text/plain; charset=utf-8'
+        try:
+            download_url = self.store_blob(file_key, raw, content_type)
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.error(f'Payload spill failed, relaying inline ({len(raw)} bytes): {e}')
+            return data
+
+        self.stats['spilled'] += 1
+        self.stats['spilled_bytes'] += len(raw)
+        spilled = {k: v for k, v in data.items() if k != 'content'}
+        spilled['content_ref'] = {
+            'file_key': file_key,
+            'download_url': download_url,
+            'size': len(raw),
+            'content_type': content_type,
+        }
+        return spilled
@@ -0,0 +1,139 @@
+"""
+Cache of LAN probe results keyed by the network identities of both peers.
+
+Rejoins and network updates clear a room's probe state and would normally
+cost a fresh ``lan_probe_request`` round trip.  When both peers still report
+the same ``network_id_hash`` / ``private_ip`` / ``network_epoch`` (and the PC
+the same probe URL) as a recent probe, the cached result is reused for up to
+the PC's ``probe_ttl_ms``.  Probe requests for a room are also debounced so a
+peer whose network flaps does not trigger one probe per update.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def network_identity(network_meta):
+    """Return a hashable identity for a peer's network, or None if it is unknown."""
+    meta = network_meta or {}
+    network_id = meta.get('network_id_hash')
+    private_ip = meta.get('private_ip')
+    if not network_id and not private_ip:
+        return None
+    return (network_id or '', private_ip or '', int(meta.get('network_epoch') or 0))
+
+
+class LanProbeCache:
+    def __init__(self, *, max_ttl_ms=300000, debounce_ms=1500, max_entries=10000, clock=_now_ms):
+        self.max_ttl_ms = max(0, int(max_ttl_ms))
+        self.debounce_ms = max(0, int(debounce_ms))
+        self.max_entries = max(1, int(max_entries))
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expires_at_ms, result), least recently used first
+        self._entries = OrderedDict()
+        self._room_last_request_ms = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'probes_sent': 0, 'debounced': 0}
+
+    @property
+    def enabled(self):
+        return self.max_ttl_ms > 0
+
+    def key_for(self, pc_network, app_network, probe_url):
+        pc_identity = network_identity(pc_network)
+        app_identity = network_identity(app_network)
+        if pc_identity is None or app_identity is None:
+            return None
+        return (pc_identity, app_identity, probe_url or '')
+
+    def get(self, key):
+        """Return the cached probe result for ``key`` or None; counts hits and misses."""
+        if key is None or not self.enabled:
+            return None
+        now_ms = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now_ms:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return dict(entry[1])
+
+    def put(self, key, result, ttl_ms):
+        if key is None or not self.enabled:
+            return
+        ttl_ms = min(self.max_ttl_ms, max(0, int(ttl_ms or 0)))
+        if not ttl_ms:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl_ms, dict(result))
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.stats['stored'] += 1
+
+    def debounce_remaining_ms(self, room):
+        """Milliseconds until ``room`` may send another probe (0 = now)."""
+        last_ms = self._room_last_request_ms.get(room)
+        if last_ms is None or not self.debounce_ms:
+            return 0
+        return max(0, last_ms + self.debounce_ms - self._clock())
+
+    def note_probe_sent(self, room, count=1):
+        """Start ``room``'s debounce window after sending ``count`` probes (one per peer pair)."""
+        self._room_last_request_ms[room] = self._clock()
+        self._room_last_request_ms.move_to_end(room)
+        if len(self._room_last_request_ms) > self.max_entries:
+            self._room_last_request_ms.popitem(last=False)
+        self.stats['probes_sent'] += count
+
+    def note_debounced(self):
+        self.stats['debounced'] += 1
+
+    def hit_ratio(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def export_entries(self):
+        """Unexpired entries as JSON-friendly ``[key, expires_at_ms, result]`` rows, oldest first."""
+        now_ms = self._clock()
+        with self._lock:
+            return [[[list(key[0]), list(key[1]), key[2]], expires_at_ms, dict(result)]
+                    for key, (expires_at_ms, result) in self._entries.items() if expires_at_ms > now_ms]
+
+    def import_entries(self, rows):
+        """Load rows from ``export_entries``; expired or malformed rows are skipped. Returns rows loaded."""
+        if not self.enabled:
+            return 0
+        now_ms = self._clock()
+        loaded = 0
+        with self._lock:
+            for row in rows or ():
+                try:
+                    (pc_identity, app_identity, probe_url), expires_at_ms, result = row
+                    key = (tuple(pc_identity), tuple(app_identity), probe_url)
+                    expires_at_ms = min(int(expires_at_ms), now_ms + self.max_ttl_ms)
+                except (TypeError, ValueError):
+                    continue
+                if expires_at_ms <= now_ms or not isinstance(result, dict):
+                    continue
+                self._entries[key] = (expires_at_ms, dict(result))
+                self._entries.move_to_end(key)
+                loaded += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return loaded
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._room_last_request_ms.clear()
@@ -0,0 +1,145 @@
+"""
+Token-bucket rate limiting and join admission control.
+
+Each event class (``clipboard``, ``relay``, ``join``) has independent buckets
+per scope: ``sid`` (the socket, or the client IP for HTTP), ``client``
+(``client_id``), ``room`` and ``global`` (one bucket for the whole server,
+used as admission control so a reconnect storm is spread out instead of
+admitted at once).
+
+A check is O(1): one dict lookup, a refill computed from the elapsed time and
+an LRU touch per scope.  Idle buckets are evicted once a limiter tracks
+``max_keys`` keys; an evicted bucket simply starts full again.
+"""
+
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+
+SCOPES = ('sid', 'client', 'room', 'global')
+
+
+def parse_rate(value):
+    """Parse ``"rate:burst"`` (tokens per second, bucket size); None disables."""
+    raw = str(value or '').strip()
+    if not raw or raw == '0':
+        return None
+    rate_part, _, burst_part = raw.partition(':')
+    rate = float(rate_part)
+    burst = float(burst_part) if burst_part else max(1.0, rate)
+    if rate <= 0 or burst <= 0:
+        return None
+    return rate, burst
+
+
+class TokenBucketLimiter:
+    def __init__(self, name, rate_per_s, burst, *, max_keys=100000, clock=time.monotonic):
+        self.name = name
+        self.rate_per_s = float(rate_per_s)
+        self.burst = float(burst)
+        self.max_keys = max(1, int(max_keys))
+        self._clock = clock
+        # key -> [tokens, last_refill_s], least recently used first
+        self._buckets = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    def _bucket(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return bucket
+        self._buckets.move_to_end(key)
+        elapsed = now - bucket[1]
+        if elapsed > 0:
+            bucket[0] = min(self.burst, bucket[0] + elapsed * self.rate_per_s)
+            bucket[1] = now
+        return bucket
+
+    def peek(self, key, cost=1.0, now=None):
+        """Return 0.0 if ``cost`` tokens are available, else seconds until they are."""
+        bucket = self._bucket(key, self._clock() if now is None else now)
+        if bucket[0] >= cost:
+            return 0.0
+        return (cost - bucket[0]) / self.rate_per_s
+
+    def consume(self, key, cost=1.0):
+        self._buckets[key][0] -= cost
+
+    def clear(self):
+        self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RateLimiter:
+    """Checks every configured scope of an event class before consuming any tokens,
+    so a request rejected by one scope is not charged to the others."""
+
+    def __init__(self, limits, *, max_keys=100000, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self._clock = clock
+        self.limiters = {}
+        for event_class, scopes in (limits or {}).items():
+            for scope, rate in scopes.items():
+                if scope not in SCOPES or not rate:
+                    continue
+                rate_per_s, burst = rate
+                self.limiters[(event_class, scope)] = TokenBucketLimiter(
+                    f'{event_class}.{scope}', rate_per_s, burst, max_keys=max_keys, clock=clock)
+
+    def check(self, event_class, *, sid=None, client_id=None, room=None, cost=1.0):
+        """Return None when admitted, else a rejection dict with ``retry_after_ms``."""
+        keys = {'sid': sid, 'client': client_id, 'room': room, 'global': '*'}
+        with self._lock:
+            # One timestamp for every scope, so buckets drained together report
+            # the same wait and the tie goes to the narrowest scope.
+            now = self._clock()
+            admitted = []
+            worst = None
+            for scope in SCOPES:
+                limiter = self.limiters.get((event_class, scope))
+                key = keys[scope]
+                if limiter is None or not key or key == 'Unknown':
+                    continue
+                wait_s = limiter.peek(key, cost, now)
+                if wait_s > 0:
+                    limiter.rejected += 1
+                    if worst is None or wait_s > worst[1]:
+                        worst = (limiter, wait_s)
+                else:
+                    admitted.append((limiter, key))
+
+            if worst is None:
+                for limiter, key in admitted:
+                    limiter.consume(key, cost)
+                    limiter.allowed += 1
+                return None
+
+        limiter, wait_s = worst
+        retry_after_ms = int(math.ceil(wait_s * 1000))
+        if limiter.name.endswith('.global'):
+            # Spread the retries of a reconnect storm instead of syncing them up.
+            retry_after_ms += random.randint(0, max(retry_after_ms, 1000))
+        return {'limiter': limiter.name, 'retry_after_ms': retry_after_ms}
+
+    def clear(self):
+        with self._lock:
+            for limiter in self.limiters.values():
+                limiter.clear()
+
+    @property
+    def stats(self):
+        return {
+            limiter.name: {
+                'allowed': limiter.allowed,
+                'rejected': limiter.rejected,
+                'tracked_keys': len(limiter),
+            }
+            for limiter in self.limiters.values()
+        }
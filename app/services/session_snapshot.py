@@ -0,0 +1,86 @@
+"""
+Warm-restart snapshots of the signalling state.
+
+Rooms, device metadata, LAN probe results and unfinished transfers live in
+memory, so without a snapshot every restart makes all devices rejoin, probe
+their LAN again and lose their in-flight transfers.  The state returned by
+``collect()`` is written as gzip-compressed JSON every few seconds and once
+more at shutdown; the next process loads it at boot unless it is older than
+``max_age_ms``.  Writes go to a temporary file that replaces the snapshot, so
+a crash mid-write leaves the previous one intact.
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class SessionSnapshotStore:
+    def __init__(self, path, collect, *, interval_s=30.0, max_age_ms=600000, clock=_now_ms):
+        """``collect()`` returns the JSON-friendly state to save; an empty ``path`` disables snapshots."""
+        self.path = path
+        self.collect = collect
+        self.interval_s = interval_s
+        self.max_age_ms = max(0, int(max_age_ms))
+        self._clock = clock
+        self.stats = {'saved': 0, 'failed': 0, 'bytes': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def save(self):
+        if not self.enabled:
+            return False
+        try:
+            body = json.dumps({'version': FORMAT_VERSION, 'saved_at_ms': self._clock(), 'state': self.collect()},
+                              separators=(',', ':')).encode('utf-8')
+            data = gzip.compress(body, compresslevel=6)
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.error(f'Session snapshot save failed: {e}')
+            return False
+        self.stats['saved'] += 1
+        self.stats['bytes'] = len(data)
+        return True
+
+    def load(self):
+        """The saved state, or None when there is none, it is unreadable or older than ``max_age_ms``."""
+        if not self.enabled or not os.path.isfile(self.path):
+            return None
+        try:
+            with gzip.open(self.path, 'rb') as f:
+                snapshot = json.loads(f.read().decode('utf-8'))
+        except Exception as e:
+            logger.error(f'Session snapshot load failed: {e}')
+            return None
+        if not isinstance(snapshot, dict) or snapshot.get('version') != FORMAT_VERSION:
+            logger.warning('Ignoring session snapshot with unknown format')
+            return None
+        age_ms = self._clock() - int(snapshot.get('saved_at_ms') or 0)
+        if age_ms > self.max_age_ms:
+            logger.info(f'Ignoring session snapshot saved {age_ms // 1000}s ago')
+            return None
+        return snapshot.get('state') or None
+
+    def run(self, sleep=time.sleep):
+        """Background loop; pass ``socketio.sleep`` so it yields to the event loop."""
+        logger.info(f'Session snapshots started (path={self.path}, interval={self.interval_s}s)')
+        while True:
+            sleep(self.interval_s)
+            self.save()
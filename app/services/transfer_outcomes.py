@@ -0,0 +1,99 @@
+"""
+Batched recording of finished file transfers for analytics.
+
+Each transfer context is recorded once, when it first reaches a decision
+(``lan_success``, ``fallback_requested`` or ``fallback_timeout``).  Rows are
+queued in memory and written to the ``transfer_outcomes`` table by a
+background worker, so the signalling path never waits on SQLite.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_DECISION_STATUSES = frozenset({'lan_success', 'fallback_requested', 'fallback_timeout'})
+
+
+def parse_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return None
+    return size if size >= 0 else None
+
+
+def build_outcome_row(context):
+    """``decision_ms`` runs from the LAN offer (or creation, if LAN was never offered) to the decision."""
+    created_at_ms = int(context.get('created_at_ms') or 0)
+    offered_at_ms = context.get('offered_at_ms')
+    decided_at_ms = int(context.get('updated_at_ms') or created_at_ms)
+    return {
+        'transfer_id': context.get('transfer_id', ''),
+        'room_id': context.get('room'),
+        'room_state': context.get('room_state') or 'UNKNOWN',
+        'outcome': context.get('status'),
+        'reason': context.get('last_reason', ''),
+        'decision_ms': max(0, decided_at_ms - int(offered_at_ms or created_at_ms)),
+        'decision_timeout_ms': context.get('decision_timeout_ms'),
+        'size_bytes': parse_size(context.get('size_bytes')),
+        'created_at_ms': created_at_ms,
+        'offered_at_ms': offered_at_ms,
+        'decided_at_ms': decided_at_ms,
+    }
+
+
+class TransferOutcomeRecorder:
+    def __init__(self, write_batch, *, batch_size=200, flush_interval_s=2.0, max_pending=10000):
+        """``write_batch(rows)`` persists a list of rows from ``build_outcome_row``."""
+        self.write_batch = write_batch
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = flush_interval_s
+        self._lock = threading.Lock()
+        self._pending = deque(maxlen=max(1, int(max_pending)))
+        self.stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'failed_batches': 0}
+
+    def record(self, context):
+        """Queue ``context`` if it just reached its first decision; cheap enough for the hot path."""
+        if context.get('status') not in TRANSFER_DECISION_STATUSES or context.get('outcome_recorded'):
+            return False
+        context['outcome_recorded'] = True
+        row = build_outcome_row(context)
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.stats['dropped'] += 1
+            self._pending.append(row)
+            self.stats['recorded'] += 1
+        return True
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Write everything queued so far in ``batch_size`` chunks. Returns rows written."""
+        with self._lock:
+            rows = list(self._pending)
+            self._pending.clear()
+        written = 0
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                self.stats['failed_batches'] += 1
+                self.stats['dropped'] += len(batch)
+                logger.error(f'Transfer outcome write failed ({len(batch)} rows): {e}')
+                continue
+            written += len(batch)
+        self.stats['written'] += written
+        return written
+
+    def run(self, sleep=time.sleep):
+        """Background loop; pass ``socketio.sleep`` so it yields to the event loop."""
+        logger.info(f'Transfer outcome writer started (batch={self.batch_size}, interval={self.flush_interval_s}s)')
+        while True:
+            sleep(self.flush_interval_s)
+            if self._pending:
+                self.flush()
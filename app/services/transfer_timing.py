@@ -0,0 +1,168 @@
+"""
+Adaptive LAN decision timeouts learnt from past transfers.
+
+For every network pair (or room, when peers do not report a network
+identity) the estimator keeps an exponentially weighted moving average of the
+LAN success rate and a size-aware model of how long a successful LAN transfer
+takes from the offer to ``file_sync_completed``: a fixed overhead plus a
+per-byte cost, fitted as an EWMA linear regression of completion time on file
+size.  The decision deadline for a file of a given size becomes
+``predicted + 4 * deviation`` (the same shape as TCP's retransmission
+timeout), bounded by ``min_timeout_ms`` and the configured default.
+
+A timeout under a shortened (adaptive) deadline does not show that LAN failed,
+only that it takes longer than the deadline, so it is folded in as a censored
+latency sample at the deadline, which raises the estimate, instead of as a
+failure.  A pair whose LAN attempts keep failing is sent straight to relay;
+every ``explore_every``-th transfer on such a pair still tries LAN, with the
+default deadline, so the estimate can recover when the network changes.
+"""
+
+import threading
+from collections import OrderedDict
+
+from .transfer_outcomes import TRANSFER_DECISION_STATUSES, parse_size
+
+# Fallbacks decided without offering LAN carry no information about LAN latency.
+LAN_NOT_ATTEMPTED_REASONS = frozenset({'room_diff_lan', 'lan_predicted_fail'})
+
+# lan_attempt_mode() results
+LAN_ATTEMPT = 'attempt'
+LAN_EXPLORE = 'explore'
+LAN_SKIP = 'skip'
+
+
+class TransferDecisionEstimator:
+    def __init__(self, *, alpha=0.2, min_samples=3, min_timeout_ms=1500,
+                 skip_below_success_rate=0.1, explore_every=10, max_keys=10000):
+        self.alpha = min(1.0, max(0.01, float(alpha)))
+        self.min_samples = max(1, int(min_samples))
+        self.min_timeout_ms = max(0, int(min_timeout_ms))
+        self.skip_below_success_rate = float(skip_below_success_rate)
+        self.explore_every = max(0, int(explore_every))
+        self.max_keys = max(1, int(max_keys))
+        self._lock = threading.Lock()
+        # key -> {'samples', 'success_rate', 'latency_samples', 'latency_ms', 'latency_dev_ms',
+        #         'mean_size', 'size_cov', 'size_var', 'skipped_in_row'}
+        self._estimates = OrderedDict()
+        self.stats = {'observed': 0, 'censored': 0, 'adaptive_timeouts': 0, 'lan_skipped': 0, 'explored': 0}
+
+    def _estimate(self, key):
+        estimate = self._estimates.get(key)
+        if estimate is None:
+            estimate = self._estimates[key] = {
+                'samples': 0, 'success_rate': None, 'latency_samples': 0, 'latency_ms': None,
+                'latency_dev_ms': 0.0, 'mean_size': None, 'size_cov': 0.0, 'size_var': 0.0,
+                'skipped_in_row': 0,
+            }
+            if len(self._estimates) > self.max_keys:
+                self._estimates.popitem(last=False)
+        else:
+            self._estimates.move_to_end(key)
+        return estimate
+
+    @staticmethod
+    def _ms_per_byte(estimate):
+        if estimate['size_var'] <= 0:
+            return 0.0
+        return max(0.0, estimate['size_cov'] / estimate['size_var'])
+
+    def _predict_ms(self, estimate, size):
+        if size is None or estimate['mean_size'] is None:
+            return estimate['latency_ms']
+        return max(0.0, estimate['latency_ms'] + self._ms_per_byte(estimate) * (size - estimate['mean_size']))
+
+    def _fold_latency(self, estimate, size, latency_ms):
+        alpha = self.alpha
+        estimate['latency_samples'] += 1
+        if estimate['latency_ms'] is None:
+            estimate['latency_ms'] = float(latency_ms)
+            estimate['latency_dev_ms'] = latency_ms / 2.0
+            estimate['mean_size'] = None if size is None else float(size)
+            return
+        error = latency_ms - self._predict_ms(estimate, size)
+        estimate['latency_dev_ms'] += alpha * (abs(error) - estimate['latency_dev_ms'])
+        if size is None:
+            estimate['latency_ms'] += alpha * error
+            return
+        if estimate['mean_size'] is None:
+            estimate['mean_size'] = float(size)
+        # Exponentially weighted mean/covariance updates for the size -> latency fit.
+        size_delta = size - estimate['mean_size']
+        latency_delta = latency_ms - estimate['latency_ms']
+        estimate['mean_size'] += alpha * size_delta
+        estimate['latency_ms'] += alpha * latency_delta
+        estimate['size_cov'] = (1 - alpha) * (estimate['size_cov'] + alpha * size_delta * latency_delta)
+        estimate['size_var'] = (1 - alpha) * (estimate['size_var'] + alpha * size_delta * size_delta)
+
+    def observe(self, context):
+        """Fold a transfer's first decision into its key's estimate."""
+        key = context.get('network_key')
+        status = context.get('status')
+        if (not key or status not in TRANSFER_DECISION_STATUSES or context.get('timing_observed')
+                or context.get('last_reason') in LAN_NOT_ATTEMPTED_REASONS):
+            return False
+        context['timing_observed'] = True
+        started_at_ms = int(context.get('offered_at_ms') or context.get('created_at_ms') or 0)
+        latency_ms = max(0, int(context.get('updated_at_ms') or 0) - started_at_ms)
+        size = parse_size(context.get('size_bytes'))
+
+        with self._lock:
+            estimate = self._estimate(key)
+            self.stats['observed'] += 1
+            if status == 'fallback_timeout' and context.get('adaptive_timeout'):
+                # Censored: LAN needed at least the (shortened) deadline.
+                self._fold_latency(estimate, size, max(latency_ms, int(context.get('decision_timeout_ms') or 0)))
+                self.stats['censored'] += 1
+                return True
+            success = status == 'lan_success'
+            estimate['samples'] += 1
+            outcome = 1.0 if success else 0.0
+            if estimate['success_rate'] is None:
+                estimate['success_rate'] = outcome
+            else:
+                estimate['success_rate'] += self.alpha * (outcome - estimate['success_rate'])
+            if success:
+                self._fold_latency(estimate, size, latency_ms)
+        return True
+
+    def suggest_timeout_ms(self, key, default_ms, size_bytes=None):
+        """Return the decision timeout for a ``size_bytes`` file on ``key``; ``default_ms`` until enough is known."""
+        with self._lock:
+            estimate = self._estimates.get(key)
+            if not estimate or estimate['latency_samples'] < self.min_samples:
+                return default_ms
+            predicted_ms = self._predict_ms(estimate, parse_size(size_bytes))
+            adaptive_ms = int(predicted_ms + 4 * estimate['latency_dev_ms'])
+            self.stats['adaptive_timeouts'] += 1
+        return min(default_ms, max(self.min_timeout_ms, adaptive_ms))
+
+    def lan_attempt_mode(self, key):
+        """``LAN_SKIP`` when history says a LAN attempt for ``key`` will almost certainly fail,
+        ``LAN_EXPLORE`` for the periodic attempt that re-checks such a pair, else ``LAN_ATTEMPT``."""
+        with self._lock:
+            estimate = self._estimates.get(key)
+            if (not estimate or estimate['samples'] < self.min_samples
+                    or estimate['success_rate'] >= self.skip_below_success_rate):
+                return LAN_ATTEMPT
+            if self.explore_every and estimate['skipped_in_row'] + 1 >= self.explore_every:
+                estimate['skipped_in_row'] = 0
+                self.stats['explored'] += 1
+                return LAN_EXPLORE
+            estimate['skipped_in_row'] += 1
+            self.stats['lan_skipped'] += 1
+            return LAN_SKIP
+
+    def should_skip_lan(self, key):
+        return self.lan_attempt_mode(key) == LAN_SKIP
+
+    def snapshot(self, key):
+        with self._lock:
+            estimate = self._estimates.get(key)
+            if not estimate:
+                return None
+            return dict(estimate, ms_per_byte=self._ms_per_byte(estimate))
+
+    def clear(self):
+        with self._lock:
+            self._estimates.clear()
@@ -0,0 +1,113 @@
+"""
+In-memory cache of recently uploaded objects for the local storage backend.
+
+With ``STORAGE_BACKEND=local`` the receiver usually downloads a file seconds
+after the sender's PUT wrote it, and the storage path may be a slow network
+mount.  Uploads (and spilled clipboard payloads) are kept here as the bytes
+object the request already holds, so caching copies nothing.  Downloads are
+served as ``memoryview`` slices of it, which copies nothing either.
+
+Entries expire after ``ttl_ms``.  When a new entry would take the cache past
+``max_bytes``, the least recently used entries are evicted first.  Objects
+larger than ``max_object_bytes`` are not cached.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CHUNK_BYTES = 256 * 1024
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class UploadCache:
+    def __init__(self, *, max_bytes=64 * 1024 * 1024, max_object_bytes=16 * 1024 * 1024, ttl_ms=120000,
+                 clock=_now_ms):
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_object_bytes = min(self.max_bytes, max(0, int(max_object_bytes)))
+        self.ttl_ms = max(0, int(ttl_ms))
+        self._clock = clock
+        self._lock = threading.Lock()
+        # file_key -> (expires_at_ms, memoryview, content_type), least recently used first
+        self._entries = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'too_large': 0, 'expired': 0, 'evicted': 0}
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self.ttl_ms > 0
+
+    def put(self, file_key, data, content_type):
+        if not self.enabled:
+            return False
+        if len(data) > self.max_object_bytes:
+            self.discard(file_key)
+            self.stats['too_large'] += 1
+            return False
+        view = memoryview(data).toreadonly()
+        with self._lock:
+            self._remove(file_key)
+            self._expire(self._clock())
+            while self._entries and self.total_bytes + len(view) > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+                self.stats['evicted'] += 1
+            self._entries[file_key] = (self._clock() + self.ttl_ms, view, content_type)
+            self.total_bytes += len(view)
+            self.stats['stored'] += 1
+        return True
+
+    def get(self, file_key):
+        """``(memoryview, content_type)`` for a cached object, or None; counts hits and misses."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(file_key)
+            if entry is not None and entry[0] <= self._clock():
+                self._remove(file_key)
+                self.stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(file_key)
+            self.stats['hits'] += 1
+            return entry[1], entry[2]
+
+    def discard(self, file_key):
+        with self._lock:
+            self._remove(file_key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def hit_ratio(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def _remove(self, file_key):
+        entry = self._entries.pop(file_key, None)
+        if entry is not None:
+            self.total_bytes -= len(entry[1])
+
+    def _expire(self, now_ms):
+        # Insertion order is close to expiry order, so stop at the first live entry.
+        for file_key, (expires_at_ms, _, _) in list(self._entries.items()):
+            if expires_at_ms > now_ms:
+                break
+            self._remove(file_key)
+            self.stats['expired'] += 1
+
+
+def iter_chunks(view, chunk_bytes=CHUNK_BYTES):
+    """Yield ``view`` as memoryview slices of at most ``chunk_bytes``, without copying."""
+    for start in range(0, len(view), chunk_bytes):
+        yield view[start:start + chunk_bytes]
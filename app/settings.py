@@ -31,3 +31,116 @@ FIREBASE_CREDENTIALS_PATH = os.environ.get('FIREBASE_CREDENTIALS_PATH', '')
 STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'r2')
 LOCAL_STORAGE_PATH = os.environ.get('LOCAL_STORAGE_PATH', os.path.join(DATA_DIR, 'uploads'))
 LOCAL_STORAGE_BASE_URL = os.environ.get('LOCAL_STORAGE_BASE_URL', 'http://localhost:5055')
+# Fresh local uploads are kept in memory for the receiver's download (0 bytes or 0 ms disables)
+UPLOAD_CACHE_MAX_BYTES = int(os.environ.get('UPLOAD_CACHE_MAX_BYTES', str(64 * 1024 * 1024)) or 0)
+UPLOAD_CACHE_MAX_OBJECT_BYTES = int(os.environ.get('UPLOAD_CACHE_MAX_OBJECT_BYTES', str(16 * 1024 * 1024)) or 0)
+UPLOAD_CACHE_TTL_MS = int(os.environ.get('UPLOAD_CACHE_TTL_MS', '120000') or 0)
+
+# FCM wake-up delivery for peers without a live socket
+FCM_TOKEN_STORE_PATH = os.environ.get('FCM_TOKEN_STORE_PATH', os.path.join(DATA_DIR, 'fcm_tokens.json'))
+FCM_FLUSH_INTERVAL_MS = int(os.environ.get('FCM_FLUSH_INTERVAL_MS', '250') or 250)
+FCM_MULTICAST_BATCH_SIZE = int(os.environ.get('FCM_MULTICAST_BATCH_SIZE', '500') or 500)
+
+# Devices per room; a joining device may ask for a bigger room (join.max_peers) up to the limit
+ROOM_MAX_PEERS = int(os.environ.get('ROOM_MAX_PEERS', '2') or 2)
+ROOM_MAX_PEERS_LIMIT = int(os.environ.get('ROOM_MAX_PEERS_LIMIT', '8') or 8)
+
+# Devices not seen (join, client_ping, peer_network_update) for this long are detached; 0 disables
+CLIENT_IDLE_TIMEOUT_MS = int(os.environ.get('CLIENT_IDLE_TIMEOUT_MS', '300000') or 300000)
+CLIENT_IDLE_REAP_INTERVAL_MS = int(os.environ.get('CLIENT_IDLE_REAP_INTERVAL_MS', '15000') or 15000)
+
+# Warm restart: rooms, device metadata, probe results and live transfers are saved here and restored at boot
+SESSION_SNAPSHOT_PATH = os.environ.get('SESSION_SNAPSHOT_PATH', os.path.join(DATA_DIR, 'session_snapshot.json.gz'))
+SESSION_SNAPSHOT_INTERVAL_MS = int(os.environ.get('SESSION_SNAPSHOT_INTERVAL_MS', '10000') or 10000)
+SESSION_SNAPSHOT_MAX_AGE_MS = int(os.environ.get('SESSION_SNAPSHOT_MAX_AGE_MS', '600000') or 600000)
+SESSION_RESTORE_GRACE_MS = int(os.environ.get('SESSION_RESTORE_GRACE_MS', '60000') or 60000)
+
+# Drain (dashboard or SIGUSR2): wait this long for undecided transfers, then spread reconnects over the window
+DRAIN_TRANSFER_DEADLINE_MS = int(os.environ.get('DRAIN_TRANSFER_DEADLINE_MS', '30000') or 30000)
+DRAIN_MIGRATION_WINDOW_MS = int(os.environ.get('DRAIN_MIGRATION_WINDOW_MS', '30000') or 30000)
+
+# Store-and-forward buffer of recently relayed clipboard items (resume via join last_seq)
+CLIPBOARD_BACKLOG_MAX_ITEMS_PER_ROOM = int(os.environ.get('CLIPBOARD_BACKLOG_MAX_ITEMS_PER_ROOM', '20') or 20)
+CLIPBOARD_BACKLOG_MAX_BYTES_PER_ROOM = int(os.environ.get('CLIPBOARD_BACKLOG_MAX_BYTES_PER_ROOM', str(2 * 1024 * 1024)) or 2 * 1024 * 1024)
+CLIPBOARD_BACKLOG_MAX_BYTES_TOTAL = int(os.environ.get('CLIPBOARD_BACKLOG_MAX_BYTES_TOTAL', str(64 * 1024 * 1024)) or 64 * 1024 * 1024)
+CLIPBOARD_BACKLOG_TTL_MS = int(os.environ.get('CLIPBOARD_BACKLOG_TTL_MS', '600000') or 600000)
+CLIPBOARD_BACKLOG_MAX_ROOMS = int(os.environ.get('CLIPBOARD_BACKLOG_MAX_ROOMS', '100000') or 100000)
+
+# Suppress repeated clipboard content within a room (echo storms); 0 disables
+CLIPBOARD_DEDUP_WINDOW_MS = int(os.environ.get('CLIPBOARD_DEDUP_WINDOW_MS', '5000') or 0)
+
+# Clipboard content above this size is stored in the storage backend and relayed by reference
+CLIPBOARD_SPILL_THRESHOLD_BYTES = int(os.environ.get('CLIPBOARD_SPILL_THRESHOLD_BYTES', str(64 * 1024)) or 0)
+# Largest Socket.IO frame or /api/relay body the server accepts
+RELAY_MAX_FRAME_BYTES = int(os.environ.get('RELAY_MAX_FRAME_BYTES', str(8 * 1024 * 1024)) or 8 * 1024 * 1024)
+# Events per JSON /api/relay/batch request, and per relayed chunk of an NDJSON one
+RELAY_BATCH_MAX_EVENTS = max(1, int(os.environ.get('RELAY_BATCH_MAX_EVENTS', '500') or 500))
+
+# Token-bucket rate limits as "rate_per_second:burst" per event class and scope; 0 disables a scope.
+# The sid scope is the socket (or the client IP for /api/relay); join.global is server-wide admission.
+RATE_LIMITS = {
+    'clipboard': {
+        'sid': os.environ.get('RATE_LIMIT_CLIPBOARD_SID', '10:20'),
+        'client': os.environ.get('RATE_LIMIT_CLIPBOARD_CLIENT', '10:20'),
+        'room': os.environ.get('RATE_LIMIT_CLIPBOARD_ROOM', '20:40'),
+    },
+    'relay': {
+        'sid': os.environ.get('RATE_LIMIT_RELAY_SID', '20:40'),
+        'client': os.environ.get('RATE_LIMIT_RELAY_CLIENT', '10:20'),
+        'room': os.environ.get('RATE_LIMIT_RELAY_ROOM', '20:40'),
+    },
+    'join': {
+        'sid': os.environ.get('RATE_LIMIT_JOIN_SID', '2:5'),
+        'client': os.environ.get('RATE_LIMIT_JOIN_CLIENT', '2:5'),
+        'room': os.environ.get('RATE_LIMIT_JOIN_ROOM', '10:20'),
+        'global': os.environ.get('RATE_LIMIT_JOIN_GLOBAL', '200:400'),
+    },
+}
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000') or 100000)
+# Number of reverse proxies in front of the server whose X-Forwarded-For entry is trusted.
+# 0 keys HTTP rate limits on the socket peer address; clients cannot spoof it with headers.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0') or 0)
+
+# Bearer token required by GET /metrics; when empty only a logged-in dashboard session can read it
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Finished transfers are written to the history transfer_outcomes table in batches
+TRANSFER_OUTCOME_FLUSH_INTERVAL_MS = int(os.environ.get('TRANSFER_OUTCOME_FLUSH_INTERVAL_MS', '2000') or 2000)
+TRANSFER_OUTCOME_BATCH_SIZE = int(os.environ.get('TRANSFER_OUTCOME_BATCH_SIZE', '200') or 200)
+
+# /api/history/* results are cached until the next history write, and at most this long
+# for queries over a sliding time window (0 disables the cache)
+HISTORY_CACHE_TTL_MS = int(os.environ.get('HISTORY_CACHE_TTL_MS', '60000') or 0)
+HISTORY_CACHE_MAX_ENTRIES = int(os.environ.get('HISTORY_CACHE_MAX_ENTRIES', '256') or 256)
+
+# Adaptive LAN decision timeout learnt per network pair (client decision_timeout_ms still wins)
+TRANSFER_ADAPTIVE_TIMEOUT_ENABLED = os.environ.get('TRANSFER_ADAPTIVE_TIMEOUT_ENABLED', '1').strip().lower() in {'1', 'true', 'yes', 'on'}
+TRANSFER_TIMEOUT_EWMA_ALPHA = float(os.environ.get('TRANSFER_TIMEOUT_EWMA_ALPHA', '0.2') or 0.2)
+TRANSFER_TIMEOUT_MIN_SAMPLES = int(os.environ.get('TRANSFER_TIMEOUT_MIN_SAMPLES', '3') or 3)
+TRANSFER_TIMEOUT_MIN_MS = int(os.environ.get('TRANSFER_TIMEOUT_MIN_MS', '1500') or 1500)
+# Go straight to relay when the LAN success rate drops below this; every Nth transfer still tries LAN
+TRANSFER_LAN_SKIP_SUCCESS_RATE = float(os.environ.get('TRANSFER_LAN_SKIP_SUCCESS_RATE', '0.1') or 0)
+TRANSFER_LAN_EXPLORE_EVERY = int(os.environ.get('TRANSFER_LAN_EXPLORE_EVERY', '10') or 10)
+
+# LAN probe results are reused while both peers keep the same network identity (capped by the
+# PC's probe_ttl_ms and this value; 0 disables), and probes per room are debounced
+LAN_PROBE_CACHE_MAX_TTL_MS = int(os.environ.get('LAN_PROBE_CACHE_MAX_TTL_MS', '300000') or 0)
+LAN_PROBE_DEBOUNCE_MS = int(os.environ.get('LAN_PROBE_DEBOUNCE_MS', '1500') or 0)
+
+# Server-side LAN probe deadline: an unanswered probe resolves to timeout after the probe's
+# timeout_ms plus this grace, then is retried with exponential backoff
+LAN_PROBE_TIMEOUT_GRACE_MS = int(os.environ.get('LAN_PROBE_TIMEOUT_GRACE_MS', '2000') or 0)
+LAN_PROBE_MAX_RETRIES = int(os.environ.get('LAN_PROBE_MAX_RETRIES', '2') or 0)
+LAN_PROBE_RETRY_BASE_MS = int(os.environ.get('LAN_PROBE_RETRY_BASE_MS', '2000') or 2000)
+LAN_PROBE_MAX_PENDING_PER_PAIR = int(os.environ.get('LAN_PROBE_MAX_PENDING_PER_PAIR', '1') or 1)
+
+# Logging: root level, per-logger overrides ("app.socket=WARNING,engineio=INFO"), text or json lines.
+# INFO/DEBUG lines are sampled per message template: the first LOG_SAMPLE_BURST per window pass,
+# then one in LOG_SAMPLE_EVERY (burst 0 disables sampling). Records wait in a queue of LOG_QUEUE_MAX.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO') or 'INFO'
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+LOG_FORMAT = (os.environ.get('LOG_FORMAT', 'text') or 'text').strip().lower()
+LOG_SAMPLE_BURST = int(os.environ.get('LOG_SAMPLE_BURST', '20') or 0)
+LOG_SAMPLE_WINDOW_MS = int(os.environ.get('LOG_SAMPLE_WINDOW_MS', '1000') or 1000)
+LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', '100') or 0)
+LOG_QUEUE_MAX = int(os.environ.get('LOG_QUEUE_MAX', '10000') or 10000)
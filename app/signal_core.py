@@ -1,16 +1,25 @@
-﻿import ipaddress
+﻿import bisect
+import ipaddress
 import json
 import os
+import random
 import time
+from collections import OrderedDict
 from urllib.parse import urlparse
 from uuid import uuid4
 
 from flask import request
 from flask_socketio import emit
 
+from .services.binary_payloads import has_binary, to_text_payload
+from .services.transfer_timing import LAN_EXPLORE, LAN_SKIP
 
 socketio = None
 logger = None
+record_transfer_outcome = None
+transfer_decision_estimator = None
+lan_probe_cache = None
+dashboard_feed = None
 
 
 def bind_runtime(runtime_socketio, runtime_logger):
@@ -19,27 +28,107 @@ def bind_runtime(runtime_socketio, runtime_logger):
     logger = runtime_logger
 
 
+def bind_transfer_outcome_recorder(record):
+    """``record(context)`` is called on every transfer state change and keeps the decisions it cares about."""
+    global record_transfer_outcome
+    record_transfer_outcome = record
+
+
+def bind_lan_probe_cache(cache):
+    """Reuse probe results per network-identity pair and debounce probes (see services.probe_cache)."""
+    global lan_probe_cache
+    lan_probe_cache = cache
+
+
+def bind_dashboard_feed(feed):
+    """Send dashboard events through ``feed`` (see services.dashboard_feed) instead of broadcasting them."""
+    global dashboard_feed
+    dashboard_feed = feed
+
+
+def configure_lan_probes(*, timeout_grace_ms, max_retries, retry_base_ms, max_pending_per_pair):
+    """Apply the LAN_PROBE_* settings used by the server-side probe deadline."""
+    global LAN_PROBE_TIMEOUT_GRACE_MS, LAN_PROBE_MAX_RETRIES, LAN_PROBE_RETRY_BASE_MS, LAN_PROBE_MAX_PENDING_PER_PAIR
+    LAN_PROBE_TIMEOUT_GRACE_MS = max(0, int(timeout_grace_ms))
+    LAN_PROBE_MAX_RETRIES = max(0, int(max_retries))
+    LAN_PROBE_RETRY_BASE_MS = max(1, int(retry_base_ms))
+    LAN_PROBE_MAX_PENDING_PER_PAIR = max(1, int(max_pending_per_pair))
+
+
+def configure_rooms(*, max_peers, max_peers_limit):
+    """``max_peers`` is the default room size; ``join.max_peers`` may raise it up to ``max_peers_limit``."""
+    global ROOM_MAX_PEERS, ROOM_MAX_PEERS_LIMIT
+    ROOM_MAX_PEERS = max(2, int(max_peers))
+    ROOM_MAX_PEERS_LIMIT = max(ROOM_MAX_PEERS, int(max_peers_limit))
+
+
+def configure_idle_reaper(*, idle_timeout_ms, interval_ms):
+    """Clients not seen for ``idle_timeout_ms`` are detached every ``interval_ms``; 0 turns the reaper off."""
+    global CLIENT_IDLE_TIMEOUT_MS, IDLE_REAP_INTERVAL_MS
+    CLIENT_IDLE_TIMEOUT_MS = max(0, int(idle_timeout_ms))
+    IDLE_REAP_INTERVAL_MS = max(100, int(interval_ms))
+
+
+def bind_transfer_decision_estimator(estimator):
+    """Use ``estimator`` (see services.transfer_timing) for adaptive decision timeouts."""
+    global transfer_decision_estimator
+    transfer_decision_estimator = estimator
+
+
 CLIENT_SESSIONS = {}
+# sid -> client_id for every sid in CLIENT_SESSIONS
+SID_CLIENTS = {}
 CLIENT_ROOMS = {}
 CLIENT_TYPES = {}
 CLIENT_DEVICE_NAMES = {}
 ROOM_CLIENT_ORDER = {}
 CLIENT_JOINED_AT_MS = {}
-CLIENT_LAST_SEEN_MS = {}
+# client_id -> last seen ms, least recently seen first; only written by mark_client_seen
+CLIENT_LAST_SEEN_MS = OrderedDict()
 CLIENT_NETWORK_META = {}
 CLIENT_PROBE_META = {}
 ROOM_LAST_PROBE = {}
+# room -> {(pc_client_id, app_client_id): probe result}
+ROOM_PAIR_PROBES = {}
+ROOM_PEER_LIMITS = {}
 PENDING_LAN_PROBES = {}
-
+# (room, pc_client_id, app_client_id) -> [probe_id, ...], oldest first
+PAIR_PENDING_PROBES = {}
+DEBOUNCED_PROBE_ROOMS = set()
+# sids that joined with "binary": true and take bytes values as binary attachments
+BINARY_SIDS = set()
+# room -> version, bumped by every change to what build_room_state_payload reports
+ROOM_VERSIONS = {}
+# room -> (version, payload) for the rooms in ROOM_CLIENT_ORDER
+ROOM_STATE_CACHE = {}
+# ROOM_CLIENT_ORDER's rooms, kept sorted for get_all_room_states
+ROOM_INDEX = []
+IDLE_REAPER_STATS = {}
+# Clients restored from a warm-restart snapshot that have not joined again yet
+RESTORED_CLIENTS = set()
+
+# Default and upper bound for a room's size; overridden from settings via configure_rooms().
 ROOM_MAX_PEERS = 2
+ROOM_MAX_PEERS_LIMIT = 8
+# Overridden from settings via configure_idle_reaper().
+CLIENT_IDLE_TIMEOUT_MS = 0
+IDLE_REAP_INTERVAL_MS = 15000
 PROTOCOL_VERSION = '4.0'
 DEFAULT_PROBE_TIMEOUT_MS = 1200
+# Probe deadline enforcement; overridden from settings via configure_lan_probes().
+LAN_PROBE_TIMEOUT_GRACE_MS = 2000
+LAN_PROBE_MAX_RETRIES = 2
+LAN_PROBE_RETRY_BASE_MS = 2000
+LAN_PROBE_MAX_PENDING_PER_PAIR = 1
 SIGNAL_DEBUG_ENABLED = os.environ.get('SIGNAL_DEBUG_ENABLED', '0').strip().lower() in {'1', 'true', 'yes', 'on'}
 SIGNAL_DEBUG_MAX_CHARS = int(os.environ.get('SIGNAL_DEBUG_MAX_CHARS', '800') or 800)
 TRANSFER_DECISION_TIMEOUT_MS_DEFAULT = int(os.environ.get('TRANSFER_DECISION_TIMEOUT_MS_DEFAULT', '10000') or 10000)
 TRANSFER_DECISION_TIMEOUT_MS_MAX = int(os.environ.get('TRANSFER_DECISION_TIMEOUT_MS_MAX', '30000') or 30000)
 
+# transfer_id -> {receiver_client_id: context}; one context per receiver of a file_available
 TRANSFER_CONTEXTS = {}
+TRANSFER_UNDECIDED_STATUSES = frozenset({'created', 'offered', 'waiting_result'})
+TRANSFER_RELAY_STATUSES = frozenset({'relay_uploading', 'fallback_requested', 'fallback_timeout'})
 
 ALLOWED_ACTIVITY_TYPES = {
     'clipboard',
@@ -96,19 +185,71 @@ def is_valid_private_probe_url(probe_url, expected_private_ip=None):
         return False
 
 
-def emit_activity_log(activity_type, room, sender, content):
+def emit_activity_log(activity_type, room, sender, content, client_id=None):
+    if dashboard_feed is None or not dashboard_feed.watching():
+        return
     normalized_type = activity_type if activity_type in ALLOWED_ACTIVITY_TYPES else 'api_relay'
-    socketio.emit('activity_log', {
+    entry = {
         'type': normalized_type,
         'room': room or 'Unknown',
         'sender': sender or 'Unknown',
         'content': content or ''
-    }, room='dashboard_room')
+    }
+    if client_id:
+        entry['client_id'] = client_id
+    dashboard_feed.publish('activity_log', entry, rooms=(room,) if room else (),
+                           client_type=CLIENT_TYPES.get(client_id) if client_id else None,
+                           activity_type=normalized_type)
+
+
+def publish_client_list(rooms=None):
+    """``client_list_update`` for dashboards viewing any of ``rooms`` (all when None), built once per view."""
+    if dashboard_feed is not None:
+        dashboard_feed.publish_views('client_list_update', get_serialized_sessions, rooms=rooms)
+
+
+def publish_server_stats(msg):
+    if dashboard_feed is not None:
+        dashboard_feed.publish('server_stats', lambda: {'clients': len(CLIENT_SESSIONS), 'msg': msg})
+
+
+def set_binary_mode(sid, enabled):
+    if enabled:
+        BINARY_SIDS.add(sid)
+    else:
+        BINARY_SIDS.discard(sid)
+
+
+def emit_relay(event, payload, room, skip_sid=None):
+    """Relay ``payload`` to ``room`` (a room, sid or list of sids), encoding each wire format once.
+
+    Bytes values reach binary-mode sessions as Socket.IO binary attachments
+    and every other session as base64 text.
+    """
+    if not room:
+        return
+    if not has_binary(payload):
+        socketio.emit(event, payload, to=room, skip_sid=skip_sid)
+        return
+    if not BINARY_SIDS:
+        socketio.emit(event, to_text_payload(payload), to=room, skip_sid=skip_sid)
+        return
+
+    binary_sids = []
+    text_sids = []
+    for sid, _ in socketio.server.manager.get_participants('/', room):
+        if sid != skip_sid:
+            (binary_sids if sid in BINARY_SIDS else text_sids).append(sid)
+    if binary_sids:
+        socketio.emit(event, payload, to=binary_sids)
+    if text_sids:
+        socketio.emit(event, to_text_payload(payload), to=text_sids)
 
 
 def to_debug_json(payload):
     try:
-        rendered = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+        rendered = json.dumps(payload, ensure_ascii=False, separators=(',', ':'),
+                              default=lambda value: f'<{len(value)} bytes>')
     except Exception:
         rendered = str(payload)
 
@@ -172,10 +313,19 @@ def is_sender_authorized_for_room(sender_client_id, room):
     return CLIENT_ROOMS.get(sender_client_id) == room and sender_client_id in CLIENT_SESSIONS
 
 
-def get_serialized_sessions():
+def get_serialized_sessions(rooms=None, client_types=None):
+    """Dashboard view of the sessions; ``rooms`` and ``client_types`` narrow it and only their clients are visited."""
+    if rooms is None:
+        client_ids = CLIENT_SESSIONS
+    else:
+        client_ids = [client_id for room in sorted(rooms) for client_id in ROOM_CLIENT_ORDER.get(room, ())
+                      if client_id in CLIENT_SESSIONS]
     data = {}
     room_state_cache = {}
-    for client_id, sids in CLIENT_SESSIONS.items():
+    for client_id in client_ids:
+        if client_types is not None and CLIENT_TYPES.get(client_id, 'unknown') not in client_types:
+            continue
+        sids = CLIENT_SESSIONS[client_id]
         room = CLIENT_ROOMS.get(client_id, 'Unknown')
         if room not in room_state_cache and room != 'Unknown':
             room_state_cache[room] = build_room_state_payload(room)
@@ -196,10 +346,17 @@ def get_serialized_sessions():
 
 
 def get_client_from_sid(sid):
-    for client_id, sids in CLIENT_SESSIONS.items():
-        if sid in sids:
-            return client_id
-    return "Unknown"
+    return SID_CLIENTS.get(sid, "Unknown")
+
+
+def attach_sid(client_id, sid):
+    owner = SID_CLIENTS.get(sid)
+    if owner is not None and owner != client_id:
+        # The session re-joined under another client_id; the old identity loses it.
+        detach_sid_from_tracking(sid)
+    CLIENT_SESSIONS.setdefault(client_id, set()).add(sid)
+    SID_CLIENTS[sid] = client_id
+    RESTORED_CLIENTS.discard(client_id)
 
 
 def get_room_client_ids(room):
@@ -207,20 +364,133 @@ def get_room_client_ids(room):
     filtered = [client_id for client_id in room_clients if CLIENT_ROOMS.get(client_id) == room and client_id in CLIENT_SESSIONS]
     if filtered != room_clients:
         ROOM_CLIENT_ORDER[room] = filtered
+        touch_room(room)
     return filtered
 
 
+def touch_room(room):
+    """Invalidate ``room``'s cached state payload; call after any change to what it reports."""
+    if room in ROOM_CLIENT_ORDER:
+        ROOM_VERSIONS[room] = ROOM_VERSIONS.get(room, 0) + 1
+
+
+def touch_client_room(client_id):
+    touch_room(CLIENT_ROOMS.get(client_id))
+
+
+def mark_client_seen(client_id):
+    CLIENT_LAST_SEEN_MS[client_id] = current_time_ms()
+    CLIENT_LAST_SEEN_MS.move_to_end(client_id)
+    touch_client_room(client_id)
+
+
+def add_client_to_room_order(client_id, room):
+    room_clients = ROOM_CLIENT_ORDER.get(room)
+    if room_clients is None:
+        room_clients = ROOM_CLIENT_ORDER[room] = []
+        bisect.insort(ROOM_INDEX, room)
+    if client_id not in room_clients:
+        room_clients.append(client_id)
+    touch_room(room)
+
+
 def remove_client_from_room_order(client_id, room):
     if not room:
         return
     room_clients = ROOM_CLIENT_ORDER.get(room, [])
     if client_id in room_clients:
         ROOM_CLIENT_ORDER[room] = [cid for cid in room_clients if cid != client_id]
+    touch_room(room)
     if not ROOM_CLIENT_ORDER.get(room):
-        ROOM_CLIENT_ORDER.pop(room, None)
+        if ROOM_CLIENT_ORDER.pop(room, None) is not None:
+            index = bisect.bisect_left(ROOM_INDEX, room)
+            if index < len(ROOM_INDEX) and ROOM_INDEX[index] == room:
+                del ROOM_INDEX[index]
+        ROOM_PEER_LIMITS.pop(room, None)
+        ROOM_PAIR_PROBES.pop(room, None)
+        ROOM_LAST_PROBE.pop(room, None)
+        ROOM_VERSIONS.pop(room, None)
+        ROOM_STATE_CACHE.pop(room, None)
+
+
+def get_room_max_peers(room):
+    return ROOM_PEER_LIMITS.get(room, ROOM_MAX_PEERS)
+
+
+def set_room_max_peers(room, max_peers):
+    """Set ``room``'s size from a ``join.max_peers`` request, bounded by ROOM_MAX_PEERS_LIMIT."""
+    try:
+        value = int(max_peers)
+    except (TypeError, ValueError):
+        return False
+    ROOM_PEER_LIMITS[room] = min(ROOM_MAX_PEERS_LIMIT, max(2, value))
+    touch_room(room)
+    return True
+
+
+def get_probe_pairs(room, clients=None):
+    """``(pc_client_id, app_client_id)`` for every PC/app couple in ``room``, in join order."""
+    if clients is None:
+        clients = get_room_client_ids(room)
+    pcs = [client_id for client_id in clients if is_pc_client_type(CLIENT_TYPES.get(client_id))]
+    apps = [client_id for client_id in clients if is_app_client_type(CLIENT_TYPES.get(client_id))]
+    return [(pc_client_id, app_client_id) for pc_client_id in pcs for app_client_id in apps]
+
+
+def get_probe_pair(client_a, client_b):
+    """The probe pair for two peers, or None unless one is a PC and the other an app."""
+    type_a = CLIENT_TYPES.get(client_a)
+    type_b = CLIENT_TYPES.get(client_b)
+    if is_pc_client_type(type_a) and is_app_client_type(type_b):
+        return client_a, client_b
+    if is_app_client_type(type_a) and is_pc_client_type(type_b):
+        return client_b, client_a
+    return None
+
+
+def probe_result_state(result):
+    status = (result or {}).get('status')
+    if status == 'ok':
+        return 'PAIR_SAME_LAN'
+    if status in {'fail', 'timeout'}:
+        return 'PAIR_DIFF_LAN'
+    return 'PAIR_UNKNOWN'
+
+
+def record_pair_probe(room, pc_client_id, app_client_id, result):
+    result = dict(result, pc_client_id=pc_client_id, app_client_id=app_client_id)
+    ROOM_PAIR_PROBES.setdefault(room, {})[(pc_client_id, app_client_id)] = result
+    ROOM_LAST_PROBE[room] = result
+    touch_room(room)
+    return result
+
+
+def forget_client_probes(room, client_id):
+    """Drop the probe results of every pair ``client_id`` belongs to in ``room``; other pairs keep theirs."""
+    pair_probes = ROOM_PAIR_PROBES.get(room)
+    if pair_probes:
+        for pair in [pair for pair in pair_probes if client_id in pair]:
+            del pair_probes[pair]
+        if not pair_probes:
+            ROOM_PAIR_PROBES.pop(room, None)
+    last_probe = ROOM_LAST_PROBE.get(room)
+    if last_probe and client_id in (last_probe.get('pc_client_id'), last_probe.get('app_client_id')):
+        ROOM_LAST_PROBE.pop(room, None)
+    touch_room(room)
 
 
 def build_room_state_payload(room):
+    """``room``'s state as sent in ``room_state_changed``; shared until the room changes, so never modify it."""
+    cached = ROOM_STATE_CACHE.get(room)
+    if cached is not None and cached[0] == ROOM_VERSIONS.get(room, 0):
+        return cached[1]
+    payload = assemble_room_state_payload(room)
+    if room in ROOM_CLIENT_ORDER:
+        ROOM_STATE_CACHE[room] = (ROOM_VERSIONS.get(room, 0), payload)
+    return payload
+
+
+def assemble_room_state_payload(room):
     clients = get_room_client_ids(room)
     peer_summaries = []
     for client_id in clients:
@@ -234,47 +504,50 @@ def build_room_state_payload(room):
         })
 
     last_probe = ROOM_LAST_PROBE.get(room)
+    pair_summaries = None
 
     if len(clients) == 0:
         state = 'EMPTY'
-        same_lan = False
-        confidence = 'none'
     elif len(clients) == 1:
         state = 'SINGLE'
-        same_lan = False
-        confidence = 'none'
     else:
-        probe_status = (last_probe or {}).get('status')
-        if probe_status == 'ok':
-            state = 'PAIR_SAME_LAN'
-            same_lan = True
-            confidence = 'confirmed'
-        elif probe_status in {'fail', 'timeout'}:
-            state = 'PAIR_DIFF_LAN'
-            same_lan = False
-            confidence = 'confirmed'
-        else:
-            state = 'PAIR_UNKNOWN'
-            same_lan = False
-            confidence = 'none'
+        # A room agrees on SAME/DIFF only when every PC/app pair does.
+        pair_probes = ROOM_PAIR_PROBES.get(room, {})
+        pair_summaries = []
+        for pc_client_id, app_client_id in get_probe_pairs(room, clients):
+            pair_summaries.append({
+                'pc_client_id': pc_client_id,
+                'app_client_id': app_client_id,
+                'state': probe_result_state(pair_probes.get((pc_client_id, app_client_id)))
+            })
+        pair_states = {summary['state'] for summary in pair_summaries}
+        state = pair_states.pop() if len(pair_states) == 1 else 'PAIR_UNKNOWN'
 
     payload = {
         'protocol_version': PROTOCOL_VERSION,
         'room': room,
-        'max_peers': ROOM_MAX_PEERS,
+        'max_peers': get_room_max_peers(room),
         'state': state,
-        'same_lan': same_lan,
-        'lan_confidence': confidence,
+        'same_lan': state == 'PAIR_SAME_LAN',
+        'lan_confidence': 'confirmed' if state in {'PAIR_SAME_LAN', 'PAIR_DIFF_LAN'} else 'none',
         'peers': peer_summaries
     }
+    if pair_summaries is not None:
+        payload['pairs'] = pair_summaries
     if last_probe:
         payload['last_probe'] = last_probe
     return payload
 
 
-def get_room_lan_state(room):
+def get_room_lan_state(room, client_a=None, client_b=None):
+    """The room's state, or the state of the pair ``client_a`` / ``client_b`` when both are given."""
     if not room:
         return 'UNKNOWN'
+    if client_a and client_b:
+        pair = get_probe_pair(client_a, client_b)
+        if pair is None:
+            return 'PAIR_UNKNOWN'
+        return probe_result_state(ROOM_PAIR_PROBES.get(room, {}).get(pair))
     return str(build_room_state_payload(room).get('state', 'UNKNOWN')).upper()
 
 
@@ -298,27 +571,64 @@ def ensure_protocol_version(payload, event_name):
     return True
 
 
-def pick_receiver_client_id(room, sender_client_id):
-    for client_id in get_room_client_ids(room):
-        if client_id != sender_client_id:
-            return client_id
-    return None
+def pick_receiver_client_ids(room, sender_client_id):
+    return [client_id for client_id in get_room_client_ids(room) if client_id != sender_client_id]
+
+
+def get_network_pair_key(room, client_a, client_b):
+    """Key transfer statistics by the pair of peer networks, falling back to the room."""
+    network_ids = []
+    for client_id in (client_a, client_b):
+        network_id = (CLIENT_NETWORK_META.get(client_id) or {}).get('network_id_hash')
+        if not client_id or not network_id:
+            return f'room:{room}'
+        network_ids.append(str(network_id))
+    return 'net:' + '|'.join(sorted(network_ids))
+
+
+def should_skip_lan_attempt(context):
+    """True when past transfers on this network pair say a LAN offer will fail.
+
+    A fresh successful probe is newer evidence than the transfer history, so
+    rooms in PAIR_SAME_LAN always get a LAN attempt.
+    """
+    if not transfer_decision_estimator or context.get('room_state') == 'PAIR_SAME_LAN':
+        return False
+    mode = transfer_decision_estimator.lan_attempt_mode(context.get('network_key'))
+    if mode == LAN_EXPLORE and context.get('adaptive_timeout'):
+        # A shortened deadline would turn a slow but working LAN into another failure.
+        set_transfer_decision_timeout(context, TRANSFER_DECISION_TIMEOUT_MS_DEFAULT, adaptive=False)
+    return mode == LAN_SKIP
+
 
+def set_transfer_decision_timeout(context, timeout_ms, adaptive):
+    timeout_ms = clamp_transfer_timeout_ms(timeout_ms)
+    context['decision_timeout_ms'] = timeout_ms
+    context['decision_deadline_ms'] = context['created_at_ms'] + timeout_ms
+    context['adaptive_timeout'] = adaptive
 
-def get_or_create_transfer_context(room, sender_client_id, payload):
+
+def get_or_create_transfer_context(room, sender_client_id, payload, receiver_client_id=None):
+    """The context for delivering ``payload`` to one receiver (None when the sender is alone)."""
     transfer_id = str(payload.get('transfer_id') or '').strip()
     if not transfer_id:
         transfer_id = f"tr_{current_time_ms()}_{uuid4().hex[:6]}"
         payload['transfer_id'] = transfer_id
 
-    file_id = str(payload.get('file_id') or '').strip() or 'Unknown ID'
-    receiver_client_id = pick_receiver_client_id(room, sender_client_id)
-    timeout_ms = clamp_transfer_timeout_ms(payload.get('decision_timeout_ms', TRANSFER_DECISION_TIMEOUT_MS_DEFAULT))
-
-    existing = TRANSFER_CONTEXTS.get(transfer_id)
+    contexts = TRANSFER_CONTEXTS.setdefault(transfer_id, {})
+    existing = contexts.get(receiver_client_id)
     if existing:
         return existing
 
+    file_id = str(payload.get('file_id') or '').strip() or 'Unknown ID'
+    network_key = get_network_pair_key(room, sender_client_id, receiver_client_id)
+    size_bytes = payload.get('file_size', payload.get('size'))
+    if 'decision_timeout_ms' in payload or not transfer_decision_estimator:
+        timeout_ms = payload.get('decision_timeout_ms', TRANSFER_DECISION_TIMEOUT_MS_DEFAULT)
+    else:
+        timeout_ms = transfer_decision_estimator.suggest_timeout_ms(
+            network_key, TRANSFER_DECISION_TIMEOUT_MS_DEFAULT, size_bytes)
+
     context = {
         'transfer_id': transfer_id,
         'room': room,
@@ -328,18 +638,58 @@ def get_or_create_transfer_context(room, sender_client_id, payload):
         'filename': payload.get('filename', ''),
         'status': 'created',
         'created_at_ms': current_time_ms(),
-        'decision_timeout_ms': timeout_ms,
-        'decision_deadline_ms': current_time_ms() + timeout_ms,
+        'room_state': get_room_lan_state(room, sender_client_id, receiver_client_id),
+        'network_key': network_key,
+        'size_bytes': size_bytes,
         'last_reason': ''
     }
-    TRANSFER_CONTEXTS[transfer_id] = context
+    # Only a deadline the estimator shortened makes a timeout a censored latency sample.
+    adaptive = 'decision_timeout_ms' not in payload and clamp_transfer_timeout_ms(timeout_ms) < TRANSFER_DECISION_TIMEOUT_MS_DEFAULT
+    set_transfer_decision_timeout(context, timeout_ms, adaptive=adaptive)
+    contexts[receiver_client_id] = context
     return context
 
 
+def find_transfer_context(room, transfer_id, client_id):
+    """The context of ``transfer_id`` whose receiver is ``client_id``."""
+    contexts = TRANSFER_CONTEXTS.get(transfer_id)
+    if not contexts:
+        return None
+    context = contexts.get(client_id)
+    if context is None and len(contexts) == 1:
+        # Older clients may report for the only receiver from another device.
+        context = next(iter(contexts.values()))
+    if context is None or context.get('room') != room:
+        return None
+    return context
+
+
+def count_transfer_contexts():
+    return sum(len(contexts) for contexts in TRANSFER_CONTEXTS.values())
+
+
+def count_undecided_transfers():
+    """Contexts still waiting for a LAN result or relay decision before their deadline."""
+    now_ms = current_time_ms()
+    return sum(1 for contexts in TRANSFER_CONTEXTS.values() for context in contexts.values()
+               if context.get('status') in TRANSFER_UNDECIDED_STATUSES
+               and context.get('decision_deadline_ms', now_ms) > now_ms)
+
+
+def get_sibling_transfer_contexts(context):
+    """The other receivers' contexts for the same transfer."""
+    contexts = TRANSFER_CONTEXTS.get(context.get('transfer_id')) or {}
+    return [sibling for sibling in contexts.values() if sibling is not context]
+
+
 def update_transfer_state(context, status, reason=''):
     context['status'] = status
     context['last_reason'] = reason
     context['updated_at_ms'] = current_time_ms()
+    if status == 'waiting_result':
+        context.setdefault('offered_at_ms', context['updated_at_ms'])
+    if record_transfer_outcome:
+        record_transfer_outcome(context)
     emit_activity_log('transfer_state', context.get('room'), 'server', f"{context.get('transfer_id')} -> {status} ({reason})")
 
 
@@ -382,11 +732,15 @@ def emit_compat_file_need_relay_to_sender(context, reason):
 
 def instruct_upload_relay(context, reason):
     status = context.get('status')
-    if status in {'lan_success', 'completed', 'relay_uploading', 'fallback_requested', 'fallback_timeout'}:
+    if status in {'lan_success', 'completed'} or status in TRANSFER_RELAY_STATUSES:
         return
+    siblings = get_sibling_transfer_contexts(context)
     update_transfer_state(context, 'fallback_requested' if reason != 'decision_timeout' else 'fallback_timeout', reason)
-    emit_transfer_command(context, 'upload_relay', reason)
-    emit_compat_file_need_relay_to_sender(context, reason)
+    # One relay upload serves every receiver of the transfer.
+    if not any(sibling.get('status') in TRANSFER_RELAY_STATUSES for sibling in siblings):
+        emit_transfer_command(context, 'upload_relay', reason)
+        emit_compat_file_need_relay_to_sender(context, reason)
+    finish_sender_if_decided(context, 'lan_ack')
 
 
 def instruct_finish(context, reason='lan_ack'):
@@ -394,11 +748,23 @@ def instruct_finish(context, reason='lan_ack'):
     if status in {'lan_success', 'completed'}:
         return
     update_transfer_state(context, 'lan_success', reason)
+    finish_sender_if_decided(context, reason)
+
+
+def finish_sender_if_decided(context, reason):
+    """Send ``finish`` once every receiver has decided and at least one got the file over LAN."""
+    contexts = [context] + get_sibling_transfer_contexts(context)
+    if any(item.get('status') in TRANSFER_UNDECIDED_STATUSES or item.get('finish_sent') for item in contexts):
+        return
+    if not any(item.get('status') == 'lan_success' for item in contexts):
+        return
+    for item in contexts:
+        item['finish_sent'] = True
     emit_transfer_command(context, 'finish', reason)
 
 
-def transfer_decision_timeout_worker(transfer_id):
-    context = TRANSFER_CONTEXTS.get(transfer_id)
+def transfer_decision_timeout_worker(transfer_id, receiver_client_id=None):
+    context = (TRANSFER_CONTEXTS.get(transfer_id) or {}).get(receiver_client_id)
     if not context:
         return
 
@@ -406,7 +772,7 @@ def transfer_decision_timeout_worker(transfer_id):
     sleep_ms = max(0, deadline_ms - current_time_ms())
     socketio.sleep(sleep_ms / 1000.0)
 
-    context = TRANSFER_CONTEXTS.get(transfer_id)
+    context = (TRANSFER_CONTEXTS.get(transfer_id) or {}).get(receiver_client_id)
     if not context:
         return
 
@@ -419,7 +785,8 @@ def emit_room_state_changed(room, reason='state_updated'):
         return
     payload = build_room_state_payload(room)
     socketio.emit('room_state_changed', payload, room=room)
-    socketio.emit('room_state_changed', payload, room='dashboard_room')
+    if dashboard_feed is not None:
+        dashboard_feed.publish('room_state_changed', payload, rooms=(room,))
     emit_activity_log('room_state_changed', room, 'server', f"{payload.get('state', 'UNKNOWN')} ({reason})")
 
 
@@ -431,19 +798,22 @@ def broadcast_room_stats(room):
     count = len(client_list)
 
     socketio.emit('room_stats', {'count': count, 'room': room, 'clients': client_list}, room=room)
-    logger.info(f"Broadcast room_stats to {room}: {count} clients ({client_list})")
+    logger.info("Broadcast room_stats to %s: %s clients (%s)", room, count, client_list)
 
 
 def purge_client_tracking(client_id):
     room = CLIENT_ROOMS.pop(client_id, None)
     remove_client_from_room_order(client_id, room)
-    CLIENT_SESSIONS.pop(client_id, None)
+    for sid in CLIENT_SESSIONS.pop(client_id, ()):
+        SID_CLIENTS.pop(sid, None)
     CLIENT_TYPES.pop(client_id, None)
     CLIENT_DEVICE_NAMES.pop(client_id, None)
     CLIENT_JOINED_AT_MS.pop(client_id, None)
     CLIENT_LAST_SEEN_MS.pop(client_id, None)
     CLIENT_NETWORK_META.pop(client_id, None)
     CLIENT_PROBE_META.pop(client_id, None)
+    if room:
+        forget_client_probes(room, client_id)
     return room
 
 
@@ -460,30 +830,31 @@ def evict_client_from_room(room, client_id, reason='room_capacity_exceeded'):
         try:
             socketio.server.leave_room(sid, room)
         except Exception:
-            logger.warning(f"Failed to force sid {sid} to leave room {room} during eviction")
+            logger.warning("Failed to force sid %s to leave room %s during eviction", sid, room)
 
     purge_client_tracking(client_id)
     emit_activity_log('peer_evicted', room, 'server', f"{client_id}: {reason}")
-    logger.info(f"Evicted client {client_id} from room {room}: {reason}")
+    logger.info("Evicted client %s from room %s: %s", client_id, room, reason)
 
 
-def choose_eviction_candidate(room):
-    clients = get_room_client_ids(room)
+def choose_eviction_candidate(room, keep_client_id=None):
+    """The least recently seen non-PC peer (any peer if all are PCs), never ``keep_client_id``."""
+    clients = [client_id for client_id in get_room_client_ids(room) if client_id != keep_client_id]
     if not clients:
         return None
 
     non_pc_clients = [client_id for client_id in clients if not is_pc_client_type(CLIENT_TYPES.get(client_id, 'unknown'))]
-    if non_pc_clients:
-        return non_pc_clients[0]
+    candidates = non_pc_clients or clients
+    # min() keeps the earliest joiner on ties.
+    return min(candidates, key=lambda client_id: CLIENT_LAST_SEEN_MS.get(client_id, 0))
 
-    return clients[0]
 
-
-def enforce_room_capacity(room):
+def enforce_room_capacity(room, keep_client_id=None):
     if not room:
         return
-    while len(get_room_client_ids(room)) > ROOM_MAX_PEERS:
-        eviction_candidate = choose_eviction_candidate(room)
+    max_peers = get_room_max_peers(room)
+    while len(get_room_client_ids(room)) > max_peers:
+        eviction_candidate = choose_eviction_candidate(room, keep_client_id)
         if not eviction_candidate:
             break
         evict_client_from_room(room, eviction_candidate, reason='room_capacity_exceeded')
@@ -500,6 +871,7 @@ def update_client_network_meta(client_id, network_data):
         'network_epoch': int(network_data.get('network_epoch', current.get('network_epoch', 0) or 0))
     }
     CLIENT_NETWORK_META[client_id] = updated
+    touch_client_room(client_id)
 
 
 def update_client_probe_meta(client_id, probe_data):
@@ -513,50 +885,95 @@ def update_client_probe_meta(client_id, probe_data):
     CLIENT_PROBE_META[client_id] = updated
 
 
-def trigger_lan_probe_if_ready(room, reason='room_updated'):
+def trigger_lan_probe_if_ready(room, reason='room_updated', attempt=0, client_id=None, pair=None):
+    """Probe the room's PC/app pairs that have no result yet.
+
+    With ``client_id`` (the peer that joined or changed network) only that
+    peer's pairs are considered, so a join costs one probe per peer of the
+    other type instead of one per pair in the room.  ``pair`` re-probes a
+    single pair whose probe timed out.
+    """
     if not room:
         return
 
-    clients = get_room_client_ids(room)
-    if len(clients) != 2:
+    pairs = get_probe_pairs(room)
+    if pair is not None:
+        pairs = [pair] if pair in pairs else []
+    else:
+        if client_id is not None:
+            pairs = [candidate for candidate in pairs if client_id in candidate]
+        known = ROOM_PAIR_PROBES.get(room, {})
+        pairs = [candidate for candidate in pairs if candidate not in known]
+    if not pairs:
         return
 
-    pc_client_id = None
-    app_client_id = None
-    for client_id in clients:
-        ctype = CLIENT_TYPES.get(client_id, 'unknown')
-        if is_app_client_type(ctype) and app_client_id is None:
-            app_client_id = client_id
-        elif is_pc_client_type(ctype) and pc_client_id is None:
-            pc_client_id = client_id
+    state_reason = None
+    to_send = []
+    for pc_client_id, app_client_id in pairs:
+        pc_network = CLIENT_NETWORK_META.get(pc_client_id, {})
+        probe_url = CLIENT_PROBE_META.get(pc_client_id, {}).get('probe_url')
+
+        if not is_valid_private_probe_url(probe_url, expected_private_ip=pc_network.get('private_ip')):
+            record_pair_probe(room, pc_client_id, app_client_id, {
+                'probe_id': '',
+                'status': 'fail',
+                'latency_ms': None,
+                'checked_at_ms': current_time_ms(),
+                'reason': 'invalid_probe_url'
+            })
+            state_reason = 'probe_url_invalid'
+            continue
+
+        cache_key = None
+        if lan_probe_cache:
+            cache_key = lan_probe_cache.key_for(pc_network, CLIENT_NETWORK_META.get(app_client_id), probe_url)
+            cached = lan_probe_cache.get(cache_key)
+            if cached:
+                record_pair_probe(room, pc_client_id, app_client_id,
+                                  dict(cached, probe_id='', reason='cache_hit', cached=True))
+                emit_activity_log('lan_probe_result', room, 'server', f"cache hit: {cached.get('status')} ({reason})")
+                state_reason = 'probe_cache_hit'
+                continue
+        to_send.append((pc_client_id, app_client_id, probe_url, cache_key))
+
+    # Retries are already spaced by their backoff; everything else shares the room's debounce window.
+    if to_send and lan_probe_cache and pair is None:
+        delay_ms = lan_probe_cache.debounce_remaining_ms(room)
+        if delay_ms:
+            schedule_debounced_probe(room, delay_ms)
+            to_send = []
+        else:
+            lan_probe_cache.note_probe_sent(room, len(to_send))
 
-    if not pc_client_id or not app_client_id:
-        return
+    for pc_client_id, app_client_id, probe_url, cache_key in to_send:
+        send_lan_probe(room, pc_client_id, app_client_id, probe_url, cache_key, reason, attempt)
+        state_reason = 'probe_requested'
+
+    if state_reason:
+        emit_room_state_changed(room, reason=state_reason)
 
-    pc_network = CLIENT_NETWORK_META.get(pc_client_id, {})
-    pc_probe = CLIENT_PROBE_META.get(pc_client_id, {})
-    probe_url = pc_probe.get('probe_url')
-
-    if not is_valid_private_probe_url(probe_url, expected_private_ip=pc_network.get('private_ip')):
-        ROOM_LAST_PROBE[room] = {
-            'probe_id': '',
-            'status': 'fail',
-            'latency_ms': None,
-            'checked_at_ms': current_time_ms(),
-            'reason': 'invalid_probe_url'
-        }
-        emit_room_state_changed(room, reason='probe_url_invalid')
-        return
 
+def send_lan_probe(room, pc_client_id, app_client_id, probe_url, cache_key, reason, attempt):
     probe_id = f"pr_{current_time_ms()}_{uuid4().hex[:8]}"
     timeout_ms = DEFAULT_PROBE_TIMEOUT_MS
 
+    # Results of superseded probes describe an older network state; answering them yields E_PROBE_STALE.
+    pair_probes = PAIR_PENDING_PROBES.setdefault((room, pc_client_id, app_client_id), [])
+    while len(pair_probes) >= LAN_PROBE_MAX_PENDING_PER_PAIR:
+        superseded = PENDING_LAN_PROBES.pop(pair_probes.pop(0), None)
+        if superseded:
+            superseded['resolved'] = True
+    pair_probes.append(probe_id)
+
     PENDING_LAN_PROBES[probe_id] = {
         'room': room,
         'pc_client_id': pc_client_id,
         'app_client_id': app_client_id,
         'requested_at_ms': current_time_ms(),
         'timeout_ms': timeout_ms,
+        'cache_key': cache_key,
+        'cache_ttl_ms': CLIENT_PROBE_META.get(pc_client_id, {}).get('probe_ttl_ms', 30000),
+        'attempt': attempt,
         'resolved': False
     }
 
@@ -574,33 +991,291 @@ def trigger_lan_probe_if_ready(room, reason='room_updated'):
         socketio.emit('lan_probe_request', payload, room=sid)
 
     emit_activity_log('lan_probe_request', room, 'server', f"{probe_id} ({reason})")
-    emit_room_state_changed(room, reason='probe_requested')
+    socketio.start_background_task(lan_probe_timeout_worker, probe_id)
 
 
-def get_all_room_states():
-    states = {}
-    for room in sorted(ROOM_CLIENT_ORDER.keys()):
-        states[room] = build_room_state_payload(room)
-    return states
+def lan_probe_timeout_worker(probe_id):
+    pending = PENDING_LAN_PROBES.get(probe_id)
+    if not pending:
+        return
+    socketio.sleep((pending['timeout_ms'] + LAN_PROBE_TIMEOUT_GRACE_MS) / 1000.0)
 
+    # An unanswered probe says nothing about the network, so it is not cached.
+    result = resolve_lan_probe(probe_id, 'timeout', reason='server_deadline', cacheable=False)
+    if not result:
+        return
+    room = pending['room']
+    pair = (pending['pc_client_id'], pending['app_client_id'])
+    emit_activity_log('lan_probe_result', room, 'server', f"{probe_id}: timeout (no result from app)")
+    emit_room_state_changed(room, reason='probe_timeout')
 
-def detach_sid_from_tracking(sid, reason='peer_disconnected', room_hint=None):
-    for client_id, sids in list(CLIENT_SESSIONS.items()):
-        if sid in sids:
-            sids.discard(sid)
-            CLIENT_LAST_SEEN_MS[client_id] = current_time_ms()
-            room = CLIENT_ROOMS.get(client_id) or room_hint
+    attempt = pending.get('attempt', 0)
+    if attempt >= LAN_PROBE_MAX_RETRIES:
+        return
+    # Exponential backoff with +/-20% jitter so rooms that timed out together do not retry together.
+    backoff_ms = LAN_PROBE_RETRY_BASE_MS * (2 ** attempt) * random.uniform(0.8, 1.2)
+    socketio.sleep(backoff_ms / 1000.0)
+    # Skip the retry if anything newer (a result, a rejoin, another probe) has happened to the pair meanwhile.
+    if ROOM_PAIR_PROBES.get(room, {}).get(pair) is result and not PAIR_PENDING_PROBES.get((room,) + pair):
+        trigger_lan_probe_if_ready(room, reason='probe_retry', attempt=attempt + 1, pair=pair)
+
+
+def schedule_debounced_probe(room, delay_ms):
+    """Probe ``room`` once after ``delay_ms``, coalescing requests that arrive meanwhile."""
+    lan_probe_cache.note_debounced()
+    if room in DEBOUNCED_PROBE_ROOMS:
+        return
+    DEBOUNCED_PROBE_ROOMS.add(room)
 
-            if not sids:
-                purge_client_tracking(client_id)
-                if room:
-                    ROOM_LAST_PROBE.pop(room, None)
-                    broadcast_room_stats(room)
-                    emit_room_state_changed(room, reason=reason)
-                    trigger_lan_probe_if_ready(room, reason=reason)
+    def run_debounced_probe():
+        socketio.sleep(delay_ms / 1000.0)
+        DEBOUNCED_PROBE_ROOMS.discard(room)
+        trigger_lan_probe_if_ready(room, reason='debounced')
 
-            return client_id
-    return None
+    socketio.start_background_task(run_debounced_probe)
+
+
+def resolve_lan_probe(probe_id, status, latency_ms=None, reason='', cacheable=True):
+    """Record the outcome of a pending probe; returns the pair's new result or None if already resolved."""
+    pending = PENDING_LAN_PROBES.pop(probe_id, None)
+    if not pending or pending.get('resolved'):
+        return None
+    pending['resolved'] = True
+    room = pending['room']
+    pc_client_id = pending['pc_client_id']
+    app_client_id = pending['app_client_id']
+    pair_key = (room, pc_client_id, app_client_id)
+    pair_probes = PAIR_PENDING_PROBES.get(pair_key)
+    if pair_probes and probe_id in pair_probes:
+        pair_probes.remove(probe_id)
+        if not pair_probes:
+            PAIR_PENDING_PROBES.pop(pair_key, None)
+
+    result = {
+        'probe_id': probe_id,
+        'status': status,
+        'latency_ms': latency_ms,
+        'checked_at_ms': current_time_ms(),
+        'reason': reason
+    }
+    # A peer that left while the probe was out no longer has a pair to describe.
+    if CLIENT_ROOMS.get(pc_client_id) == room and CLIENT_ROOMS.get(app_client_id) == room:
+        result = record_pair_probe(room, pc_client_id, app_client_id, result)
+    if lan_probe_cache and cacheable:
+        lan_probe_cache.put(pending.get('cache_key'), {
+            'status': status,
+            'latency_ms': latency_ms,
+            'checked_at_ms': result['checked_at_ms'],
+        }, pending.get('cache_ttl_ms'))
+    return result
+
+
+def get_all_room_states(rooms=None):
+    if rooms is None:
+        return {room: build_room_state_payload(room) for room in ROOM_INDEX}
+    return {room: build_room_state_payload(room) for room in sorted(rooms) if room in ROOM_CLIENT_ORDER}
+
+
+def detach_sid_from_tracking(sid, reason='peer_disconnected', room_hint=None, notify=True):
+    """Forget ``sid``; the client goes too with its last sid.  ``notify=False`` leaves the room update to the caller."""
+    BINARY_SIDS.discard(sid)
+    client_id = SID_CLIENTS.pop(sid, None)
+    if client_id is None:
+        return None
+    sids = CLIENT_SESSIONS.get(client_id, set())
+    sids.discard(sid)
+    mark_client_seen(client_id)
+    room = CLIENT_ROOMS.get(client_id) or room_hint
+
+    if not sids:
+        # Probe results of the room's other pairs still hold, so nothing is re-probed.
+        purge_client_tracking(client_id)
+        if room and notify:
+            broadcast_room_stats(room)
+            emit_room_state_changed(room, reason=reason)
+
+    return client_id
+
+
+def reap_idle_clients(now_ms=None):
+    """Detach every client not seen for CLIENT_IDLE_TIMEOUT_MS and return their ids.
+
+    CLIENT_LAST_SEEN_MS is ordered least recently seen first, so the scan stops
+    at the first live client and costs O(expired).  Each affected room gets one
+    room_stats and one room_state_changed once all its idle clients are gone.
+    """
+    if CLIENT_IDLE_TIMEOUT_MS <= 0:
+        return []
+    cutoff_ms = (now_ms if now_ms is not None else current_time_ms()) - CLIENT_IDLE_TIMEOUT_MS
+    expired = []
+    for client_id, last_seen_ms in CLIENT_LAST_SEEN_MS.items():
+        if last_seen_ms > cutoff_ms:
+            break
+        expired.append(client_id)
+
+    for room, client_ids in drop_clients(expired, 'idle_timeout', 'peer_idle_timeout').items():
+        logger.info("Reaped %s idle client(s) from room %s: %s", len(client_ids), room, client_ids)
+    if expired:
+        IDLE_REAPER_STATS['reaped'] = IDLE_REAPER_STATS.get('reaped', 0) + len(expired)
+    return expired
+
+
+def drop_clients(client_ids, evicted_reason, room_reason):
+    """Evict ``client_ids`` with one room_stats and room_state_changed per room; returns room -> client ids."""
+    rooms = {}
+    for client_id in client_ids:
+        room = CLIENT_ROOMS.get(client_id)
+        sids = list(CLIENT_SESSIONS.get(client_id, ()))
+        if room:
+            rooms.setdefault(room, []).append(client_id)
+            payload = {
+                'protocol_version': PROTOCOL_VERSION,
+                'room': room,
+                'evicted_client_id': client_id,
+                'reason': evicted_reason,
+                'evicted_at_ms': current_time_ms()
+            }
+            for sid in sids:
+                # A half-open socket never reads this; a live one learns to re-join.
+                socketio.emit('peer_evicted', payload, room=sid)
+                try:
+                    socketio.server.leave_room(sid, room)
+                except Exception:
+                    logger.warning("Failed to force sid %s to leave room %s (%s)", sid, room, evicted_reason)
+        for sid in sids:
+            detach_sid_from_tracking(sid, reason=room_reason, notify=False)
+        if client_id in CLIENT_LAST_SEEN_MS:
+            purge_client_tracking(client_id)
+
+    for room, dropped in rooms.items():
+        broadcast_room_stats(room)
+        emit_room_state_changed(room, reason=room_reason)
+        emit_activity_log('peer_evicted', room, 'server', f"{', '.join(dropped)}: {evicted_reason}")
+    if rooms:
+        publish_client_list(list(rooms))
+    return rooms
+
+
+def idle_reaper_worker():
+    while True:
+        socketio.sleep(IDLE_REAP_INTERVAL_MS / 1000.0)
+        try:
+            reap_idle_clients()
+        except Exception:
+            logger.exception("Idle client reaper pass failed")
+
+
+def export_session_state(transfer_max_age_ms=900000):
+    """Rooms, device metadata, probe results and unfinished transfers as JSON-friendly data."""
+    now_ms = current_time_ms()
+    clients = {}
+    for client_id, room in CLIENT_ROOMS.items():
+        if client_id in CLIENT_SESSIONS:
+            clients[client_id] = {
+                'room': room,
+                'type': CLIENT_TYPES.get(client_id),
+                'device_name': CLIENT_DEVICE_NAMES.get(client_id),
+                'joined_at_ms': CLIENT_JOINED_AT_MS.get(client_id),
+                'network': CLIENT_NETWORK_META.get(client_id),
+                'probe': CLIENT_PROBE_META.get(client_id),
+            }
+    rooms = {}
+    for room in ROOM_INDEX:
+        rooms[room] = {
+            'clients': [client_id for client_id in ROOM_CLIENT_ORDER.get(room, ()) if client_id in clients],
+            'max_peers': ROOM_PEER_LIMITS.get(room),
+            'pair_probes': [[pc_client_id, app_client_id, result]
+                            for (pc_client_id, app_client_id), result in ROOM_PAIR_PROBES.get(room, {}).items()],
+            'last_probe': ROOM_LAST_PROBE.get(room),
+        }
+    transfers = []
+    for contexts in TRANSFER_CONTEXTS.values():
+        live = any(context.get('status') in TRANSFER_UNDECIDED_STATUSES or context.get('status') in TRANSFER_RELAY_STATUSES
+                   for context in contexts.values())
+        recent = any(now_ms - int(context.get('updated_at_ms') or context.get('created_at_ms') or 0) <= transfer_max_age_ms
+                     for context in contexts.values())
+        if live and recent:
+            transfers.extend(contexts.values())
+    return {
+        'saved_at_ms': now_ms,
+        'clients': clients,
+        'rooms': rooms,
+        'transfers': transfers,
+        'probe_cache': lan_probe_cache.export_entries() if lan_probe_cache else [],
+    }
+
+
+def restore_session_state(state, grace_ms):
+    """Load an ``export_session_state`` snapshot at boot and return the number of restored clients.
+
+    Restored devices keep their seat, network and probe metadata without a
+    sid.  One that joins again within ``grace_ms`` picks all of it up, and the
+    restored probe cache answers its LAN probe; the others are dropped with one
+    room update per room when the window closes.  Undecided transfers get at
+    least the grace window before their decision timeout fires.
+    """
+    now_ms = current_time_ms()
+    for client_id, meta in (state.get('clients') or {}).items():
+        if not isinstance(meta, dict) or not meta.get('room') or client_id in CLIENT_SESSIONS:
+            continue
+        CLIENT_SESSIONS[client_id] = set()
+        CLIENT_ROOMS[client_id] = meta['room']
+        CLIENT_TYPES[client_id] = normalize_client_type(meta.get('type'))
+        CLIENT_DEVICE_NAMES[client_id] = meta.get('device_name') or client_id
+        CLIENT_JOINED_AT_MS[client_id] = int(meta.get('joined_at_ms') or now_ms)
+        if isinstance(meta.get('network'), dict):
+            CLIENT_NETWORK_META[client_id] = dict(meta['network'])
+        if isinstance(meta.get('probe'), dict):
+            CLIENT_PROBE_META[client_id] = dict(meta['probe'])
+        # Downtime does not count towards the idle timeout.
+        mark_client_seen(client_id)
+        RESTORED_CLIENTS.add(client_id)
+
+    for room, room_state in (state.get('rooms') or {}).items():
+        for client_id in room_state.get('clients') or ():
+            if client_id in RESTORED_CLIENTS and CLIENT_ROOMS.get(client_id) == room:
+                add_client_to_room_order(client_id, room)
+        if room not in ROOM_CLIENT_ORDER:
+            continue
+        if room_state.get('max_peers'):
+            ROOM_PEER_LIMITS[room] = int(room_state['max_peers'])
+        for pc_client_id, app_client_id, result in room_state.get('pair_probes') or ():
+            ROOM_PAIR_PROBES.setdefault(room, {})[(pc_client_id, app_client_id)] = result
+        if room_state.get('last_probe'):
+            ROOM_LAST_PROBE[room] = room_state['last_probe']
+        touch_room(room)
+
+    for context in state.get('transfers') or ():
+        if not isinstance(context, dict) or not context.get('transfer_id'):
+            continue
+        TRANSFER_CONTEXTS.setdefault(context['transfer_id'], {})[context.get('receiver_client_id')] = context
+        if context.get('status') in TRANSFER_UNDECIDED_STATUSES:
+            context['decision_deadline_ms'] = max(int(context.get('decision_deadline_ms') or 0), now_ms + grace_ms)
+            socketio.start_background_task(transfer_decision_timeout_worker, context['transfer_id'],
+                                           context.get('receiver_client_id'))
+
+    if lan_probe_cache:
+        lan_probe_cache.import_entries(state.get('probe_cache'))
+    if RESTORED_CLIENTS:
+        socketio.start_background_task(restore_grace_worker, grace_ms)
+    return len(RESTORED_CLIENTS)
+
+
+def expire_restored_clients():
+    """Drop the restored clients that did not join again; returns their ids."""
+    expired = sorted(client_id for client_id in RESTORED_CLIENTS if not CLIENT_SESSIONS.get(client_id))
+    RESTORED_CLIENTS.clear()
+    for room, client_ids in drop_clients(expired, 'restore_grace_expired', 'peer_not_reattached').items():
+        logger.info("Dropped %s restored client(s) that did not rejoin room %s: %s", len(client_ids), room, client_ids)
+    return expired
+
+
+def restore_grace_worker(grace_ms):
+    socketio.sleep(grace_ms / 1000.0)
+    try:
+        expire_restored_clients()
+    except Exception:
+        logger.exception("Expiring restored clients failed")
 
 
 
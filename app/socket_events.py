@@ -1,35 +1,45 @@
 ﻿from flask import request
+from flask_login import current_user
 from flask_socketio import emit, join_room, leave_room
 
+from .services.dashboard_feed import NAMESPACE as DASHBOARD_NAMESPACE, describe_subscription
+from .services.live_series import SNAPSHOT_POINTS as LIVE_SNAPSHOT_POINTS
+from .services.metrics import instrument_socket_handler
+
 
 def register_socket_events(
     socketio,
     *,
     logger,
     CLIENT_SESSIONS,
+    attach_sid,
     detach_sid_from_tracking,
-    get_serialized_sessions,
+    publish_client_list,
+    publish_server_stats,
     normalize_client_type,
-    get_all_room_states,
     CLIENT_TYPES,
     CLIENT_DEVICE_NAMES,
-    CLIENT_LAST_SEEN_MS,
+    mark_client_seen,
     current_time_ms,
     CLIENT_JOINED_AT_MS,
     update_client_network_meta,
     update_client_probe_meta,
     CLIENT_ROOMS,
     remove_client_from_room_order,
-    ROOM_LAST_PROBE,
+    forget_client_probes,
+    set_room_max_peers,
     broadcast_room_stats,
     emit_room_state_changed,
-    ROOM_CLIENT_ORDER,
+    add_client_to_room_order,
+    emit_relay,
+    set_binary_mode,
     enforce_room_capacity,
     trigger_lan_probe_if_ready,
     get_client_from_sid,
     CLIENT_NETWORK_META,
     emit_activity_log,
     PENDING_LAN_PROBES,
+    resolve_lan_probe,
     parse_signal_payload,
     resolve_signal_context,
     debug_signal_log,
@@ -40,20 +50,60 @@ def register_socket_events(
     instruct_upload_relay,
     update_transfer_state,
     transfer_decision_timeout_worker,
-    TRANSFER_CONTEXTS,
+    pick_receiver_client_ids,
+    find_transfer_context,
     instruct_finish,
     record_join=None,
     record_disconnect=None,
+    register_push_token=None,
+    unregister_push_room=None,
+    notify_offline_peers=None,
+    clipboard_backlog=None,
+    clipboard_dedup=None,
+    payload_spiller=None,
+    rate_limiter=None,
+    metrics=None,
+    should_skip_lan_attempt=None,
+    drain=None,
+    live_series=None,
 ):
-    @socketio.on('connect')
+    def on(event):
+        """``socketio.on`` that also records handler latency and errors when metrics are enabled."""
+        def decorator(handler):
+            if metrics:
+                handler = instrument_socket_handler(metrics, event, handler)
+            return socketio.on(event)(handler)
+        return decorator
+
+    def reject_if_rate_limited(event_class, event, *, client_id=None, room=None):
+        """Return an ack for the caller when the event is over its rate limit, else None."""
+        if not rate_limiter:
+            return None
+        rejection = rate_limiter.check(event_class, sid=request.sid, client_id=client_id, room=room)
+        if rejection is None:
+            return None
+        logger.warning("Rate limited %s from sid=%s client_id=%s room=%s (%s)",
+                       event, request.sid, client_id, room, rejection['limiter'])
+        emit('error', {
+            'code': 'E_RATE_LIMITED',
+            'msg': f'{event} rate limit exceeded',
+            'event': event,
+            'limiter': rejection['limiter'],
+            'retry_after_ms': rejection['retry_after_ms'],
+        }, room=request.sid)
+        return {'status': 'rate_limited', 'retry_after_ms': rejection['retry_after_ms']}
+
+    @on('connect')
     def on_connect():
-        logger.info(f"Client connected: {request.sid}")
+        logger.info("Client connected: %s", request.sid)
         emit_activity_log('connect', None, 'New connection', f'sid={request.sid}')
-        socketio.emit('server_stats', {'clients': len(CLIENT_SESSIONS), 'msg': 'New connection'}, room='dashboard_room')
+        publish_server_stats('New connection')
+        if live_series:
+            live_series.increment('connects')
 
-    @socketio.on('disconnect')
+    @on('disconnect')
     def on_disconnect():
-        logger.info(f"Client disconnected: {request.sid}")
+        logger.info("Client disconnected: %s", request.sid)
         # Capture info BEFORE purge — detach_sid_from_tracking clears all tracking data
         pre_client_id = get_client_from_sid(request.sid)
         pre_device_name = CLIENT_DEVICE_NAMES.get(pre_client_id, pre_client_id) if pre_client_id != 'Unknown' else request.sid
@@ -61,55 +111,68 @@ def register_socket_events(
 
         removed_client = detach_sid_from_tracking(request.sid, reason='peer_disconnected')
         if removed_client:
-            logger.info(f"Removed SID {request.sid} from client {removed_client}")
-            socketio.emit('client_list_update', get_serialized_sessions(), room='dashboard_room')
+            logger.info("Removed SID %s from client %s", request.sid, removed_client)
+            publish_client_list((pre_room,) if pre_room else None)
             emit_activity_log('disconnect', pre_room, pre_device_name,
                              f'reason=peer_disconnected',
                              client_id=removed_client)
         else:
             emit_activity_log('disconnect', pre_room, pre_device_name,
                              f'reason=peer_disconnected (unregistered)')
-        socketio.emit('server_stats', {'clients': len(CLIENT_SESSIONS), 'msg': 'Client disconnected'}, room='dashboard_room')
+        publish_server_stats('Client disconnected')
+        if live_series:
+            live_series.increment('disconnects')
         if record_disconnect:
             record_disconnect(sid=request.sid)
 
-    @socketio.on('client_ping')
+    @on('client_ping')
     def on_client_ping():
         sender = get_client_from_sid(request.sid)
+        if sender != 'Unknown':
+            # The heartbeat is what keeps a quiet device away from the idle reaper.
+            mark_client_seen(sender)
         device_name = CLIENT_DEVICE_NAMES.get(sender, sender) if sender != 'Unknown' else request.sid
         room = CLIENT_ROOMS.get(sender) if sender != 'Unknown' else None
         emit_activity_log('heartbeat', room, device_name, 'ping → pong', client_id=sender if sender != 'Unknown' else None)
         emit('server_pong')
 
-    @socketio.on('join')
+    @on('join')
     def on_join(data):
         payload = data if isinstance(data, dict) else {}
         room = payload.get('room')
         client_id = payload.get('client_id')
         client_type = normalize_client_type(payload.get('client_type'))
 
+        rejected = reject_if_rate_limited('join', 'join', client_id=client_id, room=room)
+        if rejected:
+            return rejected
+
+        if drain and not drain.accepting_joins:
+            error = drain.reject_join()
+            logger.info("Refused join from sid=%s client_id=%s while draining", request.sid, client_id)
+            emit('error', error, room=request.sid)
+            return {'status': 'draining', 'retry_after_ms': error['retry_after_ms']}
+
+        # Binary mode is negotiated per session; the ack confirms it to the client.
+        binary = payload.get('binary') is True
+        set_binary_mode(request.sid, binary)
+        joined = {'status': 'ok', 'binary': True} if binary else None
+
         if room:
             join_room(room)
             emit('status', {'msg': f'Joined room: {room}'}, room=room)
-            logger.info(f"Client {request.sid} joined room: {room}")
-
-            if room == 'dashboard_room':
-                serialized_sessions = get_serialized_sessions()
-                logger.info(f"Dashboard joined. Sending immediate update to {request.sid}: {serialized_sessions}")
-                emit('client_list_update', serialized_sessions, room=request.sid)
-                emit('room_states_snapshot', {'rooms': get_all_room_states()}, room=request.sid)
+            logger.info("Client %s joined room: %s", request.sid, room)
 
         if not client_id:
-            return
+            return joined
 
         if not client_type:
-            logger.warning(f"Client {request.sid} missing client_type for client_id {client_id}")
+            logger.warning("Client %s missing client_type for client_id %s", request.sid, client_id)
             emit('error', {'code': 'E_BAD_SCHEMA', 'msg': 'client_type is required when providing client_id'})
             return
 
-        if client_id not in CLIENT_SESSIONS:
-            CLIENT_SESSIONS[client_id] = set()
-        CLIENT_SESSIONS[client_id].add(request.sid)
+        attach_sid(client_id, request.sid)
+        previous_room = CLIENT_ROOMS.get(client_id)
 
         CLIENT_TYPES[client_id] = client_type
         raw_device_name = payload.get('device_name')
@@ -121,8 +184,8 @@ def register_socket_events(
 
         logger.info("Join metadata: sid=%s room=%s client_id=%s client_type=%s device_name=%s",
                     request.sid, room, client_id, client_type, CLIENT_DEVICE_NAMES.get(client_id, client_id))
-        CLIENT_LAST_SEEN_MS[client_id] = current_time_ms()
         CLIENT_JOINED_AT_MS.setdefault(client_id, current_time_ms())
+        mark_client_seen(client_id)
 
         network_data = payload.get('network')
         if isinstance(network_data, dict):
@@ -132,59 +195,85 @@ def register_socket_events(
         if isinstance(probe_data, dict):
             update_client_probe_meta(client_id, probe_data)
 
+        fcm_token = payload.get('fcm_token')
+        if register_push_token and isinstance(fcm_token, str) and fcm_token.strip():
+            register_push_token(client_id, fcm_token, room=room, client_type=client_type)
+
         if room:
             old_room = CLIENT_ROOMS.get(client_id)
             if old_room and old_room != room:
                 remove_client_from_room_order(client_id, old_room)
-                ROOM_LAST_PROBE.pop(old_room, None)
+                forget_client_probes(old_room, client_id)
                 broadcast_room_stats(old_room)
                 emit_room_state_changed(old_room, reason='peer_moved')
 
             CLIENT_ROOMS[client_id] = room
-            room_clients = ROOM_CLIENT_ORDER.setdefault(room, [])
-            if client_id not in room_clients:
-                room_clients.append(client_id)
+            add_client_to_room_order(client_id, room)
+            if payload.get('max_peers') is not None:
+                set_room_max_peers(room, payload.get('max_peers'))
+            # The joiner's network may have changed since its pairs were last probed.
+            forget_client_probes(room, client_id)
 
-            enforce_room_capacity(room)
+            enforce_room_capacity(room, keep_client_id=client_id)
             broadcast_room_stats(room)
             emit_room_state_changed(room, reason='peer_joined')
-            trigger_lan_probe_if_ready(room, reason='peer_joined')
+            trigger_lan_probe_if_ready(room, reason='peer_joined', client_id=client_id)
+
+            last_seq = payload.get('last_seq')
+            if clipboard_backlog and last_seq is not None and CLIENT_ROOMS.get(client_id) == room:
+                missed, truncated = clipboard_backlog.since(room, last_seq, exclude_sender=client_id)
+                for item in missed:
+                    emit_relay('clipboard_sync', dict(item['data'], seq=item['seq'], replayed=True), request.sid)
+                emit('clipboard_resume', {
+                    'room': room,
+                    'last_seq': clipboard_backlog.latest_seq(room),
+                    'replayed': len(missed),
+                    'truncated': truncated,
+                }, room=request.sid)
+                if missed:
+                    logger.info("Replayed %s clipboard items to %s in room %s (since seq %s)", len(missed), client_id, room, last_seq)
         else:
-            logger.warning(f"Client {client_id} joined without room info in payload")
+            logger.warning("Client %s joined without room info in payload", client_id)
 
-        logger.info(f"Registered client_id {client_id} with sid {request.sid}. Current Rooms: {CLIENT_ROOMS}")
-        socketio.emit('client_list_update', get_serialized_sessions(), room='dashboard_room')
+        logger.info("Registered client_id %s with sid %s in room %s", client_id, request.sid, room)
+        publish_client_list({previous_room, room} - {None} or None)
         device_name_display = CLIENT_DEVICE_NAMES.get(client_id, client_id)
         emit_activity_log('join', room, device_name_display, f'type={client_type}', client_id=client_id)
-        if record_join and room and room != 'dashboard_room' and client_id:
+        if live_series:
+            live_series.increment('joins')
+        if record_join and room and client_id:
             record_join(
                 client_id=client_id,
                 device_name=CLIENT_DEVICE_NAMES.get(client_id, client_id),
                 client_type=client_type,
                 room_id=room,
             )
+        return joined
 
-    @socketio.on('leave')
+    @on('leave')
     def on_leave(data):
         payload = data if isinstance(data, dict) else {}
         room = payload.get('room')
         if room:
             leave_room(room)
             emit('status', {'msg': f'Left room: {room}'}, room=room)
-            logger.info(f"Client left room: {room}")
+            logger.info("Client left room: %s", room)
             # Capture device_name before detach purges it
             pre_leave_client = get_client_from_sid(request.sid)
             pre_leave_name = CLIENT_DEVICE_NAMES.get(pre_leave_client, pre_leave_client) if pre_leave_client != 'Unknown' else request.sid
             removed_client = detach_sid_from_tracking(request.sid, reason='peer_left_room', room_hint=room)
+            if unregister_push_room and pre_leave_client != 'Unknown':
+                # An explicit leave means the device no longer wants wake-ups for this room.
+                unregister_push_room(pre_leave_client, room)
             if removed_client:
-                socketio.emit('client_list_update', get_serialized_sessions(), room='dashboard_room')
+                publish_client_list((room,))
                 emit_activity_log('leave', room, pre_leave_name, 'reason=peer_left_room', client_id=removed_client)
             else:
                 emit_activity_log('leave', room, pre_leave_name, 'reason=peer_left_room')
             broadcast_room_stats(room)
             emit_room_state_changed(room, reason='peer_left_room')
 
-    @socketio.on('peer_network_update')
+    @on('peer_network_update')
     def on_peer_network_update(data):
         payload = data if isinstance(data, dict) else {}
         room = payload.get('room')
@@ -198,18 +287,18 @@ def register_socket_events(
             return
 
         update_client_network_meta(client_id, payload.get('network'))
-        CLIENT_LAST_SEEN_MS[client_id] = current_time_ms()
+        mark_client_seen(client_id)
 
         target_room = room or CLIENT_ROOMS.get(client_id)
         if target_room:
-            ROOM_LAST_PROBE.pop(target_room, None)
+            forget_client_probes(target_room, client_id)
             emit_room_state_changed(target_room, reason='network_updated')
-            trigger_lan_probe_if_ready(target_room, reason='network_updated')
+            trigger_lan_probe_if_ready(target_room, reason='network_updated', client_id=client_id)
 
             epoch = CLIENT_NETWORK_META.get(client_id, {}).get('network_epoch', 0)
             emit_activity_log('peer_network_update', target_room, client_id, f"network_epoch={epoch}")
 
-    @socketio.on('lan_probe_result')
+    @on('lan_probe_result')
     def on_lan_probe_result(data):
         payload = data if isinstance(data, dict) else {}
         room = payload.get('room')
@@ -225,59 +314,77 @@ def register_socket_events(
             emit('error', {'code': 'E_PROBE_STALE', 'msg': 'probe_id is unknown or stale'})
             return
 
-        if pending.get('resolved'):
-            return
-
         normalized_result = result if result in {'ok', 'fail', 'timeout'} else 'fail'
-        pending['resolved'] = True
-
-        ROOM_LAST_PROBE[room] = {
-            'probe_id': probe_id,
-            'status': normalized_result,
-            'latency_ms': payload.get('latency_ms'),
-            'checked_at_ms': current_time_ms(),
-            'reason': payload.get('reason', '')
-        }
-
-        PENDING_LAN_PROBES.pop(probe_id, None)
+        if not resolve_lan_probe(probe_id, normalized_result, payload.get('latency_ms'), payload.get('reason', '')):
+            return
 
         sender = get_client_from_sid(request.sid)
         emit_activity_log('lan_probe_result', room, sender, f"{probe_id}: {normalized_result}")
         emit_room_state_changed(room, reason='probe_result')
 
-    @socketio.on('clipboard_push')
+    @on('clipboard_push')
     def handle_clipboard_push(data):
         room = data.get('room')
         if room:
-            emit('clipboard_sync', data, room=room, include_self=False)
-            logger.info(f"Relayed clipboard data to room: {room}")
-
             sender = get_client_from_sid(request.sid)
-            content_preview = data.get('content', '')[:30] + '...' if data.get('content') else 'Encrypted Data'
-            socketio.emit('activity_log', {
-                'type': 'clipboard',
-                'room': room,
-                'sender': sender,
-                'content': content_preview
-            }, room='dashboard_room')
-
-    @socketio.on('file_push')
+            rejected = reject_if_rate_limited('clipboard', 'clipboard_push', client_id=sender, room=room)
+            if rejected:
+                return rejected
+
+            if clipboard_dedup and clipboard_dedup.is_duplicate(room, data):
+                logger.debug("Suppressed duplicate clipboard push in room %s", room)
+                return {'status': 'duplicate'}
+
+            if payload_spiller:
+                data = payload_spiller.spill(data)
+
+            seq = None
+            if clipboard_backlog:
+                seq = clipboard_backlog.append(room, sender, data)
+                data = dict(data, seq=seq)
+
+            emit_relay('clipboard_sync', data, room, skip_sid=request.sid)
+            logger.info("Relayed clipboard data to room: %s", room)
+            if live_series:
+                live_series.increment('relays')
+
+            if notify_offline_peers:
+                notify_offline_peers(room, sender, 'clipboard_sync')
+
+            if data.get('content_ref'):
+                content_preview = f"Stored payload ({data['content_ref'].get('size', 0)} bytes)"
+            else:
+                content = data.get('content')
+                if isinstance(content, str) and content:
+                    content_preview = content[:30] + '...'
+                elif content:
+                    content_preview = f'Binary payload ({len(content)} bytes)'
+                else:
+                    content_preview = 'Encrypted Data'
+            emit_activity_log('clipboard', room, sender, content_preview,
+                              client_id=sender if sender != 'Unknown' else None)
+            if seq is not None:
+                return {'status': 'ok', 'seq': seq}
+
+    @on('file_push')
     def handle_file_push(data):
         room = data.get('room')
         if room:
-            emit('file_sync', data, room=room, include_self=False)
-            logger.info(f"Relayed file metadata to room: {room}")
+            emit_relay('file_sync', data, room, skip_sid=request.sid)
+            logger.info("Relayed file metadata to room: %s", room)
+            if live_series:
+                live_series.increment('relays')
 
             sender = get_client_from_sid(request.sid)
             filename = data.get('filename', 'Unknown File')
             emit_activity_log('file', room, sender, filename)
 
-    @socketio.on('file_announcement')
+    @on('file_announcement')
     def handle_file_announcement(data):
         room = data.get('room') if isinstance(data, dict) else None
         if room:
-            emit('file_announcement', data, room=room, include_self=False)
-            logger.info(f"Relayed file_announcement to room: {room}")
+            emit_relay('file_announcement', data, room, skip_sid=request.sid)
+            logger.info("Relayed file_announcement to room: %s", room)
 
             sender = get_client_from_sid(request.sid)
             payload = parse_signal_payload(data)
@@ -285,12 +392,12 @@ def register_socket_events(
             file_id = payload.get('file_id', 'Unknown ID')
             emit_activity_log('file_announcement', room, sender, f"{filename} ({file_id})")
 
-    @socketio.on('file_ack')
+    @on('file_ack')
     def handle_file_ack(data):
         room = data.get('room') if isinstance(data, dict) else None
         if room:
-            emit('file_ack', data, room=room, include_self=False)
-            logger.info(f"Relayed file_ack to room: {room}")
+            emit_relay('file_ack', data, room, skip_sid=request.sid)
+            logger.info("Relayed file_ack to room: %s", room)
 
             sender = get_client_from_sid(request.sid)
             payload = parse_signal_payload(data)
@@ -298,12 +405,12 @@ def register_socket_events(
             method = payload.get('method', 'unknown')
             emit_activity_log('file_ack', room, sender, f"{file_id} via {method}")
 
-    @socketio.on('file_request_relay')
+    @on('file_request_relay')
     def handle_file_request_relay(data):
         room = data.get('room') if isinstance(data, dict) else None
         if room:
-            emit('file_request_relay', data, room=room, include_self=False)
-            logger.info(f"Relayed file_request_relay to room: {room}")
+            emit_relay('file_request_relay', data, room, skip_sid=request.sid)
+            logger.info("Relayed file_request_relay to room: %s", room)
 
             sender = get_client_from_sid(request.sid)
             payload = parse_signal_payload(data)
@@ -311,45 +418,67 @@ def register_socket_events(
             reason = payload.get('reason', 'unspecified')
             emit_activity_log('file_request_relay', room, sender, f"{file_id}: {reason}")
 
-    @socketio.on('file_available')
+    @on('file_available')
     def handle_file_available(data):
         room, payload = resolve_signal_context(data)
         sender = get_client_from_sid(request.sid)
         debug_signal_log('rx', data, room=room, event='file_available', sender=sender)
 
         if not room:
-            logger.warning(f"Dropped file_available due to missing room. sid={request.sid}, data={data}")
+            logger.warning("Dropped file_available due to missing room. sid=%s, data=%s", request.sid, data)
             return
 
         if not ensure_protocol_version(payload, 'file_available'):
             return
 
         if not is_sender_authorized_for_room(sender, room):
-            logger.warning(f"Rejected file_available from unauthorized sender={sender} room={room} sid={request.sid}")
+            logger.warning("Rejected file_available from unauthorized sender=%s room=%s sid=%s", sender, room, request.sid)
             debug_signal_log('drop', payload, room=room, event='file_available', sender=sender)
             emit('error', {'code': 'E_ROLE_DENIED', 'msg': 'sender is not authorized for this room'}, room=request.sid)
             return
 
-        context = get_or_create_transfer_context(room, sender, payload)
-
-        room_state = get_room_lan_state(room)
-        if room_state == 'PAIR_DIFF_LAN':
-            instruct_upload_relay(context, 'room_diff_lan')
-            logger.info(f"Skipped file_available for room {room} due to PAIR_DIFF_LAN; instructed sender {sender} to relay")
+        # One context per receiver: each pair decides LAN vs relay on its own.
+        receivers = pick_receiver_client_ids(room, sender) or [None]
+        contexts = [get_or_create_transfer_context(room, sender, payload, receiver) for receiver in receivers]
+        if notify_offline_peers:
+            notify_offline_peers(room, sender, 'file_available', {
+                'transfer_id': contexts[0].get('transfer_id'),
+                'file_id': contexts[0].get('file_id'),
+            })
+
+        lan_contexts = []
+        for context in contexts:
+            receiver = context.get('receiver_client_id')
+            if get_room_lan_state(room, sender, receiver) == 'PAIR_DIFF_LAN':
+                instruct_upload_relay(context, 'room_diff_lan')
+                logger.info("Skipped file_available to %s in room %s due to PAIR_DIFF_LAN; instructed sender %s to relay", receiver, room, sender)
+            elif should_skip_lan_attempt and should_skip_lan_attempt(context):
+                instruct_upload_relay(context, 'lan_predicted_fail')
+                logger.info("Skipped file_available to %s in room %s: LAN predicted to fail; instructed sender %s to relay", receiver, room, sender)
+            else:
+                lan_contexts.append(context)
+        if not lan_contexts:
             return
 
-        emit('file_available', payload, room=room, include_self=False)
-        logger.info(f"Relayed file_available to room: {room}")
+        # A single emit, so the payload is encoded once however many receivers get it.
+        if len(lan_contexts) == len(contexts):
+            target = room
+        else:
+            target = [sid for context in lan_contexts for sid in CLIENT_SESSIONS.get(context.get('receiver_client_id'), ())]
+        emit_relay('file_available', payload, target, skip_sid=request.sid)
+        logger.info("Relayed file_available to room: %s (%s/%s receivers)", room, len(lan_contexts), len(contexts))
         debug_signal_log('tx', payload, room=room, event='file_available', sender=sender)
 
-        update_transfer_state(context, 'waiting_result', 'lan_offer_sent')
-        socketio.start_background_task(transfer_decision_timeout_worker, context.get('transfer_id'))
+        for context in lan_contexts:
+            update_transfer_state(context, 'waiting_result', 'lan_offer_sent')
+            socketio.start_background_task(transfer_decision_timeout_worker, context.get('transfer_id'),
+                                           context.get('receiver_client_id'))
 
         filename = payload.get('filename', 'Unknown File')
         file_id = payload.get('file_id', 'Unknown ID')
         emit_activity_log('file_available', room, sender, f"{filename} ({file_id})")
 
-    @socketio.on('file_sync_completed')
+    @on('file_sync_completed')
     def handle_file_sync_completed(data):
         room, payload = resolve_signal_context(data)
         sender = get_client_from_sid(request.sid)
@@ -359,27 +488,27 @@ def register_socket_events(
                 return
 
             if not is_sender_authorized_for_room(sender, room):
-                logger.warning(f"Rejected file_sync_completed from unauthorized sender={sender} room={room} sid={request.sid}")
+                logger.warning("Rejected file_sync_completed from unauthorized sender=%s room=%s sid=%s", sender, room, request.sid)
                 debug_signal_log('drop', payload, room=room, event='file_sync_completed', sender=sender)
                 emit('error', {'code': 'E_ROLE_DENIED', 'msg': 'sender is not authorized for this room'}, room=request.sid)
                 return
 
-            emit('file_sync_completed', payload, room=room, include_self=False)
-            logger.info(f"Relayed file_sync_completed to room: {room}")
+            emit_relay('file_sync_completed', payload, room, skip_sid=request.sid)
+            logger.info("Relayed file_sync_completed to room: %s", room)
             debug_signal_log('tx', payload, room=room, event='file_sync_completed', sender=sender)
 
             transfer_id = str(payload.get('transfer_id') or '').strip()
-            context = TRANSFER_CONTEXTS.get(transfer_id)
-            if context and context.get('room') == room:
+            context = find_transfer_context(room, transfer_id, sender)
+            if context:
                 instruct_finish(context, reason='lan_ack')
 
             file_id = payload.get('file_id', 'Unknown ID')
             method = payload.get('method', 'unknown')
             emit_activity_log('file_sync_completed', room, sender, f"{file_id} via {method}")
         else:
-            logger.warning(f"Dropped file_sync_completed due to missing room. sid={request.sid}, data={data}")
+            logger.warning("Dropped file_sync_completed due to missing room. sid=%s, data=%s", request.sid, data)
 
-    @socketio.on('file_need_relay')
+    @on('file_need_relay')
     def handle_file_need_relay(data):
         room, payload = resolve_signal_context(data)
         sender = get_client_from_sid(request.sid)
@@ -389,18 +518,18 @@ def register_socket_events(
                 return
 
             if not is_sender_authorized_for_room(sender, room):
-                logger.warning(f"Rejected file_need_relay from unauthorized sender={sender} room={room} sid={request.sid}")
+                logger.warning("Rejected file_need_relay from unauthorized sender=%s room=%s sid=%s", sender, room, request.sid)
                 debug_signal_log('drop', payload, room=room, event='file_need_relay', sender=sender)
                 emit('error', {'code': 'E_ROLE_DENIED', 'msg': 'sender is not authorized for this room'}, room=request.sid)
                 return
 
-            emit('file_need_relay', payload, room=room, include_self=False)
-            logger.info(f"Relayed file_need_relay to room: {room}")
+            emit_relay('file_need_relay', payload, room, skip_sid=request.sid)
+            logger.info("Relayed file_need_relay to room: %s", room)
             debug_signal_log('tx', payload, room=room, event='file_need_relay', sender=sender)
 
             transfer_id = str(payload.get('transfer_id') or '').strip()
-            context = TRANSFER_CONTEXTS.get(transfer_id)
-            if context and context.get('room') == room:
+            context = find_transfer_context(room, transfer_id, sender)
+            if context:
                 reason = payload.get('reason', 'receiver_requested_fallback')
                 instruct_upload_relay(context, reason)
 
@@ -408,6 +537,62 @@ def register_socket_events(
             reason = payload.get('reason', 'unspecified')
             emit_activity_log('file_need_relay', room, sender, f"{file_id}: {reason}")
         else:
-            logger.warning(f"Dropped file_need_relay due to missing room. sid={request.sid}, data={data}")
+            logger.warning("Dropped file_need_relay due to missing room. sid=%s, data=%s", request.sid, data)
 
 
+
+
+def register_dashboard_events(
+    socketio,
+    *,
+    logger,
+    dashboard_feed,
+    get_serialized_sessions,
+    get_all_room_states,
+    metrics=None,
+    live_series=None,
+):
+    """Handlers for the logged-in dashboards on ``/dashboard`` (see services.dashboard_feed)."""
+    def on(event):
+        def decorator(handler):
+            if metrics:
+                handler = instrument_socket_handler(metrics, f'dashboard:{event}', handler)
+            return socketio.on(event, namespace=DASHBOARD_NAMESPACE)(handler)
+        return decorator
+
+    def send_snapshot(subscription):
+        if 'client_list_update' in subscription['streams']:
+            emit('client_list_update', get_serialized_sessions(subscription['rooms'], subscription['client_types']))
+        if 'room_state_changed' in subscription['streams']:
+            emit('room_states_snapshot', {'rooms': get_all_room_states(subscription['rooms'])})
+        if live_series and 'live_series' in subscription['streams']:
+            emit('live_series_snapshot', {resolution: live_series.window(resolution, points)
+                                          for resolution, points in LIVE_SNAPSHOT_POINTS.items()})
+
+    @on('connect')
+    def on_dashboard_connect():
+        # The Socket.IO session starts from the HTTP session cookie of the handshake.
+        if not current_user.is_authenticated:
+            logger.warning("Refused dashboard connection from sid=%s: not logged in", request.sid)
+            return False
+        send_snapshot(dashboard_feed.subscribe(request.sid))
+        logger.info("Dashboard connected: %s", request.sid)
+
+    @on('disconnect')
+    def on_dashboard_disconnect():
+        dashboard_feed.unsubscribe(request.sid)
+        logger.info("Dashboard disconnected: %s", request.sid)
+
+    @on('subscribe')
+    def on_dashboard_subscribe(data=None):
+        previous = dashboard_feed.subscriptions.get(request.sid)
+        try:
+            subscription = dashboard_feed.subscribe(request.sid, data)
+        except ValueError as e:
+            emit('error', {'code': 'E_BAD_SCHEMA', 'msg': str(e)})
+            return {'status': 'error', 'msg': str(e)}
+        # A new activity filter alone needs no fresh snapshot.
+        view = ('streams', 'rooms', 'client_types')
+        if previous is None or any(previous[key] != subscription[key] for key in view):
+            send_snapshot(subscription)
+        return {'status': 'ok', 'subscription': describe_subscription(subscription)}
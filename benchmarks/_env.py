@@ -0,0 +1,37 @@
+"""Offline configuration shared by the benchmark scripts.
+
+Import this before ``app`` so the server boots without .env, R2 or Firebase.
+The process is monkey-patched like the gevent gunicorn worker, so background
+tasks that call ``time.sleep`` yield instead of blocking the loop.
+"""
+
+from gevent import monkey
+
+monkey.patch_all()
+
+import os  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+BENCH_DATA_DIR = tempfile.mkdtemp(prefix='clipboard-push-bench-')
+
+os.environ.setdefault('FLASK_DEBUG', '0')
+os.environ.setdefault('FLASK_SECRET_KEY', 'offline-secret')
+os.environ.setdefault('R2_ACCOUNT_ID', 'bench-account')
+os.environ.setdefault('STORAGE_BACKEND', 'local')
+os.environ.setdefault('LOCAL_STORAGE_PATH', os.path.join(BENCH_DATA_DIR, 'uploads'))
+os.environ.setdefault('FCM_TOKEN_STORE_PATH', os.path.join(BENCH_DATA_DIR, 'fcm_tokens.json'))
+os.environ.setdefault('SESSION_SNAPSHOT_PATH', os.path.join(BENCH_DATA_DIR, 'session_snapshot.json.gz'))
+os.environ.setdefault('FIREBASE_CREDENTIALS_PATH', '')
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
@@ -0,0 +1,93 @@
+"""Wire size and encode/decode time of typical events, JSON text vs binary mode.
+
+Each event is encoded as the server sends it: ``json`` carries ciphertext as
+base64 text (what sessions without binary mode get), ``binary`` carries the
+same bytes as a Socket.IO binary attachment (sessions that joined with
+``"binary": true``).  When the ``msgpack`` package is installed the msgpack
+serializer is measured too; it is server-wide in python-socketio, so it is
+shown for comparison only.
+
+    python benchmarks/bench_binary_payloads.py [--iterations 2000]
+"""
+
+import argparse
+import logging
+import os
+import time
+
+import _env  # noqa: F401  (must precede the app import)
+
+from socketio import packet
+
+from app.services.binary_payloads import to_text_payload
+
+try:
+    from socketio.msgpack_packet import MsgPackPacket
+except ImportError:  # msgpack is optional
+    MsgPackPacket = None
+
+
+def events():
+    meta = {'room': 'room-1', 'protocol_version': '4.0', 'sender_id': 'pc_001'}
+    yield 'clipboard_sync 200 B', 'clipboard_sync', dict(meta, seq=12, content=os.urandom(200))
+    yield 'clipboard_sync 16 KiB', 'clipboard_sync', dict(meta, seq=13, content=os.urandom(16 * 1024))
+    yield 'clipboard_sync 1 MiB', 'clipboard_sync', dict(meta, seq=14, content=os.urandom(1024 * 1024))
+    yield 'file_available', 'file_available', dict(
+        meta, transfer_id='tr_1770000000000_1a2b3c', file_id='f_01', filename='IMG_2048.jpg',
+        file_size=3481600, mime_type='image/jpeg', sender_url='http://192.168.1.10:8765/files/f_01')
+    yield 'transfer_command', 'transfer_command', dict(
+        meta, transfer_id='tr_1770000000000_1a2b3c', file_id='f_01', action='upload_relay',
+        reason='decision_timeout', issued_at_ms=1770000000000)
+
+
+def wire_size(encoded):
+    parts = encoded if isinstance(encoded, list) else [encoded]
+    return sum(len(part.encode('utf-8') if isinstance(part, str) else part) for part in parts)
+
+
+def decode(packet_class, encoded):
+    if not isinstance(encoded, list):
+        return packet_class(encoded_packet=encoded)
+    pkt = packet_class(encoded_packet=encoded[0])
+    for attachment in encoded[1:]:
+        pkt.add_attachment(attachment)
+    return pkt
+
+
+def measure(packet_class, event, payload, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        encoded = packet_class(packet.EVENT, data=[event, payload]).encode()
+    encode_us = (time.perf_counter() - started) / iterations * 1e6
+    started = time.perf_counter()
+    for _ in range(iterations):
+        decode(packet_class, encoded)
+    decode_us = (time.perf_counter() - started) / iterations * 1e6
+    return wire_size(encoded), encode_us, decode_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    modes = [('json', packet.Packet, to_text_payload), ('binary', packet.Packet, None)]
+    if MsgPackPacket is not None:
+        modes.append(('msgpack', MsgPackPacket, None))
+    else:
+        print('msgpack not installed; skipping the msgpack serializer')
+
+    print(f"{'event':<22} {'mode':>8} {'bytes':>9} {'vs json':>8} {'encode us':>10} {'decode us':>10}")
+    for label, event, payload in events():
+        iterations = max(1, args.iterations // 100) if len(str(payload)) > 100000 else args.iterations
+        json_size = None
+        for mode, packet_class, convert in modes:
+            size, encode_us, decode_us = measure(
+                packet_class, event, convert(payload) if convert else payload, iterations)
+            json_size = json_size or size
+            print(f'{label:<22} {mode:>8} {size:>9} {size / json_size:>7.0%} {encode_us:>10.1f} {decode_us:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
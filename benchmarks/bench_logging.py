@@ -0,0 +1,133 @@
+"""Clipboard relay handler latency with logging off, synchronous, and queued.
+
+Each room holds a PC and a phone; the PC pushes small clipboard items through
+the real handlers, which log every relay at INFO.  The log sink is a file
+whose writes block for ``--sink-delay-us`` (a slow terminal or log shipper).
+``sync`` writes from the handler like ``logging.basicConfig``; ``queue``
+hands records to the off-loop writer thread; ``queue+sample`` adds the
+per-template sampling the server runs with by default.
+
+    python benchmarks/bench_logging.py [--pushes 5000] [--rooms 20] [--sink-delay-us 50] [--modes off,sync]
+"""
+
+import argparse
+import logging
+import os
+import time
+
+import _env  # noqa: F401  (must precede the app import)
+
+import app as server
+from _env import percentile
+from app.services.log_pipeline import (
+    TEXT_FORMAT,
+    LazyQueueHandler,
+    NativeThreadListener,
+    SamplingFilter,
+    TextFormatter,
+    get_original,
+)
+
+MODES = ('off', 'sync', 'queue', 'queue+sample')
+_blocking_sleep = get_original('time', 'sleep')
+# Every handler stays referenced until exit: a writer thread must not finalize one, and
+# under gevent a handler detached from all loggers cannot be finalized at interpreter exit.
+_handlers = []
+
+
+class SlowSink:
+    def __init__(self, delay_s):
+        self.delay_s = delay_s
+        self.lines = 0
+        self._file = open(os.devnull, 'w')
+
+    def write(self, text):
+        if self.delay_s:
+            _blocking_sleep(self.delay_s)
+        self.lines += text.count('\n')
+        self._file.write(text)
+
+    def flush(self):
+        self._file.flush()
+
+
+def install(mode, sink):
+    """Replace the root handlers for ``mode``; returns a callable that waits for the writer."""
+    root = logging.getLogger()
+    root.handlers = []
+    logging.disable(logging.NOTSET)
+    if mode == 'off':
+        logging.disable(logging.WARNING)
+        return lambda: None
+    output = logging.StreamHandler(sink)
+    output.setFormatter(TextFormatter(TEXT_FORMAT))
+    if mode == 'sync':
+        _handlers.append(output)
+        root.addHandler(output)
+        return lambda: None
+    handler = LazyQueueHandler(get_original('queue', 'SimpleQueue')(), max_size=1000000)
+    if mode == 'queue+sample':
+        handler.addFilter(SamplingFilter())
+    listener = NativeThreadListener(handler.queue, output)
+    listener.start()
+    _handlers.append(output)
+    root.addHandler(handler)
+    return lambda: listener.stop(timeout=60)
+
+
+def run_case(mode, pushes, rooms, sink_delay_s):
+    server.clipboard_dedup.clear()
+    clients = []
+    senders = []
+    for r in range(rooms):
+        room = f'log-{mode}-{r}'
+        pc = server.socketio.test_client(server.app)
+        pc.emit('join', {'room': room, 'client_id': f'{room}-pc', 'client_type': 'pc'})
+        phone = server.socketio.test_client(server.app)
+        phone.emit('join', {'room': room, 'client_id': f'{room}-app', 'client_type': 'app'})
+        clients += [pc, phone]
+        senders.append((room, pc))
+
+    sink = SlowSink(sink_delay_s)
+    drain = install(mode, sink)
+    handler_us = []
+    started = time.perf_counter()
+    for i in range(pushes):
+        room, pc = senders[i % rooms]
+        t0 = time.perf_counter()
+        pc.emit('clipboard_push', {'room': room, 'content': f'item {i}'})
+        handler_us.append((time.perf_counter() - t0) * 1e6)
+        if i % 100 == 99:
+            for client in clients:
+                client.get_received()
+    elapsed = time.perf_counter() - started
+    drain()
+    install('off', None)
+    for client in clients:
+        client.disconnect()
+    return handler_us, elapsed, sink.lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pushes', type=int, default=5000)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--sink-delay-us', type=int, default=50, help='blocking time per written log line')
+    parser.add_argument('--modes', default=','.join(MODES), help='comma-separated subset of ' + ', '.join(MODES))
+    args = parser.parse_args()
+    app_handlers = logging.getLogger().handlers[:]
+    install('off', None)
+    # The pushes come from one process; keep the limiters out of the measurement.
+    server.rate_limiter.limiters.clear()
+
+    print(f'pushes: {args.pushes}, rooms: {args.rooms}, sink delay: {args.sink_delay_us} us/line')
+    print(f"{'mode':>13} {'mean us':>8} {'p50 us':>8} {'p99 us':>8} {'pushes/s':>9} {'lines':>7}")
+    for mode in args.modes.split(','):
+        samples, elapsed, lines = run_case(mode, args.pushes, args.rooms, args.sink_delay_us / 1e6)
+        print(f'{mode:>13} {sum(samples) / len(samples):>8.1f} {percentile(samples, 50):>8.1f} '
+              f'{percentile(samples, 99):>8.1f} {args.pushes / elapsed:>9.0f} {lines:>7}')
+    logging.getLogger().handlers = app_handlers + _handlers
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""LAN probes sent during reconnect churn, with and without the probe cache.
+
+Each room holds a PC and a phone.  Every cycle the phone reconnects on the
+same network, then flaps between two networks (Wi-Fi A and B) with a burst of
+``peer_network_update`` events, and answers every ``lan_probe_request`` it
+gets.  The same churn is replayed with the probe cache and debounce disabled
+(``before``) and enabled (``after``); the table shows the probes that reached
+phones, the cache hit ratio and the probes coalesced by debounce.
+
+    python benchmarks/bench_probe_cache.py [--rooms 20] [--cycles 10] [--debounce-ms 100]
+"""
+
+import argparse
+import logging
+import time
+
+import _env  # noqa: F401  (must precede the app import)
+
+import gevent
+
+import app as server
+
+PROBE_URL = 'http://192.168.1.10:8765/probe'
+
+
+def networks(room):
+    """The PC's network and the two networks its phone flaps between; unique per room."""
+    pc = {'network_id_hash': f'{room}-wifi-a', 'private_ip': '192.168.1.10', 'network_epoch': 1}
+    phone = (
+        {'network_id_hash': f'{room}-wifi-a', 'private_ip': '192.168.1.20', 'network_epoch': 1},
+        {'network_id_hash': f'{room}-wifi-b', 'private_ip': '10.0.0.20', 'network_epoch': 2},
+    )
+    return pc, phone
+
+
+def answer_probes(phone, room):
+    sent = 0
+    for message in phone.get_received():
+        if message['name'] == 'lan_probe_request':
+            sent += 1
+            phone.emit('lan_probe_result', {'room': room, 'probe_id': message['args'][0]['probe_id'],
+                                            'result': 'ok', 'latency_ms': 5})
+    return sent
+
+
+def join_phone(room):
+    phone = server.socketio.test_client(server.app)
+    phone.emit('join', {'room': room, 'client_id': f'{room}-app', 'client_type': 'app',
+                        'network': networks(room)[1][0]})
+    return phone
+
+
+def run_case(label, rooms, cycles, flaps, cache_enabled, debounce_ms):
+    cache = server.lan_probe_cache
+    saved = cache.max_ttl_ms, cache.debounce_ms
+    cache.max_ttl_ms = saved[0] if cache_enabled else 0
+    cache.debounce_ms = debounce_ms if cache_enabled else 0
+    cache.clear()
+    stats_before = dict(cache.stats)
+
+    names = [f'probe-{label}-{i}' for i in range(rooms)]
+    pcs = []
+    phones = {}
+    for room in names:
+        pc = server.socketio.test_client(server.app)
+        pc.emit('join', {'room': room, 'client_id': f'{room}-pc', 'client_type': 'pc',
+                         'network': networks(room)[0],
+                         'probe': {'probe_url': PROBE_URL, 'probe_ttl_ms': 300000}})
+        pcs.append(pc)
+        phones[room] = join_phone(room)
+
+    probes = 0
+    started = time.perf_counter()
+    for _ in range(cycles):
+        for room in names:
+            probes += answer_probes(phones[room], room)
+            phones[room].disconnect()
+            phones[room] = join_phone(room)
+            probes += answer_probes(phones[room], room)
+            phone_networks = networks(room)[1]
+            for flap in range(flaps):
+                network = phone_networks[(flap + 1) % len(phone_networks)]
+                phones[room].emit('peer_network_update', {'room': room, 'network': network})
+                probes += answer_probes(phones[room], room)
+        # Let debounced probes fire before the next round of churn.
+        gevent.sleep(debounce_ms / 1000.0 * 1.5 if cache_enabled else 0)
+        for room in names:
+            probes += answer_probes(phones[room], room)
+    elapsed = time.perf_counter() - started
+
+    hits = cache.stats['hits'] - stats_before['hits']
+    misses = cache.stats['misses'] - stats_before['misses']
+    for client in pcs + list(phones.values()):
+        client.disconnect()
+    cache.max_ttl_ms, cache.debounce_ms = saved
+    return {
+        'probes': probes,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+        'debounced': cache.stats['debounced'] - stats_before['debounced'],
+        'elapsed_s': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--cycles', type=int, default=10)
+    parser.add_argument('--flaps', type=int, default=4, help='network updates per room per cycle')
+    parser.add_argument('--debounce-ms', type=int, default=100)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    # Reconnect churn from one process would trip the join limits being measured around.
+    server.rate_limiter.limiters.clear()
+
+    print(f'rooms: {args.rooms}, cycles: {args.cycles}, flaps per cycle: {args.flaps}, '
+          f'debounce: {args.debounce_ms} ms')
+    print(f"{'mode':>7} {'probes':>7} {'per room/cycle':>15} {'hit ratio':>10} {'debounced':>10} {'elapsed':>9}")
+    for label, enabled in (('before', False), ('after', True)):
+        result = run_case(label, args.rooms, args.cycles, args.flaps, enabled, args.debounce_ms)
+        per_cycle = result['probes'] / float(args.rooms * args.cycles)
+        print(f"{label:>7} {result['probes']:>7} {per_cycle:>15.2f} {result['hit_ratio']:>10.2f} "
+              f"{result['debounced']:>10} {result['elapsed_s']:>8.2f}s")
+
+
+if __name__ == '__main__':
+    main()
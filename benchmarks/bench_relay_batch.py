@@ -0,0 +1,80 @@
+"""Events per second through /api/relay against /api/relay/batch.
+
+Small clipboard-sized events are spread over a few rooms with one listening
+device each and sent one POST per event, as JSON batches and as an NDJSON
+stream.  Requests go through the Flask test client, so the numbers are the
+server's cost per event without the network round trip a real client also
+saves by batching.  Relay rate limits are turned off for the run.
+
+    python benchmarks/bench_relay_batch.py [--events 2000] [--rooms 10] [--batch 100]
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import _env  # noqa: F401  (must precede the app import)
+
+for _scope in ('SID', 'CLIENT', 'ROOM'):
+    os.environ.setdefault(f'RATE_LIMIT_RELAY_{_scope}', '0')
+
+import app as server  # noqa: E402
+
+
+def make_events(count, rooms):
+    return [{'room': f'bench-relay-{i % rooms}', 'event': 'file_sync', 'data': {'filename': f'f{i}.txt', 'size': i}}
+            for i in range(count)]
+
+
+def run_single(http, events, batch):
+    for event in events:
+        http.post('/api/relay', json=event)
+
+
+def run_json_batch(http, events, batch):
+    for start in range(0, len(events), batch):
+        http.post('/api/relay/batch', json={'events': events[start:start + batch]})
+
+
+def run_ndjson(http, events, batch):
+    body = ''.join(json.dumps(event) + '\n' for event in events)
+    http.post('/api/relay/batch', data=body, content_type='application/x-ndjson').get_data()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--batch', type=int, default=100, help='events per JSON batch request')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('app').setLevel(logging.WARNING)
+
+    listeners = []
+    for room in range(args.rooms):
+        client = server.socketio.test_client(server.app)
+        client.emit('join', {'room': f'bench-relay-{room}', 'client_id': f'bench-app-{room}', 'client_type': 'app'})
+        listeners.append(client)
+
+    http = server.app.test_client()
+    events = make_events(args.events, args.rooms)
+    print(f'{args.events} events over {args.rooms} rooms, JSON batches of {args.batch}')
+    print(f"{'mode':>12} {'events/s':>10} {'speedup':>8}")
+    baseline = None
+    for name, run in (('single', run_single), ('json batch', run_json_batch), ('ndjson', run_ndjson)):
+        started = time.perf_counter()
+        run(http, events, args.batch)
+        rate = args.events / (time.perf_counter() - started)
+        baseline = baseline or rate
+        for client in listeners:
+            client.get_received()
+        print(f'{name:>12} {rate:>10.0f} {rate / baseline:>7.1f}x')
+
+    for client in listeners:
+        client.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Per-call cost of the signal_core lookups at fleet sizes from 10 to 100k clients.
+
+The fleet is written straight into signal_core's tables: rooms of one PC and
+one phone, each device with one sid.  Lookups target the most recently
+registered device, the worst case for anything that scans the fleet.  The
+table shows the best per-call time at every size and ``growth``, the ratio
+between the largest and smallest fleet; a per-event function should stay
+near 1x, while the dashboard snapshots (``get_serialized_sessions``,
+``get_all_room_states``) are expected to grow with the fleet.
+
+``--save PATH`` writes the results as a baseline.  ``--compare PATH`` exits
+with status 1 when any function at any size is more than ``--threshold``
+slower than the baseline in two passes, and ``--max-growth`` fails per-event functions
+whose growth exceeds it.  Baselines are machine-specific: save and compare
+on the same host.
+
+    python benchmarks/bench_signal_core.py [--sizes 10,100,1000,10000,100000]
+    python benchmarks/bench_signal_core.py --save baseline.json
+    python benchmarks/bench_signal_core.py --compare baseline.json [--threshold 0.25] [--max-growth 10]
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+import timeit
+
+import _env  # noqa: F401  (must precede the app import)
+
+import flask
+
+import app as server
+from app import signal_core
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+# Dashboard snapshots walk the whole fleet by design; growth is not gated for them.
+FLEET_WIDE = frozenset({'get_serialized_sessions', 'get_all_room_states'})
+
+
+def reset_signal_state():
+    for name in dir(signal_core):
+        value = getattr(signal_core, name)
+        if name.isupper() and isinstance(value, (dict, set, list)) and name != 'ALLOWED_ACTIVITY_TYPES':
+            value.clear()
+
+
+def build_fleet(clients):
+    reset_signal_state()
+    now_ms = signal_core.current_time_ms()
+    for i in range(max(2, clients)):
+        room = f'room-{i // 2}'
+        client_id = f'{room}-{"pc" if i % 2 == 0 else "app"}'
+        signal_core.attach_sid(client_id, f'sid-{i}')
+        signal_core.CLIENT_ROOMS[client_id] = room
+        signal_core.CLIENT_TYPES[client_id] = 'pc' if i % 2 == 0 else 'app'
+        signal_core.CLIENT_JOINED_AT_MS[client_id] = now_ms
+        signal_core.mark_client_seen(client_id)
+        signal_core.CLIENT_NETWORK_META[client_id] = {'network_id_hash': room, 'network_epoch': 1}
+        signal_core.add_client_to_room_order(client_id, room)
+    return client_id, f'sid-{max(2, clients) - 1}', room
+
+
+def snapshot(client_id, room):
+    tables = ('CLIENT_ROOMS', 'CLIENT_TYPES', 'CLIENT_JOINED_AT_MS', 'CLIENT_NETWORK_META')
+    saved = {name: getattr(signal_core, name).get(client_id) for name in tables}
+    sids = frozenset(signal_core.CLIENT_SESSIONS[client_id])
+    order = list(signal_core.ROOM_CLIENT_ORDER[room])
+
+    def restore():
+        for name, value in saved.items():
+            getattr(signal_core, name)[client_id] = value
+        for sid in sids:
+            signal_core.attach_sid(client_id, sid)
+        signal_core.mark_client_seen(client_id)
+        signal_core.ROOM_CLIENT_ORDER[room] = list(order)
+    return restore
+
+
+def best_per_call(func, repeat=7):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def best_with_restore(func, restore, calls=200):
+    """For calls that change state: time each call alone and undo it off the clock."""
+    best = float('inf')
+    for _ in range(calls):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+        restore()
+    return best
+
+
+def measure(clients):
+    signal_core.configure_idle_reaper(idle_timeout_ms=3600000, interval_ms=15000)
+    client_id, sid, room = build_fleet(clients)
+    restore = snapshot(client_id, room)
+    signal_payload = {'protocol_version': '4.0', 'transfer_id': 'tr_1', 'file_id': 'f_1'}
+    results = {}
+    with server.app.test_request_context():
+        flask.request.sid = sid
+        results['get_client_from_sid'] = best_per_call(lambda: signal_core.get_client_from_sid(sid))
+        results['get_room_client_ids'] = best_per_call(lambda: signal_core.get_room_client_ids(room))
+        results['build_room_state_payload'] = best_per_call(lambda: signal_core.build_room_state_payload(room))
+        results['resolve_signal_context'] = best_per_call(
+            lambda: signal_core.resolve_signal_context(dict(signal_payload)))
+        results['enforce_room_capacity'] = best_per_call(lambda: signal_core.enforce_room_capacity(room, client_id))
+        results['detach_sid_from_tracking'] = best_with_restore(
+            lambda: signal_core.detach_sid_from_tracking(sid), restore)
+        # Nobody is idle yet: the scan should stop at the first client whatever the fleet size.
+        results['reap_idle_clients'] = best_per_call(signal_core.reap_idle_clients)
+        repeat = 3 if clients >= 10000 else 5
+        results['get_serialized_sessions'] = best_per_call(signal_core.get_serialized_sessions, repeat)
+        results['get_all_room_states'] = best_per_call(signal_core.get_all_room_states, repeat)
+    reset_signal_state()
+    return results
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
+
+
+def compare(results, baseline, threshold, max_growth):
+    failures = []
+    for name, by_size in results.items():
+        for size, seconds in by_size.items():
+            before = baseline.get(name, {}).get(size)
+            if before and seconds > before * (1 + threshold):
+                failures.append(f'{name} at {size} clients: {format_time(seconds)} vs baseline '
+                                f'{format_time(before)} (+{seconds / before - 1:.0%})')
+        if max_growth and name not in FLEET_WIDE:
+            growth = by_size[max(by_size, key=int)] / by_size[min(by_size, key=int)]
+            if growth > max_growth:
+                failures.append(f'{name}: {growth:.1f}x slower at the largest fleet (limit {max_growth}x)')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument('--save', metavar='PATH', help='write the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='fail on regressions against this baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown vs the baseline (0.25 = 25%%)')
+    parser.add_argument('--max-growth', type=float, default=0,
+                        help='fail per-event functions this many times slower at the largest fleet than the smallest')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    results = {}
+    for size in sizes:
+        for name, seconds in measure(size).items():
+            results.setdefault(name, {})[str(size)] = seconds
+
+    print(f"{'function':<26}" + ''.join(f'{size:>11}' for size in sizes) + f"{'growth':>11}")
+    for name, by_size in results.items():
+        growth = by_size[str(sizes[-1])] / by_size[str(sizes[0])]
+        print(f'{name:<26}' + ''.join(f'{format_time(by_size[str(size)]):>11}' for size in sizes)
+              + f'{growth:>10.1f}x')
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'sizes': sizes, 'results': results}, f, indent=2)
+    if args.compare or args.max_growth:
+        baseline = {}
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                baseline = json.load(f)['results']
+        failures = compare(results, baseline, args.threshold, args.max_growth)
+        if failures:
+            # A busy host can slow one pass down; confirm with a second pass and keep the faster time.
+            for size in sizes:
+                for name, seconds in measure(size).items():
+                    results[name][str(size)] = min(results[name][str(size)], seconds)
+            failures = compare(results, baseline, args.threshold, args.max_growth)
+        for failure in failures:
+            print(f'REGRESSION {failure}')
+        if failures:
+            sys.exit(1)
+        print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
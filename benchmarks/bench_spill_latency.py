@@ -0,0 +1,99 @@
+"""Event-loop latency while large clipboard pushes are in flight.
+
+A ticker greenlet wakes every millisecond and records how late it was; a
+sender pushes large clipboard payloads to a room through the real handlers.
+Every millisecond the ticker is late is a millisecond every other socket on
+the worker was stalled.  Each size is run with payload spilling disabled
+(inline relay) and enabled.
+
+    python benchmarks/bench_spill_latency.py [--pushes 40] [--receivers 4]
+"""
+
+import argparse
+import logging
+import time
+
+import _env  # noqa: F401  (must precede the app import)
+
+import gevent
+
+import app as server
+from _env import percentile
+
+
+def run_case(size_bytes, pushes, receivers, spill_enabled):
+    spiller = server.payload_spiller
+    saved_threshold = spiller.threshold_bytes
+    spiller.threshold_bytes = server.CLIPBOARD_SPILL_THRESHOLD_BYTES if spill_enabled else 0
+    server.clipboard_dedup.clear()
+
+    room = f'bench-{size_bytes}-{int(spill_enabled)}'
+    clients = []
+    sender = server.socketio.test_client(server.app)
+    sender.emit('join', {'room': room, 'client_id': f'{room}-pc', 'client_type': 'pc'})
+    clients.append(sender)
+    for i in range(receivers):
+        peer = server.socketio.test_client(server.app)
+        peer.emit('join', {'room': room})
+        clients.append(peer)
+
+    lags_ms = []
+    running = True
+
+    def ticker():
+        while running:
+            expected = time.perf_counter() + 0.001
+            gevent.sleep(0.001)
+            lags_ms.append(max(0.0, (time.perf_counter() - expected) * 1000.0))
+
+    tick = gevent.spawn(ticker)
+    gevent.sleep(0.01)
+    push_ms = []
+    started = time.perf_counter()
+    for i in range(pushes):
+        content = f'{i:08d}' + 'x' * (size_bytes - 8)
+        t0 = time.perf_counter()
+        sender.emit('clipboard_push', {'room': room, 'content': content})
+        push_ms.append((time.perf_counter() - t0) * 1000.0)
+        for client in clients:
+            client.get_received()
+        gevent.sleep(0.002)
+    elapsed = time.perf_counter() - started
+    running = False
+    tick.join()
+
+    for client in clients:
+        client.disconnect()
+    spiller.threshold_bytes = saved_threshold
+    return {
+        'push_p50_ms': percentile(push_ms, 50),
+        'push_p99_ms': percentile(push_ms, 99),
+        'lag_p99_ms': percentile(lags_ms, 99),
+        'lag_max_ms': max(lags_ms) if lags_ms else 0.0,
+        'pushes_per_s': pushes / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pushes', type=int, default=40)
+    parser.add_argument('--receivers', type=int, default=4)
+    parser.add_argument('--sizes', default='16384,262144,1048576,4194304',
+                        help='comma-separated payload sizes in bytes')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('app').setLevel(logging.WARNING)
+
+    print(f'spill threshold: {server.CLIPBOARD_SPILL_THRESHOLD_BYTES} bytes, '
+          f'receivers: {args.receivers}, pushes per case: {args.pushes}')
+    print(f"{'size':>10} {'mode':>7} {'push p50':>9} {'push p99':>9} {'lag p99':>9} {'lag max':>9} {'push/s':>8}")
+    for size in [int(s) for s in args.sizes.split(',') if s]:
+        for spill_enabled in (False, True):
+            result = run_case(size, args.pushes, args.receivers, spill_enabled)
+            print(f"{size:>10} {'spill' if spill_enabled else 'inline':>7} "
+                  f"{result['push_p50_ms']:>8.2f}ms {result['push_p99_ms']:>8.2f}ms "
+                  f"{result['lag_p99_ms']:>8.2f}ms {result['lag_max_ms']:>8.2f}ms {result['pushes_per_s']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
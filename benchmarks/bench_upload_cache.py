@@ -0,0 +1,74 @@
+"""Local download latency for fresh uploads, read from disk against the upload cache.
+
+Each round PUTs a file of the given size through /api/file/upload and then
+GETs it back through /api/file/download, the way a receiver fetches a file
+seconds after the sender's upload.  The disk mode clears the cache before
+every download.  Files sit in a temp directory, so disk reads usually come
+from the OS page cache.  ``--disk-latency-ms`` adds a delay to each file the
+storage layer opens, which stands in for a NAS mount's round trips.
+
+    python benchmarks/bench_upload_cache.py [--rounds 200] [--sizes 64K,1M,8M] [--disk-latency-ms 0]
+"""
+
+import argparse
+import logging
+import time
+
+import _env  # noqa: F401  (must precede the app import)
+
+import app as server
+from _env import percentile
+from app.services import local_storage_service
+
+UNITS = {'K': 1024, 'M': 1024 * 1024}
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    return int(text[:-1]) * UNITS[text[-1]] if text[-1] in UNITS else int(text)
+
+
+def run(http, size, rounds, cached):
+    payload = bytes(size)
+    samples = []
+    for i in range(rounds):
+        file_key = f'bench_{size}_{int(cached)}_{i}.bin'
+        http.put(f'/api/file/upload/{file_key}', data=payload, content_type='application/octet-stream')
+        if not cached:
+            server.upload_cache.clear()
+        started = time.perf_counter()
+        body = http.get(f'/api/file/download/{file_key}').get_data()
+        samples.append((time.perf_counter() - started) * 1000)
+        assert len(body) == size
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--sizes', default='64K,1M,8M')
+    parser.add_argument('--disk-latency-ms', type=float, default=0.0, help='added to every storage file open')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('app').setLevel(logging.WARNING)
+
+    if args.disk_latency_ms:
+        def slow_open(*a, **kw):
+            time.sleep(args.disk_latency_ms / 1000.0)
+            return open(*a, **kw)
+        # Shadows the builtin for the storage module only.
+        local_storage_service.open = slow_open
+
+    http = server.app.test_client()
+    print(f"{'size':>8} {'mode':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for text in args.sizes.split(','):
+        size = parse_size(text)
+        for cached in (False, True):
+            samples = run(http, size, args.rounds, cached)
+            print(f"{text:>8} {'cache' if cached else 'disk':>6} "
+                  f"{percentile(samples, 50):>8.3f} {percentile(samples, 99):>8.3f}")
+    print(f'hit ratio over the run: {server.upload_cache.hit_ratio():.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""Capacity run: thousands of simulated PC/phone pairs against the real handlers.
+
+Every pair is a PC and a phone on Flask-SocketIO test clients, in-process and
+without network access.  The scenarios run in order on the same fleet:
+
+- ``join``: both devices connect and join their room; ``--lan-ratio`` of
+  the pairs share a network and the phone answers the LAN probe
+- ``heartbeat``: every device sends ``client_ping`` (``--pings`` rounds)
+- ``clipboard``: every PC pushes a clipboard item (``--pushes`` rounds)
+- ``transfer``: every PC offers a file with ``file_available``; the phone
+  answers ``file_sync_completed`` or, for ``--relay-ratio`` of them,
+  ``file_need_relay``
+- ``migrate``: the node drains and closes every session over
+  ``--migrate-window-ms``; the peak number of sessions closed (and so
+  reconnecting) per ``--bucket-ms`` is compared with closing them all at once.
+  It always runs last.
+
+Each scenario reports throughput, per-event handler latency percentiles, the
+share of events that reached the peer, CPU use and resident memory.
+``--json`` also writes the rows to a file for comparing releases.
+
+    python benchmarks/load_harness.py [--pairs 1000] [--scenarios join,heartbeat,clipboard,transfer,migrate]
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import time
+
+import _env  # noqa: F401  (must precede the app import)
+
+import gevent
+
+import app as server
+from _env import percentile
+
+SCENARIOS = ('join', 'heartbeat', 'clipboard', 'transfer', 'migrate')
+DRAIN_EVERY = 200  # events between draining client queues and yielding to background tasks
+PROBE_URL = 'http://192.168.1.10:8765/probe'
+
+
+def rss_mb():
+    """Current resident set size; falls back to the peak where /proc is missing."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def timed_emit(latencies_ms, client, event, payload=None):
+    started = time.perf_counter()
+    if payload is None:
+        client.emit(event)
+    else:
+        client.emit(event, payload)
+    latencies_ms.append((time.perf_counter() - started) * 1000.0)
+
+
+def picked(i, ratio):
+    """Spread a ``ratio`` share of indexes evenly: True for exactly that share of 0..n."""
+    return int((i + 1) * ratio) > int(i * ratio)
+
+
+def received(client, name):
+    return sum(1 for message in client.get_received() if message['name'] == name)
+
+
+class Fleet:
+    def __init__(self, pairs):
+        self.pairs = pairs
+        self.devices = []  # (room, pc, phone)
+
+    def clients(self):
+        for _, pc, phone in self.devices:
+            yield pc
+            yield phone
+
+    def drain(self):
+        for client in self.clients():
+            if client.is_connected():
+                client.get_received()
+        gevent.sleep(0)
+
+    def join(self, latencies_ms, lan_ratio):
+        delivered = 0
+        for i in range(self.pairs):
+            room = f'load-{i}'
+            same_lan = picked(i, lan_ratio)
+            pc_network = {'network_id_hash': f'{room}-home', 'private_ip': '192.168.1.10', 'network_epoch': 1}
+            phone_network = {'network_id_hash': f'{room}-home' if same_lan else f'{room}-cell',
+                             'private_ip': '192.168.1.20', 'network_epoch': 1}
+            pc = server.socketio.test_client(server.app)
+            timed_emit(latencies_ms, pc, 'join', {'room': room, 'client_id': f'{room}-pc', 'client_type': 'pc',
+                                                  'network': pc_network, 'probe': {'probe_url': PROBE_URL}})
+            pc.get_received()
+            phone = server.socketio.test_client(server.app)
+            timed_emit(latencies_ms, phone, 'join', {'room': room, 'client_id': f'{room}-app', 'client_type': 'app',
+                                                     'network': phone_network})
+            for message in phone.get_received():
+                if message['name'] == 'lan_probe_request':
+                    timed_emit(latencies_ms, phone, 'lan_probe_result', {
+                        'room': room, 'probe_id': message['args'][0]['probe_id'], 'result': 'ok', 'latency_ms': 4})
+            self.devices.append((room, pc, phone))
+            delivered += received(pc, 'room_state_changed') > 0
+        return delivered, self.pairs
+
+    def heartbeat(self, latencies_ms, rounds):
+        delivered = sent = 0
+        for _ in range(rounds):
+            for client in self.clients():
+                timed_emit(latencies_ms, client, 'client_ping')
+                delivered += received(client, 'server_pong')
+                sent += 1
+        return delivered, sent
+
+    def clipboard(self, latencies_ms, rounds):
+        delivered = sent = 0
+        for r in range(rounds):
+            for i, (room, pc, phone) in enumerate(self.devices):
+                timed_emit(latencies_ms, pc, 'clipboard_push', {'room': room, 'content': f'clip {r}-{i}'})
+                delivered += received(phone, 'clipboard_sync')
+                sent += 1
+                if sent % DRAIN_EVERY == 0:
+                    self.drain()
+        return delivered, sent
+
+    def transfer(self, latencies_ms, rounds, relay_ratio):
+        delivered = sent = 0
+        for r in range(rounds):
+            for i, (room, pc, phone) in enumerate(self.devices):
+                transfer_id = f'tr_load_{r}_{i}'
+                offer = {'room': room, 'protocol_version': '4.0', 'transfer_id': transfer_id,
+                         'file_id': f'f_{r}_{i}', 'filename': 'photo.jpg', 'file_size': 2 * 1024 * 1024}
+                timed_emit(latencies_ms, pc, 'file_available', offer)
+                sent += 1
+                if not received(phone, 'file_available'):
+                    # Relayed straight away (for example LAN predicted to fail): no answer to send.
+                    delivered += received(pc, 'transfer_command') > 0
+                    continue
+                answer = {'room': room, 'protocol_version': '4.0', 'transfer_id': transfer_id,
+                          'file_id': offer['file_id']}
+                if picked(sent, relay_ratio):
+                    timed_emit(latencies_ms, phone, 'file_need_relay', dict(answer, reason='lan_unreachable'))
+                else:
+                    timed_emit(latencies_ms, phone, 'file_sync_completed', dict(answer, method='lan'))
+                delivered += received(pc, 'transfer_command') > 0
+                if sent % DRAIN_EVERY == 0:
+                    self.drain()
+        return delivered, sent
+
+    def migrate(self, latencies_ms, window_ms):
+        """Drain the node; returns (migrated, sessions, close times in ms since the first server_migrating)."""
+        drain = server.drain
+        notified = []
+        closed_at = []
+        notify_session = drain.send_migrating
+        close_session = drain.disconnect_sid
+
+        def counted_notify(sid, payload):
+            notify_session(sid, payload)
+            notified.append(sid)
+
+        def timed_close(sid):
+            started = time.perf_counter()
+            close_session(sid)
+            latencies_ms.append((time.perf_counter() - started) * 1000.0)
+            closed_at.append(started)
+
+        drain.send_migrating = counted_notify
+        drain.disconnect_sid = timed_close
+        try:
+            drain.start(deadline_ms=0, window_ms=window_ms)
+            started = time.perf_counter()
+            drain.run(gevent.sleep)
+        finally:
+            drain.send_migrating = notify_session
+            drain.disconnect_sid = close_session
+        closed = sum(1 for client in self.clients() if not client.is_connected())
+        return min(len(notified), closed), 2 * len(self.devices), [(when - started) * 1000.0 for when in closed_at]
+
+    def close(self):
+        for client in self.clients():
+            if client.is_connected():
+                client.disconnect()
+
+
+def peak_per_bucket(times_ms, bucket_ms):
+    counts = {}
+    for when in times_ms:
+        bucket = int(when // bucket_ms)
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return max(counts.values(), default=0)
+
+
+def run_scenario(fleet, name, args):
+    latencies_ms = []
+    extra = {}
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    if name == 'join':
+        delivered, sent = fleet.join(latencies_ms, args.lan_ratio)
+    elif name == 'heartbeat':
+        delivered, sent = fleet.heartbeat(latencies_ms, args.pings)
+    elif name == 'clipboard':
+        delivered, sent = fleet.clipboard(latencies_ms, args.pushes)
+    elif name == 'transfer':
+        delivered, sent = fleet.transfer(latencies_ms, args.transfers, args.relay_ratio)
+    else:
+        delivered, sent, closed_ms = fleet.migrate(latencies_ms, args.migrate_window_ms)
+        extra = {'reconnect_peak': peak_per_bucket(closed_ms, args.bucket_ms), 'reconnect_peak_no_window': sent}
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    fleet.drain()
+    return {
+        'scenario': name,
+        'events': len(latencies_ms),
+        'events_per_s': len(latencies_ms) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies_ms, 50),
+        'p95_ms': percentile(latencies_ms, 95),
+        'p99_ms': percentile(latencies_ms, 99),
+        'max_ms': max(latencies_ms or [0.0]),
+        'delivered': delivered / float(sent) if sent else 0.0,
+        'cpu_pct': cpu / elapsed * 100.0 if elapsed else 0.0,
+        'rss_mb': rss_mb(),
+        'elapsed_s': elapsed,
+        **extra,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pairs', type=int, default=1000)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma-separated subset of ' + ', '.join(SCENARIOS) + ' (join always runs first)')
+    parser.add_argument('--lan-ratio', type=float, default=0.8, help='share of pairs on the same network')
+    parser.add_argument('--pings', type=int, default=3, help='client_ping rounds per device')
+    parser.add_argument('--pushes', type=int, default=3, help='clipboard pushes per PC')
+    parser.add_argument('--transfers', type=int, default=2, help='file transfers per PC')
+    parser.add_argument('--relay-ratio', type=float, default=0.2, help='share of transfers answered with file_need_relay')
+    parser.add_argument('--migrate-window-ms', type=int, default=2000, help='drain window for the migrate scenario')
+    parser.add_argument('--bucket-ms', type=int, default=100, help='bucket for the migrate reconnect peak')
+    parser.add_argument('--keep-rate-limits', action='store_true',
+                        help='leave the configured rate limits on (all clients share one process and IP)')
+    parser.add_argument('--json', metavar='PATH', help='also write the result rows as JSON')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    if not args.keep_rate_limits:
+        server.rate_limiter.limiters.clear()
+
+    requested = args.scenarios.split(',')
+    scenarios = ['join'] + [name for name in SCENARIOS if name in requested and name not in ('join', 'migrate')]
+    if 'migrate' in requested:
+        scenarios.append('migrate')
+    fleet = Fleet(args.pairs)
+    rows = []
+    print(f'pairs: {args.pairs}, baseline rss: {rss_mb():.1f} MB')
+    print(f"{'scenario':>10} {'events':>8} {'events/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'delivered':>10} {'cpu %':>6} {'rss MB':>8}")
+    try:
+        for name in scenarios:
+            row = run_scenario(fleet, name, args)
+            rows.append(row)
+            print(f"{name:>10} {row['events']:>8} {row['events_per_s']:>9.0f} {row['p50_ms']:>8.3f} "
+                  f"{row['p95_ms']:>8.3f} {row['p99_ms']:>8.3f} {row['max_ms']:>8.2f} "
+                  f"{row['delivered']:>9.1%} {row['cpu_pct']:>6.0f} {row['rss_mb']:>8.1f}")
+            if name == 'migrate':
+                print(f"   reconnect peak: {row['reconnect_peak']} sessions per {args.bucket_ms} ms over "
+                      f"{args.migrate_window_ms} ms, vs {row['reconnect_peak_no_window']} at once without a drain")
+    finally:
+        fleet.close()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'pairs': args.pairs, 'rows': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
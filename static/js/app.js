@@ -36,7 +36,7 @@
     let selectedRoom = "all";
     let uptimeSeconds = 0;
 
-    const socket = typeof io === "function" ? io() : null;
+    const socket = typeof io === "function" ? io("/dashboard") : null;
 
     const typeGlyphMap = {
         pc: "PC",
@@ -102,6 +102,10 @@
 
     const knownActivityTypes = new Set(activityTypeOrder);
     const enabledActivityTypes = new Set(activityTypeOrder);
+    // Logged by the dashboard itself; the server never sends these.
+    const localActivityTypes = new Set(["sys", "err", "sync"]);
+    // Every /dashboard stream except live_series, which this page does not chart.
+    const subscribedStreams = ["client_list_update", "room_state_changed", "activity_log", "server_stats"];
 
     elements.clearActivity?.addEventListener("click", () => {
         elements.activityLog.innerHTML = "";
@@ -112,12 +116,14 @@
         knownActivityTypes.forEach((type) => enabledActivityTypes.add(type));
         renderActivityFilters();
         applyActivityFilters();
+        syncSubscription();
     });
 
     elements.activityFilterNone?.addEventListener("click", () => {
         enabledActivityTypes.clear();
         renderActivityFilters();
         applyActivityFilters();
+        syncSubscription();
     });
 
     elements.activityFilter?.addEventListener("click", (event) => {
@@ -139,6 +145,7 @@
 
         renderActivityFilters();
         applyActivityFilters();
+        syncSubscription();
     });
 
     elements.r2RefreshBtn?.addEventListener("click", () => {
@@ -207,7 +214,13 @@
         socket.on("connect", () => {
             updateConnectionState(true);
             log("sys", "System", "Connected to relay server.", "dashboard_room");
-            socket.emit("join", { room: "dashboard_room" });
+            syncSubscription();
+        });
+
+        socket.on("connect_error", (error) => {
+            // The server refuses the feed when the login session has expired.
+            updateConnectionState(false);
+            log("err", "System", `Live feed unavailable: ${error?.message || "unknown error"}`, "dashboard_room");
         });
 
         socket.on("disconnect", () => {
@@ -587,6 +600,20 @@
             .join("");
     }
 
+    function syncSubscription() {
+        if (!socket || !socket.connected) {
+            return;
+        }
+
+        const serverTypes = Array.from(knownActivityTypes).filter((type) => !localActivityTypes.has(type));
+        const enabled = serverTypes.filter((type) => enabledActivityTypes.has(type));
+        // Filter server-side only when something is switched off, so new activity types still arrive.
+        socket.emit("subscribe", {
+            streams: subscribedStreams,
+            activity_types: enabled.length === serverTypes.length ? null : enabled
+        });
+    }
+
     function applyActivityFilters() {
         if (!elements.activityLog) {
             return;
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+# Importing the ``app`` package builds the whole server (settings, storage
+# client, history DB), so give it a safe offline configuration first.
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+_TEST_DATA_DIR = tempfile.mkdtemp(prefix='clipboard-push-tests-')
+
+os.environ.setdefault('FLASK_DEBUG', '0')
+os.environ.setdefault('FLASK_SECRET_KEY', 'offline-secret')
+os.environ.setdefault('R2_ACCOUNT_ID', 'test-account')
+os.environ.setdefault('STORAGE_BACKEND', 'local')
+os.environ.setdefault('LOCAL_STORAGE_PATH', os.path.join(_TEST_DATA_DIR, 'uploads'))
+os.environ.setdefault('FCM_TOKEN_STORE_PATH', os.path.join(_TEST_DATA_DIR, 'fcm_tokens.json'))
+os.environ.setdefault('SESSION_SNAPSHOT_PATH', os.path.join(_TEST_DATA_DIR, 'session_snapshot.json.gz'))
+os.environ.setdefault('FIREBASE_CREDENTIALS_PATH', '')
@@ -0,0 +1,100 @@
+import unittest
+
+from app.services.clipboard_backlog import ClipboardBacklog
+
+
+class FakeClock:
+    def __init__(self):
+        self.now_ms = 1_000_000
+
+    def __call__(self):
+        return self.now_ms
+
+
+class ClipboardBacklogTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def make(self, **kwargs):
+        return ClipboardBacklog(clock=self.clock, **kwargs)
+
+    def test_sequence_numbers_are_per_room_and_monotonic(self):
+        backlog = self.make()
+        self.assertEqual(backlog.append('a', 'pc', {'content': '1'}), 1)
+        self.assertEqual(backlog.append('a', 'pc', {'content': '2'}), 2)
+        self.assertEqual(backlog.append('b', 'pc', {'content': '1'}), 1)
+        self.assertEqual(backlog.latest_seq('a'), 2)
+
+    def test_since_returns_only_missed_items_from_other_senders(self):
+        backlog = self.make()
+        backlog.append('a', 'pc', {'content': '1'})
+        backlog.append('a', 'app', {'content': '2'})
+        backlog.append('a', 'pc', {'content': '3'})
+
+        items, truncated = backlog.since('a', 1, exclude_sender='app')
+        self.assertEqual([item['seq'] for item in items], [3])
+        self.assertFalse(truncated)
+
+    def test_room_item_cap_evicts_oldest_and_reports_truncation(self):
+        backlog = self.make(max_items_per_room=2)
+        for i in range(5):
+            backlog.append('a', 'pc', {'content': str(i)})
+
+        items, truncated = backlog.since('a', 0)
+        self.assertEqual([item['seq'] for item in items], [4, 5])
+        self.assertTrue(truncated)
+
+    def test_global_byte_cap_evicts_across_rooms(self):
+        backlog = self.make(max_bytes_total=250)
+        backlog.append('a', 'pc', {'content': 'x' * 100})
+        backlog.append('b', 'pc', {'content': 'y' * 100})
+        backlog.append('c', 'pc', {'content': 'z' * 100})
+
+        self.assertLessEqual(backlog.total_bytes, 250)
+        self.assertEqual(backlog.since('a', 0)[0], [])
+        self.assertEqual(len(backlog.since('c', 0)[0]), 1)
+        self.assertEqual(backlog.stats['evicted_global_cap'], 1)
+
+    def test_ttl_eviction(self):
+        backlog = self.make(ttl_ms=1000)
+        backlog.append('a', 'pc', {'content': 'old'})
+        self.clock.now_ms += 1500
+        backlog.append('a', 'pc', {'content': 'new'})
+
+        items, _ = backlog.since('a', 0)
+        self.assertEqual([item['data']['content'] for item in items], ['new'])
+        self.assertEqual(backlog.total_bytes, items[0]['size'])
+
+    def test_reset_counter_replays_everything(self):
+        backlog = self.make()
+        backlog.append('a', 'pc', {'content': '1'})
+        items, truncated = backlog.since('a', 99)
+        self.assertEqual(len(items), 1)
+        self.assertTrue(truncated)
+
+    def test_room_cap_evictions_do_not_grow_global_order(self):
+        backlog = self.make(max_items_per_room=2)
+        backlog.append('quiet', 'pc', {'content': 'keep'})
+        for i in range(50000):
+            backlog.append('busy', 'pc', {'content': str(i)})
+
+        self.assertLess(len(backlog._global_order), 3000)
+        self.assertGreater(backlog.stats['compactions'], 0)
+        self.assertEqual([item['data']['content'] for item in backlog.since('quiet', 0)[0]], ['keep'])
+        self.assertEqual([item['seq'] for item in backlog.since('busy', 0)[0]], [49999, 50000])
+
+    def test_least_recently_used_room_counters_are_dropped(self):
+        backlog = self.make(max_rooms=2)
+        backlog.append('a', 'pc', {'content': '1'})
+        backlog.append('b', 'pc', {'content': '1'})
+        backlog.append('c', 'pc', {'content': '1'})
+
+        self.assertEqual(backlog.tracked_room_count(), 2)
+        self.assertEqual(backlog.latest_seq('a'), 0)
+        self.assertEqual(backlog.since('a', 0), ([], False))
+        self.assertEqual(backlog.append('a', 'pc', {'content': '2'}), 1)
+        self.assertEqual(backlog.total_bytes, sum(e['size'] for r in ('a', 'c') for e in backlog.since(r, 0)[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
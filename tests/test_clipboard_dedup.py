@@ -0,0 +1,54 @@
+import unittest
+
+from app.services.clipboard_dedup import ClipboardDeduplicator, fingerprint_clipboard_payload
+
+
+class FakeClock:
+    def __init__(self):
+        self.now_ms = 1_000_000
+
+    def __call__(self):
+        return self.now_ms
+
+
+class ClipboardDedupTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.dedup = ClipboardDeduplicator(window_ms=1000, clock=self.clock)
+
+    def test_client_hash_takes_precedence_over_ciphertext(self):
+        first = {'content': 'cipher-a', 'content_hash': 'h1'}
+        second = {'content': 'cipher-b', 'content_hash': 'h1'}
+        self.assertEqual(fingerprint_clipboard_payload(first), fingerprint_clipboard_payload(second))
+
+    def test_volatile_fields_do_not_change_fingerprint(self):
+        first = {'room': 'a', 'seq': 1, 'encrypted': 'blob'}
+        second = {'room': 'a', 'seq': 2, 'encrypted': 'blob'}
+        self.assertEqual(fingerprint_clipboard_payload(first), fingerprint_clipboard_payload(second))
+
+    def test_repeat_within_window_is_suppressed_per_room(self):
+        self.assertFalse(self.dedup.is_duplicate('a', {'content': 'x'}))
+        self.assertTrue(self.dedup.is_duplicate('a', {'content': 'x'}))
+        self.assertFalse(self.dedup.is_duplicate('b', {'content': 'x'}))
+        self.assertEqual(self.dedup.stats['suppressed'], 1)
+        self.assertEqual(self.dedup.suppressed_by_room, {'a': 1})
+
+    def test_repeat_after_window_is_relayed(self):
+        self.dedup.is_duplicate('a', {'content': 'x'})
+        self.clock.now_ms += 1500
+        self.assertFalse(self.dedup.is_duplicate('a', {'content': 'x'}))
+
+    def test_ongoing_echo_loop_stays_suppressed(self):
+        self.dedup.is_duplicate('a', {'content': 'x'})
+        for _ in range(5):
+            self.clock.now_ms += 800
+            self.assertTrue(self.dedup.is_duplicate('a', {'content': 'x'}))
+
+    def test_zero_window_disables(self):
+        dedup = ClipboardDeduplicator(window_ms=0, clock=self.clock)
+        dedup.is_duplicate('a', {'content': 'x'})
+        self.assertFalse(dedup.is_duplicate('a', {'content': 'x'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+from unittest import mock
+
+import app as server
+from app import signal_core
+from app.services.dashboard_feed import DashboardFeed, normalize_subscription
+from tests.test_socket_events import reset_signal_state
+
+
+class DashboardFeedTest(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.feed = DashboardFeed(lambda event, payload, sids: self.sent.append((event, payload, sorted(sids))))
+
+    def test_payload_is_only_built_for_a_matching_subscription(self):
+        build = mock.Mock(return_value={'clients': 1})
+        self.assertEqual(self.feed.publish('server_stats', build), 0)
+        self.feed.subscribe('a', {'streams': ['activity_log']})
+        self.assertEqual(self.feed.publish('server_stats', build), 0)
+        build.assert_not_called()
+        self.assertEqual(self.feed.stats, {'sent': 0, 'skipped': 2})
+
+    def test_filters_pick_recipients_and_one_emit_serves_them_all(self):
+        self.feed.subscribe('all')
+        self.feed.subscribe('house', {'rooms': ['house']})
+        self.feed.subscribe('pc-files', {'client_types': ['PC'], 'activity_types': ['file']})
+
+        self.feed.publish('activity_log', {'type': 'file'}, rooms=('house',), client_type='pc', activity_type='file')
+        self.feed.publish('activity_log', {'type': 'clipboard'}, rooms=('garage',), client_type='app',
+                          activity_type='clipboard')
+        self.feed.publish('activity_log', {'type': 'connect'}, rooms=(), activity_type='api_relay')
+
+        self.assertEqual(self.sent, [
+            ('activity_log', {'type': 'file'}, ['all', 'house', 'pc-files']),
+            ('activity_log', {'type': 'clipboard'}, ['all']),
+            ('activity_log', {'type': 'connect'}, ['all']),
+        ])
+
+    def test_views_are_built_once_each(self):
+        self.feed.subscribe('a', {'rooms': ['house']})
+        self.feed.subscribe('b', {'rooms': ['house']})
+        self.feed.subscribe('c', {'rooms': ['garage']})
+        build = mock.Mock(side_effect=lambda rooms, types: sorted(rooms))
+
+        self.assertEqual(self.feed.publish_views('client_list_update', build, rooms=('house',)), 2)
+        self.assertEqual(self.sent, [('client_list_update', ['house'], ['a', 'b'])])
+        build.assert_called_once_with(frozenset({'house'}), None)
+
+    def test_bad_subscriptions_are_rejected(self):
+        for data in ({'rooms': 'house'}, {'streams': ['everything']}, {'client_types': [1]}):
+            with self.assertRaises(ValueError):
+                normalize_subscription(data)
+
+
+class DashboardNamespaceTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.rate_limiter.clear()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected():
+                client.disconnect()
+        reset_signal_state()
+
+    def dashboard(self, logged_in=True):
+        http = server.app.test_client()
+        if logged_in:
+            with http.session_transaction() as session:
+                session['_user_id'] = 'admin'
+        dashboard = server.socketio.test_client(server.app, namespace='/dashboard', flask_test_client=http)
+        if dashboard.is_connected('/dashboard'):
+            self.addCleanup(dashboard.disconnect, '/dashboard')
+        return dashboard
+
+    def join(self, room, client_id, client_type):
+        client = server.socketio.test_client(server.app)
+        self.clients.append(client)
+        client.emit('join', {'room': room, 'client_id': client_id, 'client_type': client_type})
+        return client
+
+    def received(self, dashboard):
+        return [(m['name'], m['args'][0]) for m in dashboard.get_received('/dashboard')]
+
+    def test_dashboard_must_be_logged_in(self):
+        self.assertFalse(self.dashboard(logged_in=False).is_connected('/dashboard'))
+        self.assertEqual(server.dashboard_feed.subscriptions, {})
+
+    def test_room_filter_narrows_the_feed(self):
+        self.join('garage', 'pc-g', 'pc')
+        watcher = self.dashboard()
+        everything = self.dashboard()
+        self.received(watcher)
+        self.received(everything)
+
+        ack = watcher.emit('subscribe', {'streams': ['client_list_update', 'room_state_changed', 'activity_log'],
+                                         'rooms': ['house'], 'activity_types': ['room_state_changed']},
+                           callback=True, namespace='/dashboard')
+        self.assertEqual(ack['subscription']['rooms'], ['house'])
+        self.assertEqual(self.received(watcher), [('client_list_update', {}), ('room_states_snapshot', {'rooms': {}})])
+
+        self.join('garage', 'app-g', 'app')
+        self.assertEqual(self.received(watcher), [])
+        self.assertIn('app-g', dict(self.received(everything))['client_list_update'])
+
+        self.join('house', 'pc-h', 'pc')
+        seen = self.received(watcher)
+        self.assertEqual(sorted({name for name, _ in seen}), ['activity_log', 'client_list_update', 'room_state_changed'])
+        self.assertEqual(list(dict(seen)['client_list_update']), ['pc-h'])
+        self.assertEqual({entry['type'] for name, entry in seen if name == 'activity_log'}, {'room_state_changed'})
+        self.assertEqual(sorted(dict(self.received(everything))['client_list_update']), ['app-g', 'pc-g', 'pc-h'])
+
+    def test_nothing_is_built_without_a_dashboard(self):
+        with mock.patch.object(signal_core, 'get_serialized_sessions') as serialize:
+            self.join('house', 'pc-h', 'pc').disconnect()
+        serialize.assert_not_called()
+        self.assertGreater(server.dashboard_feed.stats['skipped'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import random
+import unittest
+from unittest import mock
+
+import app as server
+from app.services.drain import DRAINED, DRAINING, SERVING, DrainController, migration_plan
+from tests.test_socket_events import reset_signal_state
+
+
+class FakeClock:
+    def __init__(self):
+        self.now_ms = 1_000_000
+
+    def __call__(self):
+        return self.now_ms
+
+    def sleep(self, seconds):
+        self.now_ms += int(round(seconds * 1000))
+
+
+class MigrationPlanTest(unittest.TestCase):
+    def test_one_delay_per_slot_of_the_window(self):
+        plan = migration_plan([f'sid-{i}' for i in range(100)], 10000, random.Random(7))
+        delays = [delay for delay, _ in plan]
+        self.assertEqual(sorted({sid for _, sid in plan}), sorted(f'sid-{i}' for i in range(100)))
+        for slot, delay in enumerate(delays):
+            self.assertTrue(slot * 100 <= delay < (slot + 1) * 100, (slot, delay))
+
+
+class DrainControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pending = 2
+        self.events = []
+        self.drain = DrainController(
+            list_sids=lambda: ['a', 'b', 'c', 'd'],
+            count_pending_transfers=lambda: self.pending,
+            send_migrating=lambda sid, payload: self.events.append(('migrating', sid, payload['reconnect_delay_ms'])),
+            disconnect_sid=lambda sid: self.events.append(('disconnect', sid, self.clock.now_ms)),
+            deadline_ms=5000, window_ms=4000, poll_ms=500, clock=self.clock, rng=random.Random(1))
+
+    def run_drain(self):
+        self.assertTrue(self.drain.start())
+        self.assertFalse(self.drain.start())
+        self.assertFalse(self.drain.accepting_joins)
+        self.drain.run(self.clock.sleep)
+
+    def test_waits_for_transfers_then_spreads_disconnects(self):
+        def sleep(seconds):
+            self.clock.sleep(seconds)
+            self.pending = 0
+        self.assertTrue(self.drain.start())
+        self.assertEqual(self.drain.status()['pending_transfers'], 2)
+        self.drain.run(sleep)
+
+        sent = [event for event in self.events if event[0] == 'migrating']
+        closed = [event for event in self.events if event[0] == 'disconnect']
+        self.assertEqual(len(sent), 4)
+        self.assertEqual(self.events[:4], sent)
+        migration_started_ms = 1_000_500
+        self.assertEqual([when - migration_started_ms for _, _, when in closed], [delay for _, _, delay in sent])
+        self.assertEqual(self.drain.state, DRAINED)
+        self.assertEqual(self.drain.status()['remaining_sessions'], 0)
+
+    def test_deadline_bounds_the_wait_for_transfers(self):
+        self.run_drain()
+        first_close_ms = min(when for kind, _, when in self.events if kind == 'disconnect')
+        self.assertGreaterEqual(first_close_ms, 1_005_000)
+        self.assertEqual(self.drain.stats['migrated'], 4)
+
+
+class DrainSocketTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.rate_limiter.clear()
+        self.clients = []
+        patcher = mock.patch.object(server.socketio, 'start_background_task')
+        self.background = patcher.start()
+        self.addCleanup(patcher.stop)
+        saved = dict(vars(server.drain), stats=dict(server.drain.stats))
+        self.addCleanup(vars(server.drain).update, saved)
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected():
+                client.disconnect()
+        reset_signal_state()
+
+    def connect(self):
+        client = server.socketio.test_client(server.app)
+        self.clients.append(client)
+        return client
+
+    def test_joins_are_refused_while_draining_but_the_dashboard_can_watch(self):
+        http = server.app.test_client()
+        with http.session_transaction() as session:
+            session['_user_id'] = 'admin'
+        response = http.post('/api/drain', json={'deadline_ms': 0, 'window_ms': 1000})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()['state'], DRAINING)
+        self.background.assert_called_once_with(server.drain.run, server.socketio.sleep)
+        self.assertEqual(http.post('/api/drain').status_code, 409)
+
+        phone = self.connect()
+        ack = phone.emit('join', {'room': 'house', 'client_id': 'app', 'client_type': 'app'}, callback=True)
+        self.assertEqual(ack, {'status': 'draining', 'retry_after_ms': 1000})
+        [error] = [m['args'][0] for m in phone.get_received() if m['name'] == 'error']
+        self.assertEqual(error['code'], 'E_SERVER_DRAINING')
+        self.assertNotIn('app', server.CLIENT_SESSIONS)
+
+        dashboard = server.socketio.test_client(server.app, namespace='/dashboard', flask_test_client=http)
+        self.addCleanup(dashboard.disconnect, '/dashboard')
+        self.assertIn('client_list_update', [m['name'] for m in dashboard.get_received('/dashboard')])
+
+    def test_drain_endpoint_requires_login(self):
+        self.assertEqual(server.app.test_client().post('/api/drain').status_code, 302)
+        self.assertEqual(server.drain.state, SERVING)
+
+
+if __name__ == '__main__':
+    unittest.main()
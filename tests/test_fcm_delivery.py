@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+
+from app.services.fcm_service import (
+    DeviceTokenRegistry,
+    FakeTransport,
+    FcmDeliveryService,
+)
+
+
+class FcmDeliveryServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store_path = os.path.join(self.tmpdir.name, 'fcm_tokens.json')
+        self.registry = DeviceTokenRegistry(self.store_path)
+        self.transport = FakeTransport()
+        self.live_clients = set()
+        self.service = FcmDeliveryService(
+            self.registry,
+            self.transport,
+            has_live_sid=lambda client_id: client_id in self.live_clients,
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_registry_persists_tokens(self):
+        self.registry.register('app_1', 'tok-1', room='room-1', client_type='app')
+        self.assertTrue(self.registry.persist())
+
+        reloaded = DeviceTokenRegistry(self.store_path)
+        self.assertEqual(reloaded.get_token('app_1'), 'tok-1')
+        self.assertEqual(reloaded.get_room_client_ids('room-1'), ['app_1'])
+
+    def test_only_offline_peers_are_notified(self):
+        self.registry.register('pc_1', 'tok-pc', room='room-1')
+        self.registry.register('app_1', 'tok-app', room='room-1')
+        self.registry.register('app_2', 'tok-other', room='room-2')
+        self.live_clients.add('pc_1')
+
+        queued = self.service.notify_offline_peers('room-1', 'pc_1', 'clipboard_sync')
+        self.assertEqual(queued, 1)
+
+        self.live_clients.add('app_1')
+        self.assertEqual(self.service.notify_offline_peers('room-1', 'pc_1', 'clipboard_sync'), 0)
+
+        self.assertEqual(self.service.flush(), 1)
+        tokens, data = self.transport.sent[0]
+        self.assertEqual(tokens, ['tok-app'])
+        self.assertEqual(data, {'event': 'clipboard_sync', 'room': 'room-1'})
+
+    def test_repeated_pushes_are_coalesced_and_batched(self):
+        for i in range(1200):
+            self.registry.register(f'app_{i}', f'tok-{i}', room='big-room')
+
+        self.service.notify_offline_peers('big-room', 'pc_1', 'clipboard_sync')
+        self.service.notify_offline_peers('big-room', 'pc_1', 'clipboard_sync')
+        self.assertEqual(self.service.pending_count(), 1200)
+
+        self.assertEqual(self.service.flush(), 1200)
+        self.assertEqual([len(tokens) for tokens, _ in self.transport.sent], [500, 500, 200])
+        self.assertEqual(self.service.pending_count(), 0)
+
+    def test_invalid_tokens_are_pruned(self):
+        self.transport.invalid_tokens.add('tok-dead')
+        self.registry.register('app_dead', 'tok-dead', room='room-1')
+        self.registry.register('app_ok', 'tok-ok', room='room-1')
+
+        self.service.notify_offline_peers('room-1', 'pc_1', 'file_available', {'file_id': 'f1'})
+        self.assertEqual(self.service.flush(), 1)
+
+        self.assertIsNone(self.registry.get_token('app_dead'))
+        self.assertEqual(self.registry.get_token('app_ok'), 'tok-ok')
+        self.assertEqual(self.service.stats['pruned'], 1)
+        self.assertIsNone(DeviceTokenRegistry(self.store_path).get_token('app_dead'))
+
+    def test_disabled_service_queues_nothing(self):
+        self.service.enabled = False
+        self.registry.register('app_1', 'tok-1', room='room-1')
+        self.assertEqual(self.service.notify_offline_peers('room-1', 'pc_1', 'clipboard_sync'), 0)
+        self.assertEqual(self.service.pending_count(), 0)
+
+    def test_left_room_is_not_woken(self):
+        self.registry.register('app_1', 'tok-1', room='room-1')
+        self.assertFalse(self.service.unregister_room('app_1', 'room-2'))
+        self.assertTrue(self.service.unregister_room('app_1', 'room-1'))
+
+        self.assertEqual(self.service.notify_offline_peers('room-1', 'pc_1', 'clipboard_sync'), 0)
+        self.assertEqual(self.registry.get_token('app_1'), 'tok-1')
+        self.assertTrue(self.registry.persist())
+        self.assertEqual(DeviceTokenRegistry(self.store_path).get_room_client_ids('room-1'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import uuid
+from unittest import mock
+
+import app as server
+from app.services import history_db
+from app.services.history_cache import HistoryQueryCache
+
+
+class HistoryQueryCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.version = 0
+        self.now_ms = 1000
+        self.cache = HistoryQueryCache(lambda: self.version, ttl_ms=5000, max_entries=2, clock=lambda: self.now_ms)
+
+    def test_results_are_reused_until_a_write(self):
+        compute = mock.Mock(side_effect=[{'total': 1}, {'total': 2}])
+
+        first = self.cache.lookup('summary', {}, compute)
+        self.assertEqual(self.cache.lookup('summary', {}, compute), first)
+        self.version += 1
+        body, etag = self.cache.lookup('summary', {}, compute)
+
+        self.assertEqual(compute.call_count, 2)
+        self.assertEqual(body, b'{"total":2}')
+        self.assertNotEqual(etag, first[1])
+        self.assertEqual(self.cache.stats, {'hits': 1, 'misses': 1, 'stale': 1, 'not_modified': 0})
+
+    def test_entries_expire_and_are_keyed_by_params(self):
+        compute = mock.Mock(return_value=[])
+        self.cache.lookup('daily', {'days': 30}, compute)
+        self.cache.lookup('daily', {'days': 7}, compute)
+        self.now_ms += 5000
+        self.cache.lookup('daily', {'days': 30}, compute)
+        self.assertEqual(compute.call_count, 3)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        compute = mock.Mock(return_value=[])
+        for name in ('a', 'b', 'a', 'c', 'a'):
+            self.cache.lookup(name, {}, compute)
+        self.assertEqual(compute.call_count, 3)
+
+    def test_zero_ttl_disables_caching(self):
+        cache = HistoryQueryCache(lambda: 0, ttl_ms=0)
+        compute = mock.Mock(return_value={})
+        cache.lookup('summary', {}, compute)
+        cache.lookup('summary', {}, compute)
+        self.assertEqual(compute.call_count, 2)
+
+
+class HistoryEndpointCacheTest(unittest.TestCase):
+    def setUp(self):
+        server.history_cache.clear()
+        self.http = server.app.test_client()
+        with self.http.session_transaction() as session:
+            session['_user_id'] = 'admin'
+
+    def test_unchanged_results_revalidate_with_304(self):
+        first = self.http.get('/api/history/summary')
+        etag = first.headers['ETag']
+        self.assertEqual(first.headers['Cache-Control'], 'private, no-cache')
+
+        again = self.http.get('/api/history/summary', headers={'If-None-Match': etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.get_data(), b'')
+
+        client_id = f'cache-{uuid.uuid4().hex[:8]}'
+        history_db.upsert_client(server.HISTORY_DB_PATH, client_id, 'Device', 'pc', 'cache-room', '10.0.0.3')
+        changed = self.http.get('/api/history/summary', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+        self.assertEqual(changed.get_json()['unique_clients'], first.get_json()['unique_clients'] + 1)
+
+    def test_query_params_are_part_of_the_key(self):
+        with mock.patch.object(history_db, '_conn', wraps=history_db._conn) as conn:
+            self.http.get('/api/history/clients?search=a')
+            self.http.get('/api/history/clients?search=a')
+            self.http.get('/api/history/clients?search=b')
+        self.assertEqual(conn.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
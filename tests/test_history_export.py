@@ -0,0 +1,80 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+import uuid
+
+import app as server
+from app.services import history_db
+from app.services.history_export import parse_export_time
+
+
+class ExportRowsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'history.db')
+        history_db.init_db(self.db_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pages_cover_every_matching_row_once(self):
+        for i in range(7):
+            event_id = history_db.insert_event(self.db_path, f'c{i}', f'Device {i}', 'house' if i % 2 else 'garage',
+                                               'pc', '10.0.0.1')
+            with history_db._conn(self.db_path) as con:
+                con.execute('UPDATE connection_events SET connected_at = ? WHERE id = ?',
+                            (f'2026-01-0{i + 1} 12:00:00', event_id))
+
+        rows = list(history_db.iter_export_rows(self.db_path, 'connection_events', page_size=2))
+        self.assertEqual([row[1] for row in rows], [f'c{i}' for i in range(7)])
+
+        filtered = history_db.iter_export_rows(self.db_path, 'connection_events', room='house', page_size=2,
+                                               since='2026-01-02 00:00:00', until='2026-01-06 00:00:00')
+        self.assertEqual([row[1] for row in filtered], ['c1', 'c3'])
+
+    def test_export_times_are_stored_as_utc(self):
+        self.assertEqual(parse_export_time('2026-03-01'), '2026-03-01 00:00:00')
+        self.assertEqual(parse_export_time('2026-03-01T10:00:00+02:00'), '2026-03-01 08:00:00')
+        with self.assertRaises(ValueError):
+            parse_export_time('yesterday')
+
+
+class ExportEndpointTest(unittest.TestCase):
+    def setUp(self):
+        self.room = f'export-{uuid.uuid4().hex[:8]}'
+        for i in range(3):
+            history_db.insert_event(server.HISTORY_DB_PATH, f'{self.room}-c{i}', f'Device {i}', self.room, 'app',
+                                    '10.0.0.2')
+        self.http = server.app.test_client()
+        with self.http.session_transaction() as session:
+            session['_user_id'] = 'admin'
+
+    def test_csv_export_filtered_by_room(self):
+        response = self.http.get(f'/api/history/export/connection_events?format=csv&room={self.room}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertIn('connection_events.csv', response.headers['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual([row['client_id'] for row in rows], [f'{self.room}-c{i}' for i in range(3)])
+
+    def test_gzip_ndjson_export(self):
+        response = self.http.get(f'/api/history/export/connection_events?room={self.room}&gzip=1')
+
+        self.assertEqual(response.mimetype, 'application/gzip')
+        lines = gzip.decompress(response.get_data()).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['device_name'] for line in lines], ['Device 0', 'Device 1', 'Device 2'])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.http.get('/api/history/export/transfer_outcomes').status_code, 404)
+        self.assertEqual(self.http.get('/api/history/export/clients?format=xml').status_code, 400)
+        self.assertEqual(self.http.get('/api/history/export/clients?since=soon').status_code, 400)
+        self.assertEqual(server.app.test_client().get('/api/history/export/clients').status_code, 302)
+
+
+if __name__ == '__main__':
+    unittest.main()
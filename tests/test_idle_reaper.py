@@ -0,0 +1,96 @@
+import unittest
+from unittest import mock
+
+import app as server
+from app import signal_core
+from tests.test_socket_events import reset_signal_state
+
+
+class IdleReaperTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.rate_limiter.clear()
+        self.now_ms = 1_000_000
+        self.clients = []
+        for patcher in (mock.patch.object(server.socketio, 'start_background_task'),
+                        mock.patch.object(signal_core, 'current_time_ms', lambda: self.now_ms)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        signal_core.configure_idle_reaper(idle_timeout_ms=60000, interval_ms=15000)
+        self.addCleanup(signal_core.configure_idle_reaper, idle_timeout_ms=server.CLIENT_IDLE_TIMEOUT_MS,
+                        interval_ms=server.CLIENT_IDLE_REAP_INTERVAL_MS)
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected():
+                client.disconnect()
+        reset_signal_state()
+
+    def join(self, room, client_id, client_type='app'):
+        client = server.socketio.test_client(server.app)
+        self.clients.append(client)
+        client.emit('join', {'room': room, 'client_id': client_id, 'client_type': client_type})
+        client.get_received()
+        return client
+
+    def test_idle_clients_are_detached_with_one_update_per_room(self):
+        signal_core.configure_rooms(max_peers=4, max_peers_limit=8)
+        self.addCleanup(signal_core.configure_rooms, max_peers=server.ROOM_MAX_PEERS,
+                        max_peers_limit=server.ROOM_MAX_PEERS_LIMIT)
+        pc = self.join('house', 'pc', 'pc')
+        phone = self.join('house', 'phone')
+        self.join('house', 'tablet')
+        self.now_ms += 50000
+        pc.emit('client_ping')
+        pc.get_received()
+        self.now_ms += 20000
+        [phone_sid] = signal_core.CLIENT_SESSIONS['phone']
+
+        self.assertEqual(signal_core.reap_idle_clients(), ['phone', 'tablet'])
+        self.assertEqual(signal_core.get_room_client_ids('house'), ['pc'])
+        self.assertEqual(server.get_client_from_sid(phone_sid), 'Unknown')
+        received = pc.get_received()
+        self.assertEqual([m['name'] for m in received if m['name'] in ('room_stats', 'room_state_changed')],
+                         ['room_stats', 'room_state_changed'])
+        [evicted] = [m['args'][0] for m in phone.get_received() if m['name'] == 'peer_evicted']
+        self.assertEqual(evicted['reason'], 'idle_timeout')
+        self.assertEqual(signal_core.IDLE_REAPER_STATS['reaped'], 2)
+
+        # The reaped socket's own disconnect later finds nothing left to detach.
+        phone.disconnect()
+        self.assertEqual(signal_core.get_room_client_ids('house'), ['pc'])
+
+    def test_scan_stops_at_the_first_live_client(self):
+        for i in range(3):
+            self.join(f'room-{i}', f'app-{i}')
+            self.now_ms += 1000
+        self.assertEqual(list(signal_core.CLIENT_LAST_SEEN_MS), ['app-0', 'app-1', 'app-2'])
+        signal_core.mark_client_seen('app-0')
+        self.assertEqual(list(signal_core.CLIENT_LAST_SEEN_MS), ['app-1', 'app-2', 'app-0'])
+
+        self.now_ms += 58500
+        with mock.patch.object(signal_core, 'detach_sid_from_tracking',
+                               wraps=signal_core.detach_sid_from_tracking) as detach:
+            self.assertEqual(signal_core.reap_idle_clients(), ['app-1'])
+        detach.assert_called_once()
+        self.assertEqual(signal_core.reap_idle_clients(self.now_ms + 60000), ['app-2', 'app-0'])
+        self.assertEqual(signal_core.get_all_room_states(), {})
+
+    def test_sid_moves_to_the_client_id_it_last_joined_as(self):
+        client = self.join('house', 'old-id')
+        client.emit('join', {'room': 'house', 'client_id': 'new-id', 'client_type': 'app'})
+        [sid] = signal_core.CLIENT_SESSIONS['new-id']
+        self.assertEqual(server.get_client_from_sid(sid), 'new-id')
+        self.assertNotIn('old-id', signal_core.CLIENT_SESSIONS)
+        self.assertEqual(signal_core.get_room_client_ids('house'), ['new-id'])
+
+    def test_zero_timeout_disables_the_reaper(self):
+        self.join('house', 'phone')
+        signal_core.configure_idle_reaper(idle_timeout_ms=0, interval_ms=15000)
+        self.now_ms += 10 ** 9
+        self.assertEqual(signal_core.reap_idle_clients(), [])
+        self.assertEqual(signal_core.get_room_client_ids('house'), ['phone'])
+
+
+if __name__ == '__main__':
+    unittest.main()
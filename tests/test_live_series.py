@@ -0,0 +1,78 @@
+import unittest
+
+import app as server
+from app.services.live_series import LiveSeries
+from tests.test_socket_events import reset_signal_state
+
+
+class LiveSeriesTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 7200.5
+        self.series = LiveSeries(('connects', 'relays'), second_slots=5, minute_slots=3, clock=lambda: self.now)
+
+    def test_counts_land_in_the_current_second_and_minute(self):
+        self.series.increment('connects')
+        self.now += 1
+        self.series.increment('relays', 3)
+        self.series.increment('connects')
+
+        seconds = self.series.window('second', 3)
+        self.assertEqual((seconds['start'], seconds['step_s']), (7199, 1))
+        self.assertEqual(seconds['series'], {'connects': [0, 1, 1], 'relays': [0, 0, 3]})
+        self.assertEqual(self.series.window('minute')['series'], {'connects': [0, 0, 2], 'relays': [0, 0, 3]})
+        self.assertEqual(self.series.point('second', 7200), {'t': 7200, 'values': {'connects': 1, 'relays': 0}})
+
+    def test_slots_reused_after_a_wrap_start_from_zero(self):
+        self.series.increment('relays', 4)
+        self.now += 5
+        self.series.increment('relays')
+        self.now += 2
+
+        window = self.series.window('second')
+        self.assertEqual(window['start'], 7203)
+        self.assertEqual(window['series']['relays'], [0, 0, 1, 0, 0])
+
+    def test_points_are_capped_by_the_ring_size(self):
+        self.assertEqual(len(self.series.window('minute', 100)['series']['connects']), 3)
+
+
+class LiveSeriesEndpointTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.rate_limiter.clear()
+        self.http = server.app.test_client()
+        with self.http.session_transaction() as session:
+            session['_user_id'] = 'admin'
+
+    def tearDown(self):
+        reset_signal_state()
+
+    def relays_last_minute(self):
+        return self.http.get('/api/live/series?resolution=second&points=60').get_json()['series']['relays']
+
+    def test_http_relays_are_counted(self):
+        before = sum(self.relays_last_minute())
+        self.http.post('/api/relay', json={'room': 'live-room', 'event': 'ping', 'data': {}})
+        self.http.post('/api/relay/batch', json=[{'room': 'live-room', 'event': 'ping', 'data': {}}] * 2)
+
+        self.assertEqual(sum(self.relays_last_minute()) - before, 3)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.http.get('/api/live/series?resolution=hour').status_code, 400)
+        self.assertEqual(self.http.get('/api/live/series?points=many').status_code, 400)
+        self.assertEqual(server.app.test_client().get('/api/live/series').status_code, 302)
+
+    def test_dashboard_gets_a_snapshot_when_it_subscribes(self):
+        dashboard = server.socketio.test_client(server.app, namespace='/dashboard', flask_test_client=self.http)
+        self.addCleanup(dashboard.disconnect, '/dashboard')
+        dashboard.get_received('/dashboard')
+
+        dashboard.emit('subscribe', {'streams': ['live_series']}, namespace='/dashboard')
+
+        snapshot = [m['args'][0] for m in dashboard.get_received('/dashboard') if m['name'] == 'live_series_snapshot']
+        self.assertEqual(len(snapshot[0]['second']['series']['connects']), 300)
+        self.assertEqual(len(snapshot[0]['minute']['series']['connects']), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import logging
+import queue
+import threading
+import unittest
+
+from app.services.log_pipeline import (
+    JsonFormatter,
+    LazyQueueHandler,
+    NativeThreadListener,
+    SamplingFilter,
+    TextFormatter,
+    parse_levels,
+)
+
+
+def record(msg='Relayed clipboard data to room: %s', args=('r1',), level=logging.INFO, name='app.socket'):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class SamplingFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.sampler = SamplingFilter(burst=3, window_ms=1000, every=5, clock=lambda: self.now)
+
+    def test_burst_then_one_in_every_per_template(self):
+        kept = [self.sampler.filter(record()) for _ in range(13)]
+        self.assertEqual([i for i, ok in enumerate(kept) if ok], [0, 1, 2, 7, 12])
+        # Another template has its own budget.
+        self.assertTrue(self.sampler.filter(record(msg='Client connected: %s')))
+        self.assertEqual(self.sampler.stats['sampled_out'], 8)
+
+    def test_kept_record_reports_what_was_dropped_before_it(self):
+        for _ in range(5):
+            self.sampler.filter(record())
+        self.now = 1.5
+        line = record()
+        self.assertTrue(self.sampler.filter(line))
+        self.assertEqual(line.sampled_out, 2)
+        self.assertIn('(+2 similar suppressed)', TextFormatter('%(message)s').format(line))
+
+    def test_warnings_and_disabled_sampling_always_pass(self):
+        for _ in range(10):
+            self.assertTrue(self.sampler.filter(record(level=logging.WARNING)))
+        off = SamplingFilter(burst=0)
+        self.assertTrue(all(off.filter(record()) for _ in range(100)))
+
+
+class LazyQueueHandlerTest(unittest.TestCase):
+    def test_records_are_formatted_by_the_listener_thread(self):
+        formatted_on = []
+
+        class Recording(logging.Handler):
+            def emit(self, rec):
+                formatted_on.append((threading.get_ident(), rec.getMessage()))
+
+        handler = LazyQueueHandler(queue.SimpleQueue())
+        listener = NativeThreadListener(handler.queue, Recording())
+        listener.start()
+        peers = ['pc']
+        rec = record(msg='peers=%s count=%d', args=(peers, 1))
+        handler.handle(rec)
+        peers.append('phone')
+        listener.stop()
+
+        self.assertEqual(rec.msg, 'peers=%s count=%d')
+        self.assertEqual(len(formatted_on), 1)
+        thread_id, message = formatted_on[0]
+        self.assertNotEqual(thread_id, threading.get_ident())
+        self.assertEqual(message, "peers=['pc'] count=1")
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = LazyQueueHandler(queue.SimpleQueue(), max_size=2)
+        for _ in range(5):
+            handler.handle(record())
+        self.assertEqual(handler.stats, {'enqueued': 2, 'dropped': 3})
+
+
+class FormattingTest(unittest.TestCase):
+    def test_json_lines_keep_extra_fields(self):
+        rec = logging.makeLogRecord({'name': 'app.signal', 'levelno': logging.INFO, 'levelname': 'INFO',
+                                     'msg': 'Evicted client %s', 'args': ('app_1',), 'room': 'house'})
+        line = JsonFormatter().format(rec)
+        self.assertIn('"msg": "Evicted client app_1"', line)
+        self.assertIn('"room": "house"', line)
+
+    def test_parse_levels_skips_bad_entries(self):
+        self.assertEqual(parse_levels('app.socket=warning, engineio=INFO,bogus=LOUD,=DEBUG'),
+                         {'app.socket': logging.WARNING, 'engineio': logging.INFO})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+import app as server
+from app.services.metrics import MetricsRegistry, instrument_socket_handler
+
+
+class MetricsRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram('op_seconds', 'Op latency', ('op',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, ('read',))
+
+        text = self.registry.render()
+
+        self.assertIn('# TYPE op_seconds histogram', text)
+        self.assertIn('op_seconds_bucket{op="read",le="0.1"} 2', text)
+        self.assertIn('op_seconds_bucket{op="read",le="1"} 3', text)
+        self.assertIn('op_seconds_bucket{op="read",le="+Inf"} 4', text)
+        self.assertIn('op_seconds_count{op="read"} 4', text)
+
+    def test_callbacks_are_read_at_scrape_time(self):
+        sizes = {'a': 1}
+        self.registry.callback('things', 'Things', lambda: len(sizes))
+        self.registry.callback('by_kind', 'By kind', lambda: {('x',): 2}, ('kind',), kind='counter')
+        sizes['b'] = 2
+
+        text = self.registry.render()
+
+        self.assertIn('things 2', text)
+        self.assertIn('# TYPE by_kind counter', text)
+        self.assertIn('by_kind{kind="x"} 2', text)
+
+    def test_label_values_are_escaped(self):
+        self.registry.counter('c_total', 'C', ('room',)).inc(('a"b',))
+        self.assertIn('c_total{room="a\\"b"} 1', self.registry.render())
+
+    def test_instrumented_handler_counts_errors_and_trims_arguments(self):
+        def no_args():
+            return 'ok'
+
+        def failing(data):
+            raise ValueError(data)
+
+        self.assertEqual(instrument_socket_handler(self.registry, 'connect', no_args)({'auth': 1}), 'ok')
+        with self.assertRaises(ValueError):
+            instrument_socket_handler(self.registry, 'boom', failing)('x')
+
+        self.assertEqual(self.registry.get('socketio_handler_errors_total').value(('boom',)), 1)
+        self.assertEqual(self.registry.get('socketio_handler_seconds').count(('connect',)), 1)
+
+
+class MetricsEndpointTest(unittest.TestCase):
+    def test_metrics_endpoint_reports_handlers_and_state(self):
+        client = server.socketio.test_client(server.app)
+        client.emit('join', {'room': 'metrics-room', 'client_id': 'metrics_pc', 'client_type': 'pc'})
+
+        http = server.app.test_client()
+        with http.session_transaction() as session:
+            session['_user_id'] = 'admin'
+        response = http.get('/metrics')
+        client.disconnect()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertIn('socketio_handler_seconds_count{event="join"}', text)
+        self.assertIn('rooms_by_state{state="SINGLE"}', text)
+        self.assertIn('transfer_contexts ', text)
+        self.assertIn('history_write_queue_depth ', text)
+
+    def test_metrics_endpoint_is_closed_without_token_or_login(self):
+        self.assertEqual(server.app.test_client().get('/metrics').status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
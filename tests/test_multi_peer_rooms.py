@@ -0,0 +1,120 @@
+import unittest
+from unittest import mock
+
+import app as server
+from app import signal_core
+from tests.test_socket_events import reset_signal_state
+
+PC_NETWORK = {'network_id_hash': 'home', 'private_ip': '192.168.1.10', 'network_epoch': 1}
+PROBE = {'probe_url': 'http://192.168.1.10:8765/probe'}
+
+
+class MultiPeerRoomTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.rate_limiter.clear()
+        server.transfer_decision_estimator.clear()
+        self.debounce_ms = server.lan_probe_cache.debounce_ms
+        server.lan_probe_cache.debounce_ms = 0
+        self.clients = []
+        # Decision deadlines are not under test; keep their workers from starting.
+        patcher = mock.patch.object(server.socketio, 'start_background_task')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected():
+                client.disconnect()
+        server.lan_probe_cache.debounce_ms = self.debounce_ms
+        reset_signal_state()
+
+    def join(self, client_id, client_type, **extra):
+        client = server.socketio.test_client(server.app)
+        self.clients.append(client)
+        client.emit('join', dict({'room': 'house', 'client_id': client_id, 'client_type': client_type}, **extra))
+        return client
+
+    def received(self, client, name):
+        return [m['args'][0] for m in client.get_received() if m['name'] == name]
+
+    def answer_probe(self, phone, result):
+        [request] = self.received(phone, 'lan_probe_request')
+        phone.emit('lan_probe_result', {'room': 'house', 'probe_id': request['probe_id'], 'result': result})
+
+    def test_joins_only_probe_the_new_peers_pairs(self):
+        self.join('pc', 'pc', network=PC_NETWORK, probe=PROBE, max_peers=4)
+        phones = [self.join(f'app_{i}', 'app', network={'network_id_hash': 'home', 'private_ip': f'192.168.1.{20 + i}'})
+                  for i in range(3)]
+        for phone in phones:
+            self.answer_probe(phone, 'ok')
+
+        state = signal_core.build_room_state_payload('house')
+        self.assertEqual((state['max_peers'], len(state['peers']), state['state']), (4, 4, 'PAIR_SAME_LAN'))
+        self.assertEqual([pair['app_client_id'] for pair in state['pairs']], ['app_0', 'app_1', 'app_2'])
+
+        phones[1].emit('peer_network_update', {'room': 'house', 'network': {'network_epoch': 2}})
+        self.assertEqual([len(self.received(phone, 'lan_probe_request')) for phone in phones], [0, 1, 0])
+        self.assertEqual(server.get_room_lan_state('house'), 'PAIR_UNKNOWN')
+        self.assertEqual(server.get_room_lan_state('house', 'app_0', 'pc'), 'PAIR_SAME_LAN')
+
+    def test_max_peers_is_capped_by_the_limit(self):
+        self.join('pc', 'pc', max_peers=1000)
+        self.assertEqual(signal_core.build_room_state_payload('house')['max_peers'], signal_core.ROOM_MAX_PEERS_LIMIT)
+
+    def test_full_room_evicts_least_recently_seen_phone_not_the_joiner(self):
+        self.join('pc', 'pc', max_peers=3)
+        first = self.join('app_1', 'app')
+        self.join('app_2', 'app')
+        server.CLIENT_LAST_SEEN_MS['app_2'] = 0
+        self.join('app_3', 'app')
+
+        self.assertEqual(signal_core.get_room_client_ids('house'), ['pc', 'app_1', 'app_3'])
+        self.assertEqual(self.received(first, 'peer_evicted'), [])
+
+    def test_file_offer_goes_only_to_lan_receivers_in_one_emit(self):
+        pc = self.join('pc', 'pc', network=PC_NETWORK, probe=PROBE, max_peers=3)
+        near = self.join('app_near', 'app', network={'network_id_hash': 'home', 'private_ip': '192.168.1.20'})
+        far = self.join('app_far', 'app', network={'network_id_hash': 'away', 'private_ip': '10.0.0.20'})
+        self.answer_probe(near, 'ok')
+        self.answer_probe(far, 'fail')
+        pc.get_received()
+
+        manager = server.socketio.server.manager
+        with mock.patch.object(manager, 'emit', wraps=manager.emit) as manager_emit:
+            pc.emit('file_available', {'room': 'house', 'transfer_id': 'tr_multi', 'file_id': 'f1',
+                                       'protocol_version': '4.0'})
+        offers = [call for call in manager_emit.call_args_list if call.args[0] == 'file_available']
+        self.assertEqual(len(offers), 1)
+        self.assertEqual(len(self.received(near, 'file_available')), 1)
+        self.assertEqual(self.received(far, 'file_available'), [])
+
+        commands = self.received(pc, 'transfer_command')
+        self.assertEqual([(c['action'], c['reason']) for c in commands], [('upload_relay', 'room_diff_lan')])
+
+        near.emit('file_sync_completed', {'room': 'house', 'transfer_id': 'tr_multi', 'file_id': 'f1',
+                                          'protocol_version': '4.0'})
+        contexts = server.TRANSFER_CONTEXTS['tr_multi']
+        self.assertEqual(contexts['app_near']['status'], 'lan_success')
+        self.assertEqual(contexts['app_far']['status'], 'fallback_requested')
+        self.assertEqual([c['action'] for c in self.received(pc, 'transfer_command')], ['finish'])
+
+    def test_finish_waits_for_every_receiver(self):
+        pc = self.join('pc', 'pc', network=PC_NETWORK, probe=PROBE, max_peers=3)
+        phones = [self.join(f'app_{i}', 'app', network={'network_id_hash': 'home', 'private_ip': f'192.168.1.{20 + i}'})
+                  for i in range(2)]
+        for phone in phones:
+            self.answer_probe(phone, 'ok')
+        pc.emit('file_available', {'room': 'house', 'transfer_id': 'tr_both', 'file_id': 'f1',
+                                   'protocol_version': '4.0'})
+        pc.get_received()
+
+        completed = {'room': 'house', 'transfer_id': 'tr_both', 'file_id': 'f1', 'protocol_version': '4.0'}
+        phones[0].emit('file_sync_completed', completed)
+        self.assertEqual(self.received(pc, 'transfer_command'), [])
+        phones[1].emit('file_sync_completed', completed)
+        self.assertEqual([c['action'] for c in self.received(pc, 'transfer_command')], ['finish'])
+
+
+if __name__ == '__main__':
+    unittest.main()
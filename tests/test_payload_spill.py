@@ -0,0 +1,55 @@
+import unittest
+
+from app.services.payload_spill import PayloadSpiller
+
+
+class PayloadSpillerTest(unittest.TestCase):
+    def setUp(self):
+        self.stored = {}
+
+        def store_blob(file_key, data, content_type):
+            self.stored[file_key] = (data, content_type)
+            return f'https://storage.test/{file_key}'
+
+        self.spiller = PayloadSpiller(threshold_bytes=1024, store_blob=store_blob)
+
+    def test_small_payload_is_relayed_inline(self):
+        data = {'room': 'a', 'content': 'x' * 1024}
+        self.assertIs(self.spiller.spill(data), data)
+        self.assertEqual(self.stored, {})
+
+    def test_multibyte_content_is_measured_in_utf8_bytes(self):
+        data = {'room': 'a', 'content': 'é' * 600}
+        spilled = self.spiller.spill(data)
+        self.assertEqual(spilled['content_ref']['size'], 1200)
+
+    def test_oversized_payload_is_replaced_by_reference(self):
+        data = {'room': 'a', 'content': 'y' * 5000, 'content_hash': 'h'}
+        spilled = self.spiller.spill(data)
+
+        self.assertNotIn('content', spilled)
+        self.assertEqual(spilled['content_hash'], 'h')
+        ref = spilled['content_ref']
+        self.assertEqual(ref['size'], 5000)
+        self.assertEqual(ref['download_url'], f"https://storage.test/{ref['file_key']}")
+        self.assertEqual(self.stored[ref['file_key']][0], b'y' * 5000)
+        self.assertEqual(data['content'], 'y' * 5000)
+        self.assertEqual(self.spiller.stats['spilled'], 1)
+
+    def test_storage_failure_falls_back_to_inline(self):
+        def broken_store(file_key, data, content_type):
+            raise OSError('disk full')
+
+        spiller = PayloadSpiller(threshold_bytes=10, store_blob=broken_store)
+        data = {'content': 'z' * 100}
+        self.assertIs(spiller.spill(data), data)
+        self.assertEqual(spiller.stats['failed'], 1)
+
+    def test_disabled_without_storage(self):
+        spiller = PayloadSpiller(threshold_bytes=10)
+        data = {'content': 'z' * 100}
+        self.assertIs(spiller.spill(data), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
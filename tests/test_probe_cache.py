@@ -0,0 +1,139 @@
+import unittest
+from unittest import mock
+
+import app as server
+from app import signal_core
+from app.services.probe_cache import LanProbeCache
+from tests.test_socket_events import reset_signal_state
+
+PC_NETWORK = {'network_id_hash': 'home', 'private_ip': '192.168.1.10', 'network_epoch': 1}
+APP_NETWORK = {'network_id_hash': 'home', 'private_ip': '192.168.1.20', 'network_epoch': 1}
+PROBE_URL = 'http://192.168.1.10:8765/probe'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now_ms = 1_000_000
+
+    def __call__(self):
+        return self.now_ms
+
+
+class LanProbeCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LanProbeCache(max_ttl_ms=60000, debounce_ms=1000, clock=self.clock)
+
+    def test_unknown_network_is_not_cacheable(self):
+        self.assertIsNone(self.cache.key_for(PC_NETWORK, {}, PROBE_URL))
+
+    def test_result_expires_after_probe_ttl(self):
+        key = self.cache.key_for(PC_NETWORK, APP_NETWORK, PROBE_URL)
+        self.cache.put(key, {'status': 'ok'}, ttl_ms=5000)
+        self.assertEqual(self.cache.get(key)['status'], 'ok')
+
+        self.clock.now_ms += 5000
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual((self.cache.stats['hits'], self.cache.stats['misses']), (1, 1))
+
+    def test_new_network_epoch_misses(self):
+        key = self.cache.key_for(PC_NETWORK, APP_NETWORK, PROBE_URL)
+        self.cache.put(key, {'status': 'ok'}, ttl_ms=5000)
+        moved = self.cache.key_for(PC_NETWORK, dict(APP_NETWORK, network_epoch=2), PROBE_URL)
+        self.assertIsNone(self.cache.get(moved))
+
+    def test_debounce_window(self):
+        self.assertEqual(self.cache.debounce_remaining_ms('r'), 0)
+        self.cache.note_probe_sent('r')
+        self.clock.now_ms += 300
+        self.assertEqual(self.cache.debounce_remaining_ms('r'), 700)
+
+    def test_exported_entries_load_into_a_new_cache(self):
+        key = self.cache.key_for(PC_NETWORK, APP_NETWORK, PROBE_URL)
+        self.cache.put(key, {'status': 'ok'}, ttl_ms=5000)
+        self.cache.put(self.cache.key_for(PC_NETWORK, dict(APP_NETWORK, network_epoch=2), PROBE_URL),
+                       {'status': 'fail'}, ttl_ms=1000)
+        self.clock.now_ms += 2000
+        rows = self.cache.export_entries()
+
+        restored = LanProbeCache(max_ttl_ms=60000, clock=self.clock)
+        self.assertEqual(restored.import_entries(rows + [['bad row']]), 1)
+        self.assertEqual(restored.get(key)['status'], 'ok')
+        self.clock.now_ms += 3000
+        self.assertIsNone(restored.get(key))
+
+
+class ProbeCacheSocketTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.rate_limiter.clear()
+        self.clients = []
+        self.debounce_ms = server.lan_probe_cache.debounce_ms
+        server.lan_probe_cache.debounce_ms = 0
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected():
+                client.disconnect()
+        server.lan_probe_cache.debounce_ms = self.debounce_ms
+        reset_signal_state()
+
+    def join(self, client_id, client_type, network, **extra):
+        client = server.socketio.test_client(server.app)
+        self.clients.append(client)
+        client.emit('join', dict({'room': 'room-p', 'client_id': client_id, 'client_type': client_type,
+                                  'network': network}, **extra))
+        return client
+
+    def probe_requests(self, client):
+        return [m['args'][0] for m in client.get_received() if m['name'] == 'lan_probe_request']
+
+    def test_rejoin_on_same_networks_reuses_probe_result(self):
+        self.join('pc_p', 'pc', PC_NETWORK, probe={'probe_url': PROBE_URL, 'probe_ttl_ms': 60000})
+        phone = self.join('app_p', 'app', APP_NETWORK)
+        [request] = self.probe_requests(phone)
+        phone.emit('lan_probe_result', {'room': 'room-p', 'probe_id': request['probe_id'], 'result': 'ok'})
+        phone.disconnect()
+        self.assertEqual(server.get_room_lan_state('room-p'), 'SINGLE')
+
+        phone = self.join('app_p', 'app', APP_NETWORK)
+
+        self.assertEqual(self.probe_requests(phone), [])
+        self.assertEqual(server.get_room_lan_state('room-p'), 'PAIR_SAME_LAN')
+        self.assertTrue(server.ROOM_LAST_PROBE['room-p']['cached'])
+
+        phone.emit('peer_network_update', {'room': 'room-p', 'network': dict(APP_NETWORK, network_epoch=2)})
+        self.assertEqual(len(self.probe_requests(phone)), 1)
+
+    def test_flapping_updates_are_debounced(self):
+        server.lan_probe_cache.debounce_ms = 60000
+        self.join('pc_p', 'pc', PC_NETWORK, probe={'probe_url': PROBE_URL})
+        phone = self.join('app_p', 'app', APP_NETWORK)
+        self.assertEqual(len(self.probe_requests(phone)), 1)
+        debounced_before = server.lan_probe_cache.stats['debounced']
+
+        # Capture the debounce task instead of leaving a 60 s greenlet behind.
+        tasks = []
+        with mock.patch.object(server.socketio, 'start_background_task',
+                               side_effect=lambda func, *args: tasks.append((func, args))):
+            for epoch in (2, 3, 4):
+                phone.emit('peer_network_update', {'room': 'room-p', 'network': dict(APP_NETWORK, network_epoch=epoch)})
+
+        self.assertEqual(self.probe_requests(phone), [])
+        self.assertEqual(server.lan_probe_cache.stats['debounced'], debounced_before + 3)
+        self.assertEqual(signal_core.DEBOUNCED_PROBE_ROOMS, {'room-p'})
+        [(run_debounced_probe, args)] = [task for task in tasks if task[0].__name__ == 'run_debounced_probe']
+
+        later_ms = server.lan_probe_cache._clock() + 60000
+        with mock.patch.object(server.socketio, 'sleep') as sleep, \
+                mock.patch.object(server.socketio, 'start_background_task'), \
+                mock.patch.object(server.lan_probe_cache, '_clock', return_value=later_ms):
+            run_debounced_probe(*args)
+
+        self.assertEqual(len(self.probe_requests(phone)), 1)
+        self.assertEqual(signal_core.DEBOUNCED_PROBE_ROOMS, set())
+        self.assertLessEqual(sleep.call_args[0][0], 60.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
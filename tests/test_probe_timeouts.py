@@ -0,0 +1,105 @@
+import unittest
+from unittest import mock
+
+import app as server
+from app import signal_core
+from tests.test_socket_events import reset_signal_state
+
+PROBE = {'probe_url': 'http://192.168.1.10:8765/probe'}
+
+
+class ProbeTimeoutTest(unittest.TestCase):
+    """The deadline worker is run inline: sleeps are recorded, never slept."""
+
+    def setUp(self):
+        reset_signal_state()
+        server.rate_limiter.clear()
+        self.debounce_ms = server.lan_probe_cache.debounce_ms
+        server.lan_probe_cache.debounce_ms = 0
+        self.sleeps = []
+        self.workers = []
+        patches = [
+            mock.patch.object(server.socketio, 'sleep', side_effect=self.sleeps.append),
+            mock.patch.object(server.socketio, 'start_background_task',
+                              side_effect=lambda func, *args: self.workers.append((func, args))),
+            mock.patch.object(signal_core, 'LAN_PROBE_TIMEOUT_GRACE_MS', 2000),
+            mock.patch.object(signal_core, 'LAN_PROBE_RETRY_BASE_MS', 1000),
+            mock.patch.object(signal_core, 'LAN_PROBE_MAX_RETRIES', 1),
+            mock.patch.object(signal_core.random, 'uniform', return_value=1.0),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected():
+                client.disconnect()
+        server.lan_probe_cache.debounce_ms = self.debounce_ms
+        reset_signal_state()
+
+    def join(self, client_id, client_type, **extra):
+        client = server.socketio.test_client(server.app)
+        self.clients.append(client)
+        client.emit('join', dict({'room': 'room-x', 'client_id': client_id, 'client_type': client_type}, **extra))
+        return client
+
+    def probe_requests(self, client):
+        return [m['args'][0] for m in client.get_received() if m['name'] == 'lan_probe_request']
+
+    def run_timeout_workers(self):
+        workers = [args for func, args in self.workers if func is signal_core.lan_probe_timeout_worker]
+        self.workers.clear()
+        for args in workers:
+            signal_core.lan_probe_timeout_worker(*args)
+
+    def test_unanswered_probe_times_out_and_retries_with_backoff(self):
+        pc = self.join('pc_x', 'pc', probe=PROBE)
+        phone = self.join('app_x', 'app')
+        [first] = self.probe_requests(phone)
+
+        self.run_timeout_workers()
+
+        timeout_s = (signal_core.DEFAULT_PROBE_TIMEOUT_MS + 2000) / 1000.0
+        self.assertEqual(self.sleeps, [timeout_s, 1.0])
+        states = [m['args'][0]['state'] for m in pc.get_received() if m['name'] == 'room_state_changed']
+        self.assertIn('PAIR_DIFF_LAN', states)
+        [retry] = self.probe_requests(phone)
+        self.assertNotEqual(retry['probe_id'], first['probe_id'])
+        self.assertEqual(server.PENDING_LAN_PROBES[retry['probe_id']]['attempt'], 1)
+
+        # The retry also times out; the retry budget is spent so no third probe goes out.
+        self.run_timeout_workers()
+        self.assertEqual(self.probe_requests(phone), [])
+        self.assertEqual(server.ROOM_LAST_PROBE['room-x']['status'], 'timeout')
+        self.assertEqual(server.ROOM_LAST_PROBE['room-x']['reason'], 'server_deadline')
+        self.assertEqual(server.get_room_lan_state('room-x'), 'PAIR_DIFF_LAN')
+        self.assertEqual(server.PENDING_LAN_PROBES, {})
+
+    def test_answered_probe_is_not_timed_out(self):
+        self.join('pc_x', 'pc', probe=PROBE)
+        phone = self.join('app_x', 'app')
+        [request] = self.probe_requests(phone)
+        phone.emit('lan_probe_result', {'room': 'room-x', 'probe_id': request['probe_id'], 'result': 'ok'})
+
+        self.run_timeout_workers()
+
+        self.assertEqual(server.ROOM_LAST_PROBE['room-x']['status'], 'ok')
+        self.assertEqual(self.probe_requests(phone), [])
+
+    def test_new_probe_supersedes_pending_one(self):
+        self.join('pc_x', 'pc', probe=PROBE)
+        phone = self.join('app_x', 'app')
+        phone.emit('peer_network_update', {'room': 'room-x', 'network': {'network_epoch': 2}})
+        first, second = self.probe_requests(phone)
+
+        phone.emit('lan_probe_result', {'room': 'room-x', 'probe_id': first['probe_id'], 'result': 'ok'})
+
+        errors = [m['args'][0]['code'] for m in phone.get_received() if m['name'] == 'error']
+        self.assertEqual(errors, ['E_PROBE_STALE'])
+        self.assertEqual(list(server.PENDING_LAN_PROBES), [second['probe_id']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from app.services.rate_limit import RateLimiter, TokenBucketLimiter, parse_rate
+
+
+class FakeClock:
+    def __init__(self):
+        self.now_s = 1000.0
+
+    def __call__(self):
+        return self.now_s
+
+
+class RateLimitTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter({
+            'clipboard': {'sid': (1, 2), 'room': (10, 3)},
+            'join': {'global': (1, 1)},
+        }, clock=self.clock)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('5:10'), (5.0, 10.0))
+        self.assertEqual(parse_rate('4'), (4.0, 4.0))
+        self.assertIsNone(parse_rate('0'))
+        self.assertIsNone(parse_rate(''))
+
+    def test_burst_then_reject_with_retry_after(self):
+        self.assertIsNone(self.limiter.check('clipboard', sid='s1', room='r'))
+        self.assertIsNone(self.limiter.check('clipboard', sid='s1', room='r'))
+        rejection = self.limiter.check('clipboard', sid='s1', room='r')
+        self.assertEqual(rejection, {'limiter': 'clipboard.sid', 'retry_after_ms': 1000})
+
+        self.clock.now_s += 1
+        self.assertIsNone(self.limiter.check('clipboard', sid='s1', room='r'))
+
+    def test_rejected_request_is_not_charged_to_other_scopes(self):
+        self.limiter.check('clipboard', sid='s1', room='r')
+        self.limiter.check('clipboard', sid='s1', room='r')
+        self.limiter.check('clipboard', sid='s1', room='r')
+        # The room bucket (burst 3) only paid for the two admitted pushes.
+        self.assertIsNone(self.limiter.check('clipboard', sid='s2', room='r'))
+        self.assertEqual(self.limiter.stats['clipboard.room']['allowed'], 3)
+        self.assertEqual(self.limiter.stats['clipboard.sid']['rejected'], 1)
+
+    def test_tied_scopes_report_the_narrowest(self):
+        limiter = RateLimiter({'clipboard': {'sid': (10, 2), 'client': (10, 2)}}, clock=self.clock)
+        limiter.check('clipboard', sid='s1', client_id='c1')
+        limiter.check('clipboard', sid='s1', client_id='c1')
+        rejection = limiter.check('clipboard', sid='s1', client_id='c1')
+        self.assertEqual(rejection['limiter'], 'clipboard.sid')
+
+    def test_global_admission_adds_jitter(self):
+        self.assertIsNone(self.limiter.check('join', sid='a'))
+        rejection = self.limiter.check('join', sid='b')
+        self.assertEqual(rejection['limiter'], 'join.global')
+        self.assertGreaterEqual(rejection['retry_after_ms'], 1000)
+        self.assertLessEqual(rejection['retry_after_ms'], 2000)
+
+    def test_idle_buckets_are_evicted_lru(self):
+        bucket = TokenBucketLimiter('t', 1, 1, max_keys=2, clock=self.clock)
+        bucket.peek('a')
+        bucket.peek('b')
+        bucket.peek('a')
+        bucket.peek('c')
+        self.assertEqual(list(bucket._buckets), ['a', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
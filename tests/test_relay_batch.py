@@ -0,0 +1,94 @@
+import json
+import unittest
+
+import app as server
+from tests.test_socket_events import reset_signal_state
+
+
+class RelayBatchTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.clipboard_dedup.clear()
+        server.rate_limiter.clear()
+        self.http = server.app.test_client()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected():
+                client.disconnect()
+        reset_signal_state()
+
+    def connect(self, room, client_id, client_type):
+        client = server.socketio.test_client(server.app)
+        self.clients.append(client)
+        client.emit('join', {'room': room, 'client_id': client_id, 'client_type': client_type})
+        client.get_received()
+        return client
+
+    def test_events_for_several_rooms_get_one_result_each(self):
+        pc = self.connect('room-1', 'pc_1', 'pc')
+        phone = self.connect('room-1', 'app_1', 'app')
+        tablet = self.connect('room-2', 'app_2', 'app')
+        pc.get_received()
+        events = [
+            {'room': 'room-1', 'event': 'clipboard_sync', 'data': {'content': 'first'}, 'sender_id': 'pc_1'},
+            {'room': 'room-2', 'event': 'file_sync', 'data': {'filename': 'a.txt'}},
+            {'room': 'room-1', 'event': 'clipboard_sync', 'data': {'content': 'second'}, 'sender_id': 'pc_1'},
+            {'room': 'room-1', 'event': 'clipboard_sync'},
+        ]
+
+        response = self.http.post('/api/relay/batch', json={'events': events})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual([r['status'] for r in body['results']], ['ok', 'ok', 'ok', 'error'])
+        first, relayed, second = body['results'][:3]
+        self.assertEqual((second['seq'] - first['seq'], 'seq' in relayed), (1, False))
+        self.assertEqual(body['counts'], {'ok': 3, 'error': 1})
+        self.assertEqual([m['args'][0]['content'] for m in phone.get_received() if m['name'] == 'clipboard_sync'],
+                         ['first', 'second'])
+        self.assertEqual([m['name'] for m in pc.get_received() if m['name'] == 'clipboard_sync'], [])
+        self.assertEqual([m['args'][0] for m in tablet.get_received() if m['name'] == 'file_sync'],
+                         [{'filename': 'a.txt'}])
+
+    def test_ndjson_batch_streams_results(self):
+        phone = self.connect('room-1', 'app_1', 'app')
+        lines = [
+            json.dumps({'room': 'room-1', 'event': 'ping', 'data': {'n': 1}}),
+            '',
+            '{not json',
+            json.dumps({'room': 'room-1', 'event': 'ping', 'data': {'n': 2}}),
+        ]
+
+        response = self.http.post('/api/relay/batch', data='\n'.join(lines) + '\n',
+                                  content_type='application/x-ndjson')
+
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(rows[:3], [
+            {'index': 0, 'status': 'ok'},
+            {'index': 1, 'status': 'error', 'error': 'Invalid JSON'},
+            {'index': 2, 'status': 'ok'},
+        ])
+        self.assertEqual(rows[3], {'done': True, 'counts': {'error': 1, 'ok': 2}})
+        self.assertEqual([m['args'][0]['n'] for m in phone.get_received() if m['name'] == 'ping'], [1, 2])
+
+    def test_each_event_counts_against_the_relay_limits(self):
+        burst = int(server.rate_limiter.limiters[('relay', 'client')].burst)
+        events = [{'room': 'room-1', 'event': 'custom', 'data': {}, 'sender_id': 'api_1'}] * (burst + 2)
+
+        results = self.http.post('/api/relay/batch', json=events).get_json()['results']
+
+        self.assertEqual([r['status'] for r in results].count('ok'), burst)
+        self.assertEqual(results[-1]['status'], 'rate_limited')
+        self.assertGreater(results[-1]['retry_after_ms'], 0)
+
+    def test_oversized_or_empty_batches_are_refused(self):
+        events = [{'room': 'room-1', 'event': 'ping', 'data': {}}] * (server.RELAY_BATCH_MAX_EVENTS + 1)
+        self.assertEqual(self.http.post('/api/relay/batch', json=events).status_code, 413)
+        self.assertEqual(self.http.post('/api/relay/batch', json={'events': []}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
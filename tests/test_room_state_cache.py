@@ -0,0 +1,78 @@
+import unittest
+from unittest import mock
+
+import app as server
+from app import signal_core
+from tests.test_socket_events import reset_signal_state
+
+PC_NETWORK = {'network_id_hash': 'home', 'private_ip': '192.168.1.10', 'network_epoch': 1}
+PROBE = {'probe_url': 'http://192.168.1.10:8765/probe'}
+
+
+class RoomStateCacheTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.rate_limiter.clear()
+        self.debounce_ms = server.lan_probe_cache.debounce_ms
+        server.lan_probe_cache.debounce_ms = 0
+        self.clients = []
+        patcher = mock.patch.object(server.socketio, 'start_background_task')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected():
+                client.disconnect()
+        server.lan_probe_cache.debounce_ms = self.debounce_ms
+        reset_signal_state()
+
+    def join(self, room, client_id, client_type, **extra):
+        client = server.socketio.test_client(server.app)
+        self.clients.append(client)
+        client.emit('join', dict({'room': room, 'client_id': client_id, 'client_type': client_type}, **extra))
+        return client
+
+    def test_payload_is_reused_until_the_room_changes(self):
+        self.join('house', 'pc', 'pc', network=PC_NETWORK, probe=PROBE)
+        phone = self.join('house', 'app', 'app', network={'network_id_hash': 'home', 'private_ip': '192.168.1.20'})
+        before = signal_core.build_room_state_payload('house')
+        self.assertIs(signal_core.build_room_state_payload('house'), before)
+        self.assertEqual(server.get_room_lan_state('house'), 'PAIR_UNKNOWN')
+
+        [request] = [m['args'][0] for m in phone.get_received() if m['name'] == 'lan_probe_request']
+        phone.emit('lan_probe_result', {'room': 'house', 'probe_id': request['probe_id'], 'result': 'ok'})
+        probed = signal_core.build_room_state_payload('house')
+        self.assertIsNot(probed, before)
+        self.assertEqual(probed['state'], 'PAIR_SAME_LAN')
+
+        phone.emit('peer_network_update', {'room': 'house', 'network': {'network_epoch': 7}})
+        updated = signal_core.build_room_state_payload('house')
+        self.assertEqual(updated['peers'][1]['network_epoch'], 7)
+        self.assertEqual(updated['state'], 'PAIR_UNKNOWN')
+
+        phone.disconnect()
+        self.assertEqual(signal_core.build_room_state_payload('house')['state'], 'SINGLE')
+
+    def test_room_index_stays_sorted_and_forgets_empty_rooms(self):
+        for room in ('kitchen', 'attic', 'garage'):
+            self.join(room, f'{room}-pc', 'pc')
+        self.assertEqual(list(signal_core.get_all_room_states()), ['attic', 'garage', 'kitchen'])
+
+        self.clients[1].disconnect()
+        self.assertEqual(list(signal_core.get_all_room_states()), ['garage', 'kitchen'])
+        self.assertNotIn('attic', signal_core.ROOM_VERSIONS)
+        self.assertNotIn('attic', signal_core.ROOM_STATE_CACHE)
+
+    def test_eviction_invalidates_the_payload(self):
+        self.join('house', 'pc', 'pc')
+        self.join('house', 'app_old', 'app')
+        self.assertEqual([p['client_id'] for p in signal_core.build_room_state_payload('house')['peers']],
+                         ['pc', 'app_old'])
+        self.join('house', 'app_new', 'app')
+        self.assertEqual([p['client_id'] for p in signal_core.build_room_state_payload('house')['peers']],
+                         ['pc', 'app_new'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import app as server
+from app import signal_core
+from app.services.session_snapshot import SessionSnapshotStore
+from tests.test_socket_events import reset_signal_state
+
+PC_NETWORK = {'network_id_hash': 'home', 'private_ip': '192.168.1.10', 'network_epoch': 1}
+APP_NETWORK = {'network_id_hash': 'home', 'private_ip': '192.168.1.20', 'network_epoch': 1}
+PROBE = {'probe_url': 'http://192.168.1.10:8765/probe'}
+
+
+class SessionSnapshotStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.now_ms = 1_000_000
+        self.path = os.path.join(tempfile.mkdtemp(prefix='snapshot-test-'), 'state.json.gz')
+        self.store = SessionSnapshotStore(self.path, lambda: {'clients': {'pc': {'room': 'house'}}},
+                                          max_age_ms=60000, clock=lambda: self.now_ms)
+
+    def test_round_trip(self):
+        self.assertIsNone(self.store.load())
+        self.assertTrue(self.store.save())
+        self.assertEqual(self.store.load(), {'clients': {'pc': {'room': 'house'}}})
+        self.assertEqual(self.store.stats['saved'], 1)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_stale_or_unreadable_snapshots_are_ignored(self):
+        self.store.save()
+        self.now_ms += 60001
+        self.assertIsNone(self.store.load())
+        with open(self.path, 'wb') as f:
+            f.write(b'not gzip')
+        self.assertIsNone(self.store.load())
+        with gzip.open(self.path, 'wb') as f:
+            f.write(json.dumps({'version': 99, 'saved_at_ms': self.now_ms, 'state': {}}).encode())
+        self.assertIsNone(self.store.load())
+
+
+class WarmRestartTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.rate_limiter.clear()
+        server.lan_probe_cache.clear()
+        self.debounce_ms = server.lan_probe_cache.debounce_ms
+        server.lan_probe_cache.debounce_ms = 0
+        self.clients = []
+        patcher = mock.patch.object(server.socketio, 'start_background_task')
+        self.background = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected():
+                client.disconnect()
+        server.lan_probe_cache.debounce_ms = self.debounce_ms
+        server.lan_probe_cache.clear()
+        reset_signal_state()
+
+    def join(self, client_id, client_type, **extra):
+        client = server.socketio.test_client(server.app)
+        self.clients.append(client)
+        client.emit('join', dict({'room': 'house', 'client_id': client_id, 'client_type': client_type}, **extra))
+        return client
+
+    def restart(self):
+        """Snapshot, forget everything like a new process would, and restore."""
+        state = json.loads(json.dumps(signal_core.export_session_state()))
+        for client in self.clients:
+            client.disconnect()
+        reset_signal_state()
+        server.lan_probe_cache.clear()
+        self.background.reset_mock()
+        return signal_core.restore_session_state(state, grace_ms=30000)
+
+    def test_rejoining_device_skips_the_lan_probe(self):
+        self.join('pc', 'pc', network=PC_NETWORK, probe=PROBE)
+        phone = self.join('app', 'app', network=APP_NETWORK)
+        [request] = [m['args'][0] for m in phone.get_received() if m['name'] == 'lan_probe_request']
+        phone.emit('lan_probe_result', {'room': 'house', 'probe_id': request['probe_id'], 'result': 'ok'})
+
+        self.assertEqual(self.restart(), 2)
+        self.assertEqual(signal_core.get_room_client_ids('house'), ['pc', 'app'])
+        self.assertEqual(signal_core.build_room_state_payload('house')['state'], 'PAIR_SAME_LAN')
+        self.background.assert_called_once_with(signal_core.restore_grace_worker, 30000)
+
+        phone = self.join('app', 'app', network=APP_NETWORK)
+        self.assertFalse([m for m in phone.get_received() if m['name'] == 'lan_probe_request'])
+        self.assertEqual(server.get_room_lan_state('house'), 'PAIR_SAME_LAN')
+        self.assertEqual(signal_core.RESTORED_CLIENTS, {'pc'})
+
+        # The PC never came back: the grace window drops it with one room update.
+        self.assertEqual(signal_core.expire_restored_clients(), ['pc'])
+        self.assertEqual(signal_core.get_room_client_ids('house'), ['app'])
+        self.assertEqual([m['args'][0]['state'] for m in phone.get_received() if m['name'] == 'room_state_changed'],
+                         ['SINGLE'])
+
+    def test_undecided_transfer_survives_with_its_deadline_pushed_out(self):
+        pc = self.join('pc', 'pc', network=PC_NETWORK, probe=PROBE)
+        self.join('app', 'app', network=APP_NETWORK)
+        pc.emit('file_available', {'room': 'house', 'protocol_version': '4.0', 'transfer_id': 'tr_1',
+                                   'file_id': 'f_1', 'filename': 'photo.jpg', 'file_size': 1024})
+        self.assertEqual(signal_core.TRANSFER_CONTEXTS['tr_1']['app']['status'], 'waiting_result')
+
+        now_ms = signal_core.current_time_ms()
+        self.restart()
+        context = signal_core.TRANSFER_CONTEXTS['tr_1']['app']
+        self.assertEqual(context['status'], 'waiting_result')
+        self.assertGreaterEqual(context['decision_deadline_ms'], now_ms + 30000)
+        self.background.assert_any_call(signal_core.transfer_decision_timeout_worker, 'tr_1', 'app')
+
+
+if __name__ == '__main__':
+    unittest.main()
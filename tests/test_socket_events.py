@@ -0,0 +1,220 @@
+import io
+import unittest
+
+import app as server
+from app import signal_core
+
+
+def reset_signal_state():
+    for name in dir(signal_core):
+        value = getattr(signal_core, name)
+        if name.isupper() and isinstance(value, (dict, set, list)) and name != 'ALLOWED_ACTIVITY_TYPES':
+            value.clear()
+    server.lan_probe_cache.clear()
+
+
+class SocketEventsTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.clipboard_dedup.clear()
+        server.rate_limiter.clear()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            if client.is_connected():
+                client.disconnect()
+        reset_signal_state()
+
+    def connect(self, room, client_id, client_type, **extra):
+        client = server.socketio.test_client(server.app)
+        self.clients.append(client)
+        payload = {'room': room, 'client_id': client_id, 'client_type': client_type}
+        payload.update(extra)
+        client.emit('join', payload)
+        client.get_received()
+        return client
+
+    def test_clipboard_push_relays_to_peer(self):
+        pc = self.connect('room-1', 'pc_1', 'pc')
+        phone = self.connect('room-1', 'app_1', 'app')
+        pc.get_received()
+
+        phone.emit('clipboard_push', {'room': 'room-1', 'content': 'hello'})
+
+        synced = [m for m in pc.get_received() if m['name'] == 'clipboard_sync']
+        self.assertEqual(len(synced), 1)
+        self.assertEqual(synced[0]['args'][0]['content'], 'hello')
+
+    def test_binary_clipboard_reaches_legacy_peers_as_base64(self):
+        pc = self.connect('room-1', 'pc_1', 'pc', max_peers=3)
+        tablet = self.connect('room-1', 'app_2', 'app', binary=True)
+        phone = server.socketio.test_client(server.app)
+        self.clients.append(phone)
+        ack = phone.emit('join', {'room': 'room-1', 'client_id': 'app_1', 'client_type': 'app', 'binary': True},
+                         callback=True)
+        self.assertEqual(ack, {'status': 'ok', 'binary': True})
+        pc.get_received()
+        tablet.get_received()
+
+        phone.emit('clipboard_push', {'room': 'room-1', 'content': b'\x00\xffcipher'})
+
+        [legacy] = [m['args'][0] for m in pc.get_received() if m['name'] == 'clipboard_sync']
+        [binary] = [m['args'][0] for m in tablet.get_received() if m['name'] == 'clipboard_sync']
+        self.assertEqual(legacy['content'], 'AP9jaXBoZXI=')
+        self.assertEqual(binary['content'], b'\x00\xffcipher')
+        self.assertEqual(legacy['seq'], binary['seq'])
+
+    def test_clipboard_push_over_rate_limit_is_rejected(self):
+        pc = self.connect('room-1', 'pc_1', 'pc')
+        phone = self.connect('room-1', 'app_1', 'app')
+        burst = int(server.rate_limiter.limiters[('clipboard', 'sid')].burst)
+        for i in range(burst):
+            phone.emit('clipboard_push', {'room': 'room-1', 'content': f'item-{i}'})
+        phone.get_received()
+
+        ack = phone.emit('clipboard_push', {'room': 'room-1', 'content': 'one too many'}, callback=True)
+
+        self.assertEqual(ack['status'], 'rate_limited')
+        self.assertGreater(ack['retry_after_ms'], 0)
+        error = [m['args'][0] for m in phone.get_received() if m['name'] == 'error'][0]
+        self.assertEqual(error['code'], 'E_RATE_LIMITED')
+        self.assertEqual(error['limiter'], 'clipboard.sid')
+        synced = [m['args'][0]['content'] for m in pc.get_received() if m['name'] == 'clipboard_sync']
+        self.assertNotIn('one too many', synced)
+
+    def test_rejoining_peer_receives_missed_clipboard_items(self):
+        pc = self.connect('room-1', 'pc_1', 'pc')
+        phone = self.connect('room-1', 'app_1', 'app')
+        pc.emit('clipboard_push', {'room': 'room-1', 'content': 'first'})
+        last_seq = [m for m in phone.get_received() if m['name'] == 'clipboard_sync'][0]['args'][0]['seq']
+
+        phone.disconnect()
+        pc.emit('clipboard_push', {'room': 'room-1', 'content': 'second'})
+        pc.emit('clipboard_push', {'room': 'room-1', 'content': 'third'})
+
+        phone = server.socketio.test_client(server.app)
+        self.clients.append(phone)
+        phone.emit('join', {'room': 'room-1', 'client_id': 'app_1', 'client_type': 'app', 'last_seq': last_seq})
+        received = phone.get_received()
+
+        replayed = [m['args'][0] for m in received if m['name'] == 'clipboard_sync']
+        self.assertEqual([item['content'] for item in replayed], ['second', 'third'])
+        self.assertTrue(all(item['replayed'] for item in replayed))
+        resume = [m['args'][0] for m in received if m['name'] == 'clipboard_resume'][0]
+        self.assertEqual(resume['replayed'], 2)
+        self.assertFalse(resume['truncated'])
+
+    def test_clipboard_echo_is_suppressed(self):
+        pc = self.connect('room-1', 'pc_1', 'pc')
+        phone = self.connect('room-1', 'app_1', 'app')
+        pc.get_received()
+        suppressed_before = server.clipboard_dedup.stats['suppressed']
+
+        pc.emit('clipboard_push', {'room': 'room-1', 'content': 'ping-pong'})
+        ack = phone.emit('clipboard_push', {'room': 'room-1', 'content': 'ping-pong'}, callback=True)
+
+        self.assertEqual(ack, {'status': 'duplicate'})
+        self.assertEqual([m for m in pc.get_received() if m['name'] == 'clipboard_sync'], [])
+        self.assertEqual(server.clipboard_dedup.stats['suppressed'], suppressed_before + 1)
+
+    def test_oversized_clipboard_is_relayed_by_reference(self):
+        pc = self.connect('room-1', 'pc_1', 'pc')
+        phone = self.connect('room-1', 'app_1', 'app')
+        pc.get_received()
+        content = 'z' * (server.payload_spiller.threshold_bytes + 1)
+
+        phone.emit('clipboard_push', {'room': 'room-1', 'content': content})
+
+        synced = [m['args'][0] for m in pc.get_received() if m['name'] == 'clipboard_sync'][0]
+        self.assertNotIn('content', synced)
+        ref = synced['content_ref']
+        self.assertEqual(ref['size'], len(content))
+        download = server.app.test_client().get(f"/api/file/download/{ref['file_key']}")
+        self.assertEqual(download.get_data(as_text=True), content)
+
+    def test_http_relay_rejects_oversized_body(self):
+        http = server.app.test_client()
+        body = 'x' * (server.RELAY_MAX_FRAME_BYTES + 1)
+        response = http.post('/api/relay', data=body, content_type='application/json')
+        self.assertEqual(response.status_code, 413)
+
+    def test_http_relay_rejects_oversized_chunked_body(self):
+        http = server.app.test_client()
+        body = io.BytesIO(b'x' * (server.RELAY_MAX_FRAME_BYTES + 1))
+        response = http.post('/api/relay', input_stream=body, content_type='application/json',
+                             environ_overrides={'wsgi.input_terminated': True, 'CONTENT_LENGTH': ''})
+        self.assertEqual(response.status_code, 413)
+
+    def test_http_relay_does_not_spill_other_events(self):
+        pc = self.connect('room-1', 'pc_1', 'pc')
+        pc.get_received()
+        content = 'z' * (server.payload_spiller.threshold_bytes + 1)
+        body = {'room': 'room-1', 'event': 'file_announcement', 'data': {'content': content}}
+
+        self.assertEqual(server.app.test_client().post('/api/relay', json=body).status_code, 200)
+
+        [announced] = [m['args'][0] for m in pc.get_received() if m['name'] == 'file_announcement']
+        self.assertEqual(announced['content'], content)
+
+    def test_http_relay_over_rate_limit_returns_429(self):
+        http = server.app.test_client()
+        burst = int(server.rate_limiter.limiters[('relay', 'client')].burst)
+        body = {'room': 'room-1', 'event': 'custom', 'data': {}, 'sender_id': 'api_1'}
+        for _ in range(burst):
+            self.assertEqual(http.post('/api/relay', json=body).status_code, 200)
+
+        response = http.post('/api/relay', json=body)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.get_json()['code'], 'E_RATE_LIMITED')
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+
+    def test_http_relay_limit_ignores_forwarded_for(self):
+        http = server.app.test_client()
+        burst = int(server.rate_limiter.limiters[('relay', 'sid')].burst)
+        for i in range(burst):
+            body = {'room': f'room-ip-{i}', 'event': 'ping', 'data': {}}
+            response = http.post('/api/relay', json=body, headers={'X-Forwarded-For': f'10.0.0.{i}'})
+            self.assertEqual(response.status_code, 200)
+
+        body = {'room': 'room-ip-last', 'event': 'ping', 'data': {}}
+        response = http.post('/api/relay', json=body, headers={'X-Forwarded-For': '10.9.9.9'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.get_json()['limiter'], 'relay.sid')
+
+    def test_offline_peer_with_fcm_token_is_woken_up(self):
+        server.fcm_delivery.enabled = True
+        server.fcm_delivery.flush()
+        try:
+            phone = self.connect('room-1', 'app_1', 'app', fcm_token='tok-app-1')
+            phone.disconnect()
+            pc = self.connect('room-1', 'pc_1', 'pc')
+
+            pc.emit('clipboard_push', {'room': 'room-1', 'content': 'hello'})
+
+            self.assertEqual(server.fcm_delivery.pending_count(), 1)
+        finally:
+            server.fcm_delivery._pending.clear()
+            server.fcm_delivery.enabled = False
+
+    def test_peer_that_left_room_is_not_woken_up(self):
+        server.fcm_delivery.enabled = True
+        server.fcm_delivery.flush()
+        try:
+            phone = self.connect('room-left', 'app_left', 'app', fcm_token='tok-app-left')
+            phone.emit('leave', {'room': 'room-left'})
+            phone.disconnect()
+            pc = self.connect('room-left', 'pc_left', 'pc')
+
+            pc.emit('clipboard_push', {'room': 'room-left', 'content': 'hello'})
+
+            self.assertEqual(server.fcm_delivery.pending_count(), 0)
+            self.assertEqual(server.fcm_delivery.registry.get_token('app_left'), 'tok-app-left')
+        finally:
+            server.fcm_delivery._pending.clear()
+            server.fcm_delivery.enabled = False
+
+
+if __name__ == '__main__':
+    unittest.main()
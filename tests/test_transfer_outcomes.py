@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+
+import app as server
+from app.services import history_db
+from app.services.transfer_outcomes import TransferOutcomeRecorder
+from tests.test_socket_events import reset_signal_state
+
+
+def make_context(transfer_id, status, reason='', room_state='PAIR_UNKNOWN', decision_ms=500, size_bytes=None):
+    return {
+        'transfer_id': transfer_id,
+        'room': 'room-1',
+        'room_state': room_state,
+        'status': status,
+        'last_reason': reason,
+        'created_at_ms': 1_700_000_000_000,
+        'updated_at_ms': 1_700_000_000_000 + decision_ms,
+        'decision_timeout_ms': 10000,
+        'size_bytes': size_bytes,
+    }
+
+
+class TransferOutcomeRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        self.recorder = TransferOutcomeRecorder(self.batches.append, batch_size=2)
+
+    def test_only_first_decision_is_recorded(self):
+        context = make_context('t1', 'waiting_result')
+        self.assertFalse(self.recorder.record(context))
+        context['status'] = 'fallback_timeout'
+        self.assertTrue(self.recorder.record(context))
+        context['status'] = 'lan_success'
+        self.assertFalse(self.recorder.record(context))
+        self.assertEqual(self.recorder.pending_count(), 1)
+
+    def test_flush_writes_in_batches(self):
+        for i in range(5):
+            self.recorder.record(make_context(f't{i}', 'lan_success'))
+
+        self.assertEqual(self.recorder.flush(), 5)
+
+        self.assertEqual([len(batch) for batch in self.batches], [2, 2, 1])
+        self.assertEqual(self.batches[0][0]['decision_ms'], 500)
+        self.assertEqual(self.recorder.pending_count(), 0)
+
+    def test_decision_ms_starts_at_the_lan_offer(self):
+        context = make_context('t1', 'lan_success', decision_ms=900)
+        context['offered_at_ms'] = context['created_at_ms'] + 300
+        self.recorder.record(context)
+        self.recorder.flush()
+        self.assertEqual(self.batches[0][0]['decision_ms'], 600)
+
+
+class TransferOutcomeQueryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'history.db')
+        history_db.init_db(self.db_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_summary_and_room_state_breakdown(self):
+        recorder = TransferOutcomeRecorder(lambda rows: history_db.insert_transfer_outcomes(self.db_path, rows))
+        now_ms = int(history_db.datetime.now(history_db.timezone.utc).timestamp() * 1000)
+        contexts = [
+            make_context('a', 'lan_success', 'lan_ack', decision_ms=200, size_bytes=1000),
+            make_context('b', 'lan_success', 'lan_ack', decision_ms=400, size_bytes=50 * 1024 * 1024),
+            make_context('c', 'fallback_timeout', 'decision_timeout', decision_ms=10000, size_bytes=100),
+            make_context('d', 'fallback_requested', 'room_diff_lan', room_state='PAIR_DIFF_LAN',
+                         decision_ms=1, size_bytes=50),
+        ]
+        for context in contexts:
+            context['created_at_ms'] = now_ms
+            context['updated_at_ms'] += now_ms - 1_700_000_000_000
+            recorder.record(context)
+        recorder.flush()
+
+        summary = history_db.query_transfer_summary(self.db_path)
+        self.assertEqual(summary['total'], 4)
+        self.assertEqual(summary['lan_attempted'], 3)
+        self.assertAlmostEqual(summary['lan_success_ratio'], 0.6667)
+        self.assertAlmostEqual(summary['timeout_fallback_rate'], 0.3333)
+        self.assertEqual(summary['relay_bytes'], 150)
+        # LAN completions (which include the download) are kept out of decision latency.
+        self.assertEqual(summary['decision_ms']['p50'], 10000)
+        self.assertEqual(summary['lan_success_ms']['p50'], 400)
+
+        by_size = {row['size_class']: row for row in history_db.query_transfers_by_size(self.db_path)}
+        self.assertEqual(list(by_size), ['<1MiB', '10-100MiB'])
+        self.assertEqual(by_size['<1MiB']['avg_lan_success_ms'], 200)
+        self.assertEqual(by_size['10-100MiB']['avg_lan_success_ms'], 400)
+
+        by_state = {row['room_state']: row for row in history_db.query_transfers_by_room_state(self.db_path)}
+        self.assertEqual(by_state['PAIR_DIFF_LAN']['relay'], 1)
+        self.assertIsNone(by_state['PAIR_DIFF_LAN']['lan_success_ratio'])
+        self.assertEqual(by_state['PAIR_UNKNOWN']['lan_success'], 2)
+
+
+class TransferOutcomeSocketTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.rate_limiter.clear()
+        server.transfer_outcomes.flush()
+
+    def tearDown(self):
+        reset_signal_state()
+
+    def test_lan_ack_records_outcome(self):
+        pc = server.socketio.test_client(server.app)
+        phone = server.socketio.test_client(server.app)
+        pc.emit('join', {'room': 'room-t', 'client_id': 'pc_t', 'client_type': 'pc',
+                         'probe': {'probe_url': 'http://192.168.1.10:8765/probe'}})
+        phone.emit('join', {'room': 'room-t', 'client_id': 'app_t', 'client_type': 'app'})
+        recorded_before = server.transfer_outcomes.stats['recorded']
+
+        pc.emit('file_available', {'room': 'room-t', 'transfer_id': 'tr_analytics', 'file_id': 'f1',
+                                   'protocol_version': '4.0', 'file_size': 2048})
+        phone.emit('file_sync_completed', {'room': 'room-t', 'transfer_id': 'tr_analytics',
+                                           'file_id': 'f1', 'protocol_version': '4.0'})
+        pc.disconnect()
+        phone.disconnect()
+
+        self.assertEqual(server.transfer_outcomes.stats['recorded'], recorded_before + 1)
+        row = server.transfer_outcomes._pending[-1]
+        self.assertEqual((row['transfer_id'], row['outcome'], row['room_state']),
+                         ('tr_analytics', 'lan_success', 'PAIR_UNKNOWN'))
+        self.assertEqual(row['size_bytes'], 2048)
+        self.assertIsNotNone(row['offered_at_ms'])
+        self.assertEqual(server.transfer_outcomes.flush(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+
+import app as server
+from app import signal_core
+from app.services.transfer_timing import TransferDecisionEstimator
+from tests.test_socket_events import reset_signal_state
+
+
+def finished(key, status, decision_ms, reason='', size_bytes=None, adaptive_timeout=False):
+    return {
+        'network_key': key,
+        'status': status,
+        'last_reason': reason,
+        'created_at_ms': 1_000_000,
+        'offered_at_ms': 1_000_000,
+        'updated_at_ms': 1_000_000 + decision_ms,
+        'size_bytes': size_bytes,
+        'decision_timeout_ms': decision_ms,
+        'adaptive_timeout': adaptive_timeout,
+    }
+
+
+class TransferDecisionEstimatorTest(unittest.TestCase):
+    def setUp(self):
+        self.estimator = TransferDecisionEstimator(alpha=0.5, min_samples=3, min_timeout_ms=1000,
+                                                   skip_below_success_rate=0.2, explore_every=3)
+
+    def test_default_until_enough_samples(self):
+        self.estimator.observe(finished('k', 'lan_success', 400))
+        self.assertEqual(self.estimator.suggest_timeout_ms('k', 10000), 10000)
+
+    def test_timeout_tracks_observed_lan_latency(self):
+        for latency in (400, 500, 450, 420):
+            self.estimator.observe(finished('k', 'lan_success', latency))
+        timeout = self.estimator.suggest_timeout_ms('k', 10000)
+        self.assertGreaterEqual(timeout, 1000)
+        self.assertLess(timeout, 2000)
+        self.assertEqual(self.estimator.suggest_timeout_ms('other', 10000), 10000)
+
+    def test_timeout_scales_with_file_size(self):
+        # Roughly 300 ms of overhead plus 10 ms per 100 KB, small and large files interleaved.
+        for i in range(30):
+            size = 1_000 if i % 2 else 20_000_000
+            self.estimator.observe(finished('k', 'lan_success', 300 + size // 10_000, size_bytes=size))
+
+        small = self.estimator.suggest_timeout_ms('k', 30000, size_bytes=1_000)
+        large = self.estimator.suggest_timeout_ms('k', 30000, size_bytes=20_000_000)
+        self.assertEqual(small, 1000)
+        self.assertGreaterEqual(large, 2300)
+        self.assertLess(large, 3000)
+        self.assertAlmostEqual(self.estimator.snapshot('k')['ms_per_byte'], 0.0001, places=6)
+
+    def test_timeout_under_adaptive_deadline_raises_estimate(self):
+        for latency in (400, 500, 450):
+            self.estimator.observe(finished('k', 'lan_success', latency))
+        before = self.estimator.suggest_timeout_ms('k', 10000)
+
+        self.estimator.observe(finished('k', 'fallback_timeout', before, adaptive_timeout=True))
+
+        estimate = self.estimator.snapshot('k')
+        self.assertEqual(estimate['success_rate'], 1.0)
+        self.assertEqual(self.estimator.stats['censored'], 1)
+        self.assertGreater(self.estimator.suggest_timeout_ms('k', 10000), before)
+
+    def test_each_transfer_is_observed_once(self):
+        context = finished('k', 'fallback_timeout', 10000)
+        self.assertTrue(self.estimator.observe(context))
+        context['status'] = 'lan_success'
+        self.assertFalse(self.estimator.observe(context))
+
+    def test_relay_without_lan_attempt_is_not_evidence(self):
+        self.assertFalse(self.estimator.observe(finished('k', 'fallback_requested', 0, reason='room_diff_lan')))
+        self.assertIsNone(self.estimator.snapshot('k'))
+
+    def test_repeated_failures_skip_lan_with_periodic_exploration(self):
+        for _ in range(3):
+            self.estimator.observe(finished('k', 'fallback_timeout', 10000))
+
+        decisions = [self.estimator.lan_attempt_mode('k') for _ in range(6)]
+
+        self.assertEqual(decisions, ['skip', 'skip', 'explore', 'skip', 'skip', 'explore'])
+        self.assertFalse(self.estimator.should_skip_lan('unknown'))
+
+
+class AdaptiveDecisionSocketTest(unittest.TestCase):
+    def setUp(self):
+        reset_signal_state()
+        server.rate_limiter.clear()
+        server.transfer_decision_estimator.clear()
+
+    def tearDown(self):
+        reset_signal_state()
+        server.transfer_decision_estimator.clear()
+
+    def test_pair_with_failing_history_is_sent_straight_to_relay(self):
+        network = {'network_id_hash': 'net-a'}
+        pc = server.socketio.test_client(server.app)
+        phone = server.socketio.test_client(server.app)
+        pc.emit('join', {'room': 'room-a', 'client_id': 'pc_a', 'client_type': 'pc', 'network': network,
+                         'probe': {'probe_url': 'http://192.168.1.10:8765/probe'}})
+        phone.emit('join', {'room': 'room-a', 'client_id': 'app_a', 'client_type': 'app',
+                            'network': {'network_id_hash': 'net-b'}})
+        for _ in range(server.transfer_decision_estimator.min_samples):
+            server.transfer_decision_estimator.observe(finished('net:net-a|net-b', 'fallback_timeout', 10000))
+        pc.get_received()
+        phone.get_received()
+
+        pc.emit('file_available', {'room': 'room-a', 'transfer_id': 'tr_skip', 'file_id': 'f1',
+                                   'protocol_version': '4.0'})
+
+        commands = [m['args'][0] for m in pc.get_received() if m['name'] == 'transfer_command']
+        self.assertEqual([(c['action'], c['reason']) for c in commands], [('upload_relay', 'lan_predicted_fail')])
+        self.assertEqual([m for m in phone.get_received() if m['name'] == 'file_available'], [])
+        pc.disconnect()
+        phone.disconnect()
+
+    def test_exploration_attempt_uses_default_timeout(self):
+        estimator = server.transfer_decision_estimator
+        key = 'net:net-a|net-b'
+        for _ in range(estimator.min_samples):
+            estimator.observe(finished(key, 'lan_success', 400))
+        for _ in range(15):
+            estimator.observe(finished(key, 'fallback_requested', 100, reason='receiver_requested_fallback'))
+        pc = server.socketio.test_client(server.app)
+        phone = server.socketio.test_client(server.app)
+        pc.emit('join', {'room': 'room-a', 'client_id': 'pc_a', 'client_type': 'pc',
+                         'network': {'network_id_hash': 'net-a'},
+                         'probe': {'probe_url': 'http://192.168.1.10:8765/probe'}})
+        phone.emit('join', {'room': 'room-a', 'client_id': 'app_a', 'client_type': 'app',
+                            'network': {'network_id_hash': 'net-b'}})
+        explore_every = estimator.explore_every
+        estimator.explore_every = 1
+        try:
+            pc.emit('file_available', {'room': 'room-a', 'transfer_id': 'tr_explore', 'file_id': 'f1',
+                                       'protocol_version': '4.0'})
+        finally:
+            estimator.explore_every = explore_every
+
+        context = server.TRANSFER_CONTEXTS['tr_explore']['app_a']
+        self.assertEqual(context['status'], 'waiting_result')
+        self.assertEqual(context['decision_timeout_ms'], signal_core.TRANSFER_DECISION_TIMEOUT_MS_DEFAULT)
+        self.assertFalse(context['adaptive_timeout'])
+        pc.disconnect()
+        phone.disconnect()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import unittest
+import uuid
+
+import app as server
+from app.services.upload_cache import UploadCache, iter_chunks
+
+
+class UploadCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now_ms = 0
+        self.cache = UploadCache(max_bytes=10, max_object_bytes=6, ttl_ms=1000, clock=lambda: self.now_ms)
+
+    def test_cached_objects_are_served_without_copying(self):
+        data = b'abcdef'
+        self.cache.put('a.txt', data, 'text/plain')
+
+        view, content_type = self.cache.get('a.txt')
+        self.assertIs(view.obj, data)
+        self.assertEqual(content_type, 'text/plain')
+        self.assertEqual([bytes(chunk) for chunk in iter_chunks(view, 4)], [b'abcd', b'ef'])
+        self.assertIsNone(self.cache.get('b.txt'))
+        self.assertEqual(self.cache.hit_ratio(), 0.5)
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        self.cache.put('a', b'1234', 'x')
+        self.cache.put('b', b'1234', 'x')
+        self.cache.get('a')
+        self.cache.put('c', b'1234', 'x')
+
+        self.assertEqual((self.cache.get('b'), self.cache.total_bytes), (None, 8))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertFalse(self.cache.put('big', b'1234567', 'x'))
+        self.assertEqual(self.cache.stats['evicted'], 1)
+
+    def test_entries_expire(self):
+        self.cache.put('a', b'1234', 'x')
+        self.now_ms += 1000
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual((self.cache.total_bytes, self.cache.stats['expired']), (0, 1))
+
+
+class LocalDownloadTest(unittest.TestCase):
+    def setUp(self):
+        server.upload_cache.clear()
+        self.http = server.app.test_client()
+        self.file_key = f'{uuid.uuid4().hex}_notes.txt'
+
+    def test_fresh_upload_is_downloaded_from_memory(self):
+        self.http.put(f'/api/file/upload/{self.file_key}', data=b'hello' * 1000, content_type='text/plain')
+        os.remove(os.path.join(server.LOCAL_STORAGE_PATH, self.file_key))
+
+        response = self.http.get(f'/api/file/download/{self.file_key}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Length'], '5000')
+        self.assertEqual(response.mimetype, 'text/plain')
+        self.assertEqual(response.get_data(), b'hello' * 1000)
+
+    def test_miss_falls_back_to_disk(self):
+        self.http.put(f'/api/file/upload/{self.file_key}', data=b'on disk', content_type='text/plain')
+        server.upload_cache.clear()
+        misses = server.upload_cache.stats['misses']
+
+        self.assertEqual(self.http.get(f'/api/file/download/{self.file_key}').get_data(), b'on disk')
+        self.assertEqual(server.upload_cache.stats['misses'], misses + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()